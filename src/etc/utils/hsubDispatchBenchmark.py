@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+""" ================================================================================
+    hsubDispatchBenchmark.py - Measure the cost of HandlerSubsystem handler dispatch
+    ================================================================================
+
+    Times the handler lookups made by the setVelocity(), gotoRegion() and getPose()
+    wrappers during one control tick, both by searching for each handler on every
+    call (as was done before the handler registry existed) and through the
+    resolved registry.  The handlers themselves do nothing, so what is measured
+    is purely the dispatch overhead.
+"""
+
+import os
+import sys
+import getopt
+import textwrap
+import timeit
+
+# Climb the tree to find out where we are
+p = os.path.abspath(__file__)
+t = ""
+while t != "src":
+    (p, t) = os.path.split(p)
+    if p == "":
+        print "I have no idea where I am; this is ridiculous"
+        sys.exit(1)
+
+sys.path.append(os.path.join(p, "src", "lib"))
+
+import handlerSubsystem
+import handlers.handlerTemplates as ht
+from hsubConfigObjects import HandlerConfig, RobotConfig, ExperimentConfig
+
+class _DummyExecutor(object):
+    pass
+
+def _makeHandlerClass(name, h_type):
+    """ Return a new handler class called `name` whose methods do nothing """
+
+    def setVelocity(self, x, y):
+        pass
+
+    def gotoRegion(self, current_region, next_region):
+        return False
+
+    def getPose(self, cached=False):
+        return (0, 0, 0)
+
+    return type(name, (h_type,), {"__init__": lambda self: None,
+                                  "setVelocity": setVelocity,
+                                  "gotoRegion": gotoRegion,
+                                  "getPose": getPose})
+
+def makeHandlerSubsystem(num_robots):
+    """ Return a HandlerSubsystem with `num_robots` robots that each have one
+        instantiated handler of every type, the first being the main robot """
+
+    hsub = handlerSubsystem.HandlerSubsystem(_DummyExecutor(), os.getcwd())
+    hsub.executing_config = ExperimentConfig(name="benchmark", main_robot="robot0")
+
+    for i in range(num_robots):
+        robot = RobotConfig("robot{}".format(i), "benchmark")
+        for h_type in ht.getAllHandlerTypeClass():
+            handler_name = "Robot{}{}".format(i, h_type.__name__)
+            robot.handlers[h_type] = HandlerConfig(name=handler_name, h_type=h_type, robot_type="benchmark")
+            hsub.handler_instance.append(_makeHandlerClass(handler_name, h_type)())
+        hsub.executing_config.robots.append(robot)
+
+    # Put the main robot's handlers last, so that searching for them is slowest
+    hsub.handler_instance.reverse()
+
+    return hsub
+
+def tickWithSearch(hsub):
+    """ One tick's worth of dispatch, searching for each handler every time """
+
+    def search(h_type):
+        robot_config = hsub.getMainRobot()
+        return hsub.getHandlerInstanceByName(robot_config.getHandlerOfRobot(h_type).name)
+
+    search(ht.PoseHandler).getPose(False)
+    search(ht.MotionControlHandler).gotoRegion(0, 1)
+    search(ht.DriveHandler).setVelocity(0, 0)
+
+def tickWithRegistry(hsub):
+    """ One tick's worth of dispatch, through the HandlerSubsystem wrappers """
+
+    hsub.getPose()
+    hsub.gotoRegion(0, 1)
+    hsub.setVelocity(0, 0)
+
+def usage(script_name):
+    print textwrap.dedent("""\
+                          Usage: %s [-h] [-r num_robots] [-n num_ticks]
+
+                              -h, --help:
+                                  Display this message
+                              -r NUM, --robots NUM:
+                                  Number of robots in the config (default: 5)
+                              -n NUM, --ticks NUM:
+                                  Number of control ticks to time (default: 100000)
+                          """ % script_name)
+
+if __name__ == "__main__":
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hr:n:", ["help", "robots=", "ticks="])
+    except getopt.GetoptError:
+        usage(sys.argv[0])
+        sys.exit(2)
+
+    num_robots = 5
+    num_ticks = 100000
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage(sys.argv[0])
+            sys.exit()
+        elif opt in ("-r", "--robots"):
+            num_robots = int(arg)
+        elif opt in ("-n", "--ticks"):
+            num_ticks = int(arg)
+
+    hsub = makeHandlerSubsystem(num_robots)
+    # Coordinate maps are not part of dispatch; keep getPose() from asking for them
+    hsub.coordmap_map2lab = hsub.coordmap_lab2map = lambda pt: pt
+
+    print "{} robots, {} handler instances, {} ticks".format(num_robots, len(hsub.handler_instance), num_ticks)
+
+    search_time = min(timeit.repeat(lambda: tickWithSearch(hsub), number=num_ticks, repeat=3))
+    print "Searching for handlers:  {:8.3f} us/tick".format(search_time / num_ticks * 1e6)
+
+    hsub.buildHandlerRegistry()
+    registry_time = min(timeit.repeat(lambda: tickWithRegistry(hsub), number=num_ticks, repeat=3))
+    print "Using handler registry:  {:8.3f} us/tick".format(registry_time / num_ticks * 1e6)
+
+    print "Speedup: {:.1f}x".format(search_time / registry_time)
@@ -1,26 +1,69 @@
 import sys
 import re
 import time
-import pycudd
+import getopt
+import textwrap
 import strategy
+import bddBackends
 import logging
+import itertools
+import globalConfig
+from collections import OrderedDict, deque
 
-# NOTE: This module requires a modified version of pycudd!!
-# See src/etc/patches/README_PYCUDD for instructions.
-
-# TODO: We could probably get away with a really minimal Python BDD
-#       implementation
+# NOTE: The BDD operations themselves are provided by a backend from
+# bddBackends.  By default, CUDD is used if a modified version of pycudd is
+# installed (see src/etc/patches/README_PYCUDD for instructions); otherwise
+# a pure-Python implementation is used instead.
 
 # TODO: move generic bdd functions to a different file so others can use?
-# TODO: variable reordering so Jx and strat_type are first (is this actually
-#       best?)
+# TODO: optimize strategy: minimal Y after Z change
+
+class LRUCache(object):
+    """ A simple dictionary-like cache that holds at most `max_size` entries,
+        discarding the least-recently-used entry when it is full. """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
 
-# TODO: optimize strategy:
-#       - stutter state removal
-#       - minimal Y after Z change
+    def __getitem__(self, key):
+        # Move the entry to the most-recently-used end
+        value = self._entries.pop(key)
+        self._entries[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = value
+
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
 
 class BDDStrategy(strategy.Strategy):
-    def __init__(self):
+    # Maximum number of (state, inputs, strategy type) -> successors
+    # entries kept by findTransitionableStates()
+    TRANSITION_CACHE_SIZE = 1024
+
+    # Number of states used by optimize() to measure query latency
+    LATENCY_SAMPLE_SIZE = 20
+
+    def __init__(self, backend=None, precompute_successors=False, optimize=False):
+        """ Create a new BDD strategy.  `backend` is the bddBackends.BDDBackend
+            instance to use; if omitted, a default backend will be created.
+
+            If `precompute_successors` is True, an explicit successor table
+            for all states reachable from the initial states will be built as
+            soon as the strategy is loaded (see precomputeSuccessors()).
+
+            If `optimize` is True, the strategy will be optimized with the
+            default settings as soon as it is loaded (see optimize()). """
+
         super(BDDStrategy, self).__init__()
 
         # We will have a state collection just in order to provide a context
@@ -31,13 +74,30 @@ class BDDStrategy(strategy.Strategy):
 
         self.var_name_to_BDD = {}
         self.BDD_to_var_name = {}
+        self.var_name_to_index = {}
 
         self.strat_type_var = None
+        self.strat_type_index = None
+
+        # Incremented whenever the BDD variables are rebuilt (e.g. after
+        # reordering), so that stale cached BDDs aren't used
+        self.bdd_generation = 0
+
+        # Cache of already-enumerated successor states, so that repeated
+        # queries with the same inputs don't require any BDD operations
+        self.transition_cache = LRUCache(self.TRANSITION_CACHE_SIZE)
+
+        # Explicit state -> (Z successors, Y successors) table for all
+        # reachable states, if precomputeSuccessors() has been called
+        self.precompute_successors = precompute_successors
+        self.successor_table = None
 
-        self.mgr = pycudd.DdManager()
-        self.mgr.SetDefault()
-        # TODO: why is garbage collection crashing?? :( [e.g. on firefighting]
-        self.mgr.DisableGarbageCollection()
+        if backend is None:
+            backend = bddBackends.createBackend()
+        self.backend = backend
+
+        self.optimize_on_load = optimize
+        self.source_filename = None
 
     def _loadFromFile(self, filename):
         """
@@ -47,23 +107,12 @@ class BDDStrategy(strategy.Strategy):
 
         # Clear any existing states
         self.states.clearStates()
-
-        a = pycudd.DdArray(1)
+        self.transition_cache.clear()
+        self.successor_table = None
 
         # Load in the actual BDD itself
-        # Note: We are using an ADD loader because the BDD loader
-        # would expect us to have a reduced BDD with only one leaf node
-        self.mgr.AddArrayLoad(pycudd.DDDMP_ROOT_MATCHLIST,
-                              None,
-                              pycudd.DDDMP_VAR_MATCHIDS,
-                              None,
-                              None,
-                              None,
-                              pycudd.DDDMP_MODE_TEXT,
-                              filename, None, a)
-
-        # Convert from a binary (0/1) ADD to a BDD
-        self.strategy = self.mgr.addBddPattern(a[0])
+        self.strategy = self.backend.loadDDDMP(filename)
+        self.source_filename = filename
 
         # Load in meta-data
         with open(filename, 'r') as f:
@@ -97,16 +146,247 @@ class BDDStrategy(strategy.Strategy):
                 #################################################################
 
                 if varname == "strat_type":
-                    self.strat_type_var = self.mgr.IthVar(varnum)
+                    self.strat_type_var = self.backend.ithVar(varnum)
+                    self.strat_type_index = varnum
                 else:
-                    self.BDD_to_var_name[self.mgr.IthVar(varnum)] = varname
-                    self.var_name_to_BDD[varname] = self.mgr.IthVar(varnum)
+                    self.BDD_to_var_name[self.backend.ithVar(varnum)] = varname
+                    self.var_name_to_BDD[varname] = self.backend.ithVar(varnum)
+                    self.var_name_to_index[varname] = varnum
 
                 # TODO: check for consecutivity
 
         # Create a Domain for jx to help with conversion to/from bitvectors
         self.jx_domain = strategy.Domain("_jx", value_mapping=range(self.num_goals), endianness=strategy.Domain.B0_IS_LSB)
 
+        if self.optimize_on_load:
+            self.optimize()
+
+        if self.precompute_successors:
+            self.precomputeSuccessors()
+
+    def _refreshVariableBDDs(self):
+        """ Recreate all the BDDs for individual variables, and forget any
+            BDDs derived from the old ones.  This is necessary after the
+            variable order has changed. """
+
+        self.var_name_to_BDD = {name: self.backend.ithVar(idx)
+                                for name, idx in self.var_name_to_index.iteritems()}
+        self.BDD_to_var_name = {v: k for k, v in self.var_name_to_BDD.iteritems()}
+        if self.strat_type_index is not None:
+            self.strat_type_var = self.backend.ithVar(self.strat_type_index)
+
+        self.bdd_generation += 1
+        self.transition_cache.clear()
+
+    def _expandPropositionNames(self, prop_names):
+        """ Return a list of binary proposition names, with any domains in
+            `prop_names` replaced by their subpropositions. """
+
+        expanded = []
+        for name in prop_names:
+            domain = self.states.getDomainByName(name)
+            if domain is None:
+                expanded.append(name)
+            else:
+                expanded.extend(domain.getPropositions())
+
+        return expanded
+
+    def removeStutterTransitions(self):
+        """ Remove "stutter" transitions from the strategy: transitions that
+            keep the system in exactly the same state (without changing
+            goals), in cases where the strategy also allows some other move
+            for the same next inputs.  Since the strategy already permitted
+            those other moves, the remaining strategy is still winning.
+
+            Returns the number of BDD nodes in the new strategy. """
+
+        if self.strat_type_var is None:
+            raise ValueError("Strategy does not have a strat_type variable")
+
+        # Stutter: every proposition keeps its current value
+        stutter = self.backend.true()
+        for name in self.getAllVariableNames():
+            now = self.var_name_to_BDD[name]
+            nxt = self.var_name_to_BDD[name + "'"]
+            stutter &= (now & nxt) | (~now & ~nxt)
+
+        # Non-stutter "Y" transitions, with the system's next move hidden so
+        # that only the inputs that the transitions respond to remain
+        y_strategy = self.strategy & ~self.strat_type_var
+        primed_outputs = [self.var_name_to_BDD[name + "'"]
+                          for name in self._expandPropositionNames(self.states.output_props)]
+        has_alternative = self.backend.existAbstract(y_strategy & ~stutter, primed_outputs)
+
+        self.strategy &= ~(~self.strat_type_var & stutter & has_alternative)
+        self.transition_cache.clear()
+
+        return self.backend.nodeCount(self.strategy)
+
+    def reorderVariables(self, var_order=None):
+        """ Change the BDD variable order.  `var_order` is a list of variable
+            names (including "strat_type" and the goal ID subpropositions)
+            that should be moved to the top of the order; if omitted, a good
+            order is searched for automatically.
+
+            Returns the number of BDD nodes in the reordered strategy. """
+
+        if var_order is not None:
+            indices = []
+            for name in var_order:
+                #### TEMPORARY HACK: REMOVE ME AFTER OTHER COMPONENTS ARE UPDATED!!!
+                name = re.sub(r"^bit(\d+)('?)$", r'region_b\1\2', name)
+                #################################################################
+                if name == "strat_type" and self.strat_type_index is not None:
+                    indices.append(self.strat_type_index)
+                elif name in self.var_name_to_index:
+                    indices.append(self.var_name_to_index[name])
+                else:
+                    raise ValueError("Unknown variable name {!r} in variable order".format(name))
+            var_order = indices
+
+        self.strategy, = self.backend.reorder([self.strategy], var_order)
+        self._refreshVariableBDDs()
+
+        return self.backend.nodeCount(self.strategy)
+
+    def _measureQueryLatency(self):
+        """ Return the average time (in seconds) needed to symbolically
+            find the successors of a few sample states. """
+
+        sample_states = list(itertools.islice(self.iterateOverStates(), self.LATENCY_SAMPLE_SIZE))
+        if not sample_states:
+            return 0.0
+
+        tic = globalConfig.best_timer()
+        for s in sample_states:
+            self._enumerateNextStates(s, {}, "Z")
+            self._enumerateNextStates(s, {}, "Y")
+        toc = globalConfig.best_timer()
+
+        return (toc-tic)/len(sample_states)
+
+    def optimize(self, var_order=None, remove_stutter=True, output_filename=None):
+        """ Run an optimization pass on the loaded strategy: remove stutter
+            transitions (if `remove_stutter` is True; see
+            removeStutterTransitions()) and reorder the BDD variables (see
+            reorderVariables() for the meaning of `var_order`).
+
+            If `output_filename` is given, the optimized strategy is written
+            there (see saveToFile()) so that it can be loaded directly in future.
+
+            The BDD size and average query latency before and after
+            optimization are logged.  Returns the new number of BDD nodes. """
+
+        nodes_before = self.backend.nodeCount(self.strategy)
+        latency_before = self._measureQueryLatency()
+        logging.info("Optimizing strategy BDD ({} nodes, {:.3f} ms per query)...".format(nodes_before, 1000*latency_before))
+
+        tic = globalConfig.best_timer()
+
+        if remove_stutter:
+            num_nodes = self.removeStutterTransitions()
+            logging.debug("After stutter removal: {} nodes".format(num_nodes))
+
+        num_nodes = self.reorderVariables(var_order)
+        logging.debug("After reordering: {} nodes".format(num_nodes))
+
+        # The set of successors may have changed
+        if self.successor_table is not None:
+            self.successor_table = None
+            self.precomputeSuccessors()
+
+        toc = globalConfig.best_timer()
+
+        latency_after = self._measureQueryLatency()
+        logging.info("Optimized strategy BDD in {} seconds ({} nodes, {:.3f} ms per query).".format(toc-tic, num_nodes, 1000*latency_after))
+
+        if output_filename is not None:
+            self.saveToFile(output_filename)
+
+        return num_nodes
+
+    def saveToFile(self, filename):
+        """ Write the strategy BDD to `filename` in the same format it was loaded
+            from, including the goal and variable name metadata. """
+
+        if self.source_filename is None:
+            raise ValueError("Strategy has not been loaded from a file")
+
+        # Copy the metadata comments from the original file
+        comments = []
+        with open(self.source_filename, 'r') as f:
+            for line in f:
+                if line.startswith(".end"):
+                    break
+            comments = list(f)
+
+        var_names = {idx: name for name, idx in self.var_name_to_index.iteritems()}
+        if self.strat_type_index is not None:
+            var_names[self.strat_type_index] = "strat_type"
+
+        self.backend.dumpDDDMP(self.strategy, filename, var_names, comments)
+        logging.info("Wrote strategy BDD to file '{}'.".format(filename))
+
+    def getInitialStates(self):
+        """ Return an iterator over all states from which execution can start,
+            i.e. those in which the first goal is being pursued. """
+
+        return self.BDDToStates(self.strategy & self.getBDDFromJx(0))
+
+    def precomputeSuccessors(self, initial_states=None):
+        """ Switch to eager mode: find all states reachable from `initial_states`
+            (or from getInitialStates(), if omitted) and record their
+            successors in an explicit table, so that findTransitionableStates()
+            becomes a table lookup for these states.  States that are not in
+            the table will still be handled symbolically.
+
+            Returns the number of reachable states. """
+
+        logging.info("Precomputing successor table...")
+        tic = globalConfig.best_timer()
+
+        if initial_states is None:
+            initial_states = self.getInitialStates()
+
+        self.successor_table = self.buildSuccessorTable(initial_states)
+
+        toc = globalConfig.best_timer()
+        logging.info("Precomputed successors for {} reachable states in {} seconds.".format(len(self.successor_table), toc-tic))
+
+        return len(self.successor_table)
+
+    def buildSuccessorTable(self, initial_states):
+        """ Return a dictionary mapping each state reachable from
+            `initial_states` to a tuple of (Z successors, Y successors), for
+            all possible inputs.  Each distinct state is only represented by
+            one State object throughout the table.
+
+            Unlike precomputeSuccessors(), this does not change the strategy. """
+
+        table = {}
+
+        # Make sure that each state is only stored once
+        canonical_states = {}
+        def canonicalize(state_list):
+            return tuple(canonical_states.setdefault(s, s) for s in state_list)
+
+        states_to_process = deque(canonicalize(initial_states))
+        while states_to_process:
+            this_state = states_to_process.popleft()
+            if this_state in table:
+                continue
+
+            # Both "Z" and "Y" successors for all possible inputs
+            entry = (canonicalize(self._enumerateNextStates(this_state, {}, "Z")),
+                     canonicalize(self._enumerateNextStates(this_state, {}, "Y")))
+            table[this_state] = entry
+
+            for next_states in entry:
+                states_to_process.extend(s for s in next_states if s not in table)
+
+        return table
+
     def searchForStates(self, prop_assignments, state_list=None):
         """ Returns an iterator for the subset of all known states (or a subset
             specified in `state_list`) that satisfy `prop_assignments`. """
@@ -136,9 +416,50 @@ class BDDStrategy(strategy.Strategy):
             yield one_sat
             bdd &= ~one_sat
 
+    def satAllAssignments(self, bdd, var_names):
+        """ Lazily yield every assignment to `var_names` (as a dictionary
+            from var_name[str]->value[bool]) that satisfies `bdd`, with all
+            other variables existentially quantified.
+
+            Don't-care variables in each cube are only expanded into
+            individual assignments as the assignments are requested. """
+
+        var_names = list(var_names)
+
+        # Quantify out all the variables we don't care about, so that no two
+        # cubes will yield the same assignment
+        wanted_var_names = set(var_names)
+        other_vars = [v for n, v in self.var_name_to_BDD.iteritems() if n not in wanted_var_names]
+        if self.strat_type_var is not None:
+            other_vars.append(self.strat_type_var)
+        if other_vars:
+            bdd = self.backend.existAbstract(bdd, other_vars)
+
+        for cube in self.backend.iterateOverCubes(bdd):
+            fixed = {}
+            dont_cares = []
+            for vn in var_names:
+                idx = self.var_name_to_index[vn]
+                if idx in cube:
+                    fixed[vn] = cube[idx]
+                else:
+                    dont_cares.append(vn)
+
+            for values in itertools.product((False, True), repeat=len(dont_cares)):
+                assignment = dict(fixed)
+                assignment.update(itertools.izip(dont_cares, values))
+                yield assignment
+
     def BDDToStates(self, bdd):
-        for one_sat in self.satAll(bdd, self.getAllVariableNames() + self.jx_domain.getPropositions()):
-            yield self.BDDToState(one_sat)
+        """ Lazily yield all states in `bdd`. """
+
+        jx_props = self.jx_domain.getPropositions()
+        for assignment in self.satAllAssignments(bdd, self.getAllVariableNames() + jx_props):
+            jx = self.jx_domain.propAssignmentsToNumericValue(assignment)
+            for p in jx_props:
+                del assignment[p]
+
+            yield self.states.addNewState(assignment, jx)
 
     def BDDToState(self, bdd):
         prop_assignments = self.BDDToPropAssignment(bdd, self.getAllVariableNames())
@@ -154,7 +475,7 @@ class BDDStrategy(strategy.Strategy):
     def printStrategy(self):
         """ Dump the minterm of the strategy BDD.  For debugging only. """
 
-        self.strategy.PrintMinterm()
+        self.backend.printMinterm(self.strategy)
 
     def stateListToBDD(self, state_list, use_next=False):
         return reduce(lambda bdd1, bdd2: bdd1 | bdd2,
@@ -170,7 +491,7 @@ class BDDStrategy(strategy.Strategy):
         prop_assignments = self.states.expandDomainsInPropAssignment(prop_assignments)
 
         # Start with the BDD for True
-        bdd = self.mgr.ReadOne()
+        bdd = self.backend.true()
 
         # Add all the proposition values one by one
         for prop_name, prop_value in prop_assignments.iteritems():
@@ -186,7 +507,16 @@ class BDDStrategy(strategy.Strategy):
 
     def stateToBDD(self, state, use_next=False):
         """ Create a BDD that represents the given state.
-            If `use_next` is True, all variables will be primed. """
+            If `use_next` is True, all variables will be primed.
+
+            The result is cached on the state itself, for as long as its
+            assignment and goal remain unchanged. """
+
+        cache_key = (self, "bdd", self.bdd_generation, use_next, state.goal_id)
+        try:
+            return state.derived_cache[cache_key]
+        except KeyError:
+            pass
 
         state_bdd = self.propAssignmentToBDD(state.getAll(expand_domains=True), use_next)
 
@@ -194,6 +524,8 @@ class BDDStrategy(strategy.Strategy):
             # We don't currently use jx in the next
             state_bdd &= self.getBDDFromJx(state.goal_id)
 
+        state.derived_cache[cache_key] = state_bdd
+
         return state_bdd
 
     def getAllVariableNames(self, use_next=False):
@@ -207,30 +539,10 @@ class BDDStrategy(strategy.Strategy):
 
     def prime(self, bdd):
         # TODO: modify support? error check
-        return self._BDDSwapVars(bdd, self.getAllVariableBDDs(use_next=False), self.getAllVariableBDDs(use_next=True))
+        return self.backend.swapVariables(bdd, self.getAllVariableBDDs(use_next=False), self.getAllVariableBDDs(use_next=True))
 
     def unprime(self, bdd):
-        return self._BDDSwapVars(bdd, self.getAllVariableBDDs(use_next=True), self.getAllVariableBDDs(use_next=False))
-
-    def _DDArrayFromList(self, elements):
-        # We have to do this silly type conversion because we're using a very loosely-wrapped C library
-        dd_array = pycudd.DdArray(len(elements))
-        for idx, el in enumerate(elements):
-            dd_array[idx] = el
-
-        return dd_array
-
-    def _BDDSwapVars(self, bdd, varset1, varset2):
-        # Make sure we have an iterator with a len()
-        varset1 = list(varset1)
-        varset2 = list(varset2)
-
-        assert len(varset1) == len(varset2)
-
-        dd_varset1 = self._DDArrayFromList(varset1)
-        dd_varset2 = self._DDArrayFromList(varset2)
-
-        return bdd.SwapVariables(dd_varset1, dd_varset2, len(varset1))
+        return self.backend.swapVariables(bdd, self.getAllVariableBDDs(use_next=True), self.getAllVariableBDDs(use_next=False))
 
     def findTransitionableStates(self, prop_assignments, from_state=None):
         """ Return a list of states that can be reached from `from_state`
@@ -240,24 +552,58 @@ class BDDStrategy(strategy.Strategy):
         if from_state is None:
             from_state = self.current_state
 
-        # If possible, move on to the next goal (only possible if current states fulfils current goal)
-        candidates = self._getNextStateBDD(from_state, prop_assignments, "Z")
-        if candidates:
-            candidate_states = list(self.BDDToStates(candidates))
-            for s in candidate_states:
-                # add 1 to jx
-                s.goal_id = (s.goal_id + 1) % self.num_goals
+        # Use the precomputed table if we can
+        if self.successor_table is not None and from_state in self.successor_table:
+            for candidate_states in self.successor_table[from_state]:
+                candidate_states = [s for s in candidate_states if s.satisfies(prop_assignments)]
+                if candidate_states:
+                    return candidate_states
+
+            raise RuntimeError("No next state could be found.")
 
-            return candidate_states
+        # If possible, move on to the next goal (only possible if current states fulfils current goal)
+        candidate_states = self._getNextStates(from_state, prop_assignments, "Z")
+        if candidate_states:
+            return list(candidate_states)
 
         # If that wasn't possible, try to move closer to the current goal
-        candidates = self._getNextStateBDD(from_state, prop_assignments, "Y")
-        if candidates:
-            return list(self.BDDToStates(candidates))
+        candidate_states = self._getNextStates(from_state, prop_assignments, "Y")
+        if candidate_states:
+            return list(candidate_states)
 
         # If we've gotten here, something's terribly wrong
         raise RuntimeError("No next state could be found.")
 
+    def _getNextStates(self, from_state, prop_assignments, strat_type):
+        """ Return a tuple of all states that can be reached from `from_state`
+            using strategy type `strat_type` and satisfy `prop_assignments`.
+
+            Results are cached, so repeated queries are just a lookup. """
+
+        cache_key = (from_state, frozenset(prop_assignments.iteritems()), strat_type)
+        try:
+            return self.transition_cache[cache_key]
+        except KeyError:
+            pass
+
+        candidate_states = self._enumerateNextStates(from_state, prop_assignments, strat_type)
+        self.transition_cache[cache_key] = candidate_states
+
+        return candidate_states
+
+    def _enumerateNextStates(self, from_state, prop_assignments, strat_type):
+        """ Like _getNextStates(), but without caching. """
+
+        candidates = self._getNextStateBDD(from_state, prop_assignments, strat_type)
+        candidate_states = tuple(self.BDDToStates(candidates))
+
+        if strat_type == "Z":
+            for s in candidate_states:
+                # add 1 to jx
+                s.goal_id = (s.goal_id + 1) % self.num_goals
+
+        return candidate_states
+
     def _getNextStateBDD(self, from_state, prop_assignments, strat_type):
         # Explanation of the strat_type var (from JTLV code):
         #    0. The strategies that do not change the justice pursued
@@ -281,3 +627,84 @@ class BDDStrategy(strategy.Strategy):
 
     def getJxFromBDD(self, bdd):
         return self.jx_domain.propAssignmentsToNumericValue(self.BDDToPropAssignment(bdd, self.jx_domain.getPropositions()))
+
+def usage(script_name):
+    """ Print command-line usage information. """
+
+    print textwrap.dedent("""\
+                              Usage: %s [-hk] [-o output_file] [-r var_order] [-t seconds] spec_file [strategy_file]
+
+                              Optimizes the BDD strategy for spec_file (or the one in strategy_file, if
+                              given; see BDDStrategy.optimize()) and writes it back out, so that it can
+                              be loaded directly in future.
+
+                              -h, --help:
+                                  Display this message
+                              -o FILE, --output FILE:
+                                  Write the optimized strategy to FILE (default: overwrite the original)
+                              -r ORDER, --var-order ORDER:
+                                  Move the comma-separated variables in ORDER to the top of the variable
+                                  order, e.g. "strat_type,_jx_b0" (default: search for a good order)
+                              -k, --keep-stutter:
+                                  Do not remove stutter transitions
+                              -t SECONDS, --sift-time-limit SECONDS:
+                                  With the pure-Python BDD backend, stop searching for a better variable
+                                  order after SECONDS seconds (default: %d) """ % (script_name,
+                                                                                   bddBackends.PythonBDDBackend.SIFT_TIME_LIMIT))
+
+if __name__ == "__main__":
+    import project
+
+    output_filename = None
+    var_order = None
+    remove_stutter = True
+    sift_time_limit = None
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "ho:r:kt:", ["help", "output=", "var-order=", "keep-stutter", "sift-time-limit="])
+    except getopt.GetoptError:
+        logging.exception("Bad arguments")
+        usage(sys.argv[0])
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage(sys.argv[0])
+            sys.exit()
+        elif opt in ("-o", "--output"):
+            output_filename = arg
+        elif opt in ("-r", "--var-order"):
+            var_order = [name.strip() for name in arg.split(",") if name.strip()]
+        elif opt in ("-k", "--keep-stutter"):
+            remove_stutter = False
+        elif opt in ("-t", "--sift-time-limit"):
+            try:
+                sift_time_limit = float(arg)
+            except ValueError:
+                logging.error("Invalid time limit '{}'".format(arg))
+                sys.exit(2)
+
+    if len(args) not in (1, 2):
+        usage(sys.argv[0])
+        sys.exit(2)
+
+    ### Load the project
+    proj = project.Project()
+    proj.loadProject(args[0])
+    spec_map = proj.loadRegionFile(decomposed=True)
+
+    ### Load the strategy
+    strategy_filename = args[1] if len(args) > 1 else proj.getStrategyFilename()
+    if not strategy_filename.endswith(".bdd"):
+        logging.error("Only BDD strategies can be optimized, not {!r}".format(strategy_filename))
+        sys.exit(2)
+
+    region_domain = strategy.Domain("region", spec_map.regions, strategy.Domain.B0_IS_MSB)
+    strat = strategy.createStrategyFromFile(strategy_filename,
+                                            proj.enabled_sensors,
+                                            proj.enabled_actuators + proj.all_customs + [region_domain])
+
+    if sift_time_limit is not None:
+        strat.backend.SIFT_TIME_LIMIT = sift_time_limit
+
+    strat.optimize(var_order, remove_stutter, output_filename or strategy_filename)
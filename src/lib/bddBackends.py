@@ -0,0 +1,779 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+""" ===========================================================================
+    bddBackends.py - Interchangeable implementations of the BDD operations used
+    by bdd.BDDStrategy
+    ===========================================================================
+
+    Two backends are provided:
+
+    * PyCUDDBackend wraps the (patched) pycudd bindings to CUDD.
+      See src/etc/patches/README_PYCUDD for instructions.
+    * PythonBDDBackend is a self-contained implementation, which keeps a
+      hash-consed node table in NumPy arrays.  It is slower than CUDD, but
+      builds anywhere and never frees nodes, so its memory use is predictable.
+      It cannot reorder variables in place: every variable order tried while
+      sifting means rebuilding the BDDs from scratch, so automatic reordering
+      is cut off after PythonBDDBackend.SIFT_TIME_LIMIT seconds.
+
+    BDDs returned by a backend support the operators ``&``, ``|`` and ``~``,
+    can be tested for truth (a BDD is True iff it is not the constant False),
+    and can be used as dictionary keys.  Variables are referred to by their
+    index, as in the DDDMP files produced by the synthesizer.
+"""
+
+import sys
+import time
+import logging
+import numpy
+
+def createBackend(name=None):
+    """ Return a new BDD backend.
+
+        `name` may be either "pycudd" or "python".  If it is None, pycudd will
+        be used if it is available, and the pure-Python backend otherwise. """
+
+    if name is None:
+        try:
+            return PyCUDDBackend()
+        except ImportError:
+            logging.info("pycudd is not available; using pure-Python BDD backend.")
+            return PythonBDDBackend()
+    elif name == "pycudd":
+        return PyCUDDBackend()
+    elif name == "python":
+        return PythonBDDBackend()
+    else:
+        raise ValueError("Unknown BDD backend {!r}.  Choose either 'pycudd' or 'python'.".format(name))
+
+class BDDBackend(object):
+    """
+    The interface that BDDStrategy expects from a BDD backend.
+
+    Only subclasses of BDDBackend should be used.
+    """
+
+    def true(self):
+        """ Return the constant True BDD. """
+
+        raise NotImplementedError("Use a subclass of BDDBackend")
+
+    def false(self):
+        """ Return the constant False BDD. """
+
+        return ~self.true()
+
+    def ithVar(self, index):
+        """ Return the BDD for the variable with index `index`. """
+
+        raise NotImplementedError("Use a subclass of BDDBackend")
+
+    def loadDDDMP(self, filename):
+        """ Load a 0/1 ADD from the DDDMP text file `filename` (matching
+            variables by their IDs), and return it as a BDD. """
+
+        raise NotImplementedError("Use a subclass of BDDBackend")
+
+    def swapVariables(self, bdd, varset1, varset2):
+        """ Return `bdd` with each variable in the list `varset1` exchanged with
+            the variable at the same position in the list `varset2`.  Both
+            lists contain variable BDDs, as returned by ithVar(). """
+
+        raise NotImplementedError("Use a subclass of BDDBackend")
+
+    def existAbstract(self, bdd, variables):
+        """ Return `bdd` with all variables in the list `variables` (of
+            variable BDDs) existentially quantified. """
+
+        raise NotImplementedError("Use a subclass of BDDBackend")
+
+    def iterateOverCubes(self, bdd):
+        """ Yield every cube (i.e. path to the True leaf) of `bdd` as a
+            dictionary from variable index to value[bool].  Variables that
+            do not appear in a cube are don't-cares. """
+
+        raise NotImplementedError("Use a subclass of BDDBackend")
+
+    def printMinterm(self, bdd):
+        """ Print all cubes of `bdd`.  For debugging only. """
+
+        raise NotImplementedError("Use a subclass of BDDBackend")
+
+    def nodeCount(self, bdd):
+        """ Return the number of nodes in `bdd` (including leaves). """
+
+        raise NotImplementedError("Use a subclass of BDDBackend")
+
+    def getVariableOrder(self):
+        """ Return a list of the indices of all variables, from the top of the
+            current variable order to the bottom. """
+
+        raise NotImplementedError("Use a subclass of BDDBackend")
+
+    def reorder(self, roots, order=None):
+        """ Change the variable order, so as to shrink the BDDs in the list `roots`.
+
+            If `order` is given, it is a list of variable indices that will be
+            moved to the top of the order (in that sequence); all other
+            variables keep their relative order.  Otherwise, a new order is
+            found by sifting.
+
+            Returns a list of BDDs equivalent to `roots` under the new order.
+            Any other BDDs created before reordering (including variables)
+            must not be used afterwards, and should be recreated instead. """
+
+        raise NotImplementedError("Use a subclass of BDDBackend")
+
+    def dumpDDDMP(self, bdd, filename, var_names=None, comments=()):
+        """ Write `bdd` to the file `filename` as a 0/1 ADD, in the DDDMP text
+            format read by loadDDDMP().  `var_names` is an optional dictionary
+            from variable index to name, and `comments` is a list of lines to
+            append after the end of the ADD.
+
+            This generic version only uses the other BDD operations: the
+            nodes of the ADD are found by cofactoring `bdd` with respect to
+            each variable in turn, following getVariableOrder(). """
+
+        order = self.getVariableOrder()
+        var_bdds = [self.ithVar(var) for var in order]
+
+        # Number all nodes children-first, with the leaves at 1 (True) and 2 (False)
+        node_ids = {self.true(): 1, self.false(): 2}
+        nodes = []
+        def number(f, level):
+            if f in node_ids:
+                return node_ids[f]
+
+            # Find the first variable that f depends on
+            while True:
+                x = var_bdds[level]
+                high = self.existAbstract(f & x, [x])
+                low = self.existAbstract(f & ~x, [x])
+                if high != low:
+                    break
+                level += 1
+
+            then_id = number(high, level + 1)
+            else_id = number(low, level + 1)
+            nodes.append((order[level], then_id, else_id))
+            node_ids[f] = len(nodes) + 2
+            return node_ids[f]
+
+        root_id = number(bdd, 0)
+
+        used_vars = set(var for var, _, _ in nodes)
+        support = [var for var in order if var in used_vars]
+        _writeDDDMP(filename, nodes, root_id, support, len(order), var_names, comments)
+
+def _writeDDDMP(filename, nodes, root_id, support, num_vars, var_names=None, comments=()):
+    """ Write a 0/1 ADD to the file `filename` in the DDDMP text format.
+
+        `nodes` is a list of (variable index, then node ID, else node ID) for
+        each internal node, children first; the nodes are numbered from 3,
+        with 1 and 2 being the True and False leaves.  `support` lists the
+        variables that appear in the ADD, in order. """
+
+    support_index = {var: idx for idx, var in enumerate(support)}
+
+    with open(filename, "w") as f:
+        f.write(".ver DDDMP-2.0\n")
+        f.write(".mode A\n")
+        f.write(".varinfo 0\n")
+        f.write(".dd strategy\n")
+        f.write(".nnodes {}\n".format(len(nodes) + 2))
+        f.write(".nvars {}\n".format(num_vars))
+        f.write(".nsuppvars {}\n".format(len(support)))
+        if var_names:
+            f.write(".suppvarnames {}\n".format(" ".join(var_names.get(var, "DUMMY{}".format(var)) for var in support)))
+        f.write(".ids {}\n".format(" ".join(str(var) for var in support)))
+        f.write(".permids {}\n".format(" ".join(str(level) for level in xrange(len(support)))))
+        f.write(".nroots 1\n")
+        f.write(".rootids {}\n".format(root_id))
+        f.write(".nodes\n")
+        f.write("1 T 1 0 0\n")
+        f.write("2 T 0 0 0\n")
+        for node_id, (var, then_id, else_id) in enumerate(nodes, 3):
+            f.write("{} {} {} {} {}\n".format(node_id, var, support_index[var], then_id, else_id))
+        f.write(".end\n")
+
+        for line in comments:
+            f.write(line.rstrip("\n") + "\n")
+
+class PyCUDDBackend(BDDBackend):
+    """ BDD backend using the CUDD library, through the pycudd bindings.
+
+        NOTE: This requires a modified version of pycudd!!
+        See src/etc/patches/README_PYCUDD for instructions. """
+
+    def __init__(self):
+        import pycudd
+        self.pycudd = pycudd
+
+        self.mgr = pycudd.DdManager()
+        self.mgr.SetDefault()
+        # TODO: why is garbage collection crashing?? :( [e.g. on firefighting]
+        self.mgr.DisableGarbageCollection()
+
+    def true(self):
+        return self.mgr.ReadOne()
+
+    def ithVar(self, index):
+        return self.mgr.IthVar(index)
+
+    def loadDDDMP(self, filename):
+        a = self.pycudd.DdArray(1)
+
+        # Load in the actual BDD itself
+        # Note: We are using an ADD loader because the BDD loader
+        # would expect us to have a reduced BDD with only one leaf node
+        self.mgr.AddArrayLoad(self.pycudd.DDDMP_ROOT_MATCHLIST,
+                              None,
+                              self.pycudd.DDDMP_VAR_MATCHIDS,
+                              None,
+                              None,
+                              None,
+                              self.pycudd.DDDMP_MODE_TEXT,
+                              filename, None, a)
+
+        # Convert from a binary (0/1) ADD to a BDD
+        return self.mgr.addBddPattern(a[0])
+
+    def _DDArrayFromList(self, elements):
+        # We have to do this silly type conversion because we're using a very loosely-wrapped C library
+        dd_array = self.pycudd.DdArray(len(elements))
+        for idx, el in enumerate(elements):
+            dd_array[idx] = el
+
+        return dd_array
+
+    def swapVariables(self, bdd, varset1, varset2):
+        # Make sure we have an iterator with a len()
+        varset1 = list(varset1)
+        varset2 = list(varset2)
+
+        assert len(varset1) == len(varset2)
+
+        dd_varset1 = self._DDArrayFromList(varset1)
+        dd_varset2 = self._DDArrayFromList(varset2)
+
+        return bdd.SwapVariables(dd_varset1, dd_varset2, len(varset1))
+
+    def existAbstract(self, bdd, variables):
+        cube = reduce(lambda bdd1, bdd2: bdd1 & bdd2, variables, self.true())
+        return bdd.ExistAbstract(cube)
+
+    def iterateOverCubes(self, bdd):
+        for cube in bdd:
+            # Each cube is a tuple with one entry per variable in the manager:
+            # 0 (False), 1 (True) or 2 (don't-care)
+            yield {idx: bool(val) for idx, val in enumerate(cube) if val != 2}
+
+    def printMinterm(self, bdd):
+        bdd.PrintMinterm()
+
+    def nodeCount(self, bdd):
+        return bdd.DagSize()
+
+    def getVariableOrder(self):
+        return [self.mgr.ReadInvPerm(level) for level in xrange(self.mgr.ReadSize())]
+
+    def reorder(self, roots, order=None):
+        if order is None:
+            self.mgr.ReduceHeap(self.pycudd.CUDD_REORDER_SIFT, 0)
+        else:
+            # ShuffleHeap expects a complete list of variables, by level
+            num_vars = self.mgr.ReadSize()
+            current_order = self.getVariableOrder()
+            new_order = list(order) + [v for v in current_order if v not in order]
+
+            permutation = self.pycudd.IntArray(num_vars)
+            for level, var in enumerate(new_order):
+                permutation[level] = var
+            self.mgr.ShuffleHeap(permutation)
+
+        # CUDD reorders in place, so all existing BDDs remain valid
+        return list(roots)
+
+    # pycudd can only store BDDs with complemented edges, which can't be read
+    # back in with the ADD loader, so dumpDDDMP() uses the generic version
+
+class PythonBDDNode(object):
+    """ A reference to a node in a PythonBDDBackend node table. """
+
+    __slots__ = ("backend", "node")
+
+    def __init__(self, backend, node):
+        self.backend = backend
+        self.node = node
+
+    def __and__(self, other):
+        return PythonBDDNode(self.backend, self.backend._and(self.node, other.node))
+
+    def __or__(self, other):
+        return PythonBDDNode(self.backend, self.backend._or(self.node, other.node))
+
+    def __invert__(self):
+        return PythonBDDNode(self.backend, self.backend._not(self.node))
+
+    def __nonzero__(self):
+        return self.node != PythonBDDBackend.FALSE
+
+    def __eq__(self, other):
+        return isinstance(other, PythonBDDNode) and \
+               self.backend is other.backend and self.node == other.node
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.node)
+
+    def __repr__(self):
+        return "<PythonBDDNode {}>".format(self.node)
+
+class PythonBDDBackend(BDDBackend):
+    """
+    A self-contained BDD implementation.
+
+    Nodes are stored in a hash-consed table made up of three NumPy arrays
+    (variable, low child, high child), so that each distinct node exists
+    exactly once and equivalent BDDs are always represented by the same node.
+    Nodes 0 and 1 are the False and True leaves.  Results of recent
+    operations are kept in an operation cache, which is simply emptied
+    whenever it grows beyond `op_cache_size` entries.
+
+    The variable order is given by `var_order`, which maps each variable index
+    to a sort key (lower keys are closer to the root).  By default variables
+    are ordered by their index.
+
+    Unlike CUDD, this backend can't change the variable order in place.
+    Sifting (see reorder()) has to rebuild the BDDs in a new table for every
+    position it tries for every variable, which takes time proportional to
+    the square of the number of variables times the size of the BDDs.  To
+    keep this bounded, sifting gives up after SIFT_TIME_LIMIT seconds and uses
+    the best order found so far.
+    """
+
+    FALSE, TRUE = 0, 1
+
+    # Maximum number of seconds to spend looking for a better variable order
+    # when sifting, since every candidate order means rebuilding the BDDs
+    SIFT_TIME_LIMIT = 30.0
+
+    def __init__(self, initial_capacity=1024, op_cache_size=1000000):
+        self._node_var = numpy.zeros(initial_capacity, dtype=numpy.int32)
+        self._node_low = numpy.zeros(initial_capacity, dtype=numpy.int32)
+        self._node_high = numpy.zeros(initial_capacity, dtype=numpy.int32)
+        self.num_nodes = 2  # Just the leaves
+
+        # Leaves have a variable that sorts after all real variables
+        self._node_var[:2] = -1
+
+        # (var, low, high) -> node
+        self._unique_table = {}
+
+        self.op_cache_size = op_cache_size
+        self._op_cache = {}
+
+        # Variable index -> sort key in the current variable order
+        self.var_order = {}
+
+    #### Node table ####
+
+    def _orderOf(self, node):
+        """ Return the sort key of the variable at `node` (leaves sort last). """
+
+        var = int(self._node_var[node])
+        if var < 0:
+            return sys.maxint
+        return self.var_order.setdefault(var, (var << 20) + var)
+
+    def _mk(self, var, low, high):
+        """ Return the unique node with variable `var` and children `low` and `high`. """
+
+        if low == high:
+            return low
+
+        key = (var, low, high)
+        try:
+            return self._unique_table[key]
+        except KeyError:
+            pass
+
+        if self.num_nodes == len(self._node_var):
+            # Double the size of the table
+            for name in ("_node_var", "_node_low", "_node_high"):
+                setattr(self, name, numpy.concatenate((getattr(self, name),
+                                                       numpy.zeros_like(getattr(self, name)))))
+
+        node = self.num_nodes
+        self._node_var[node] = var
+        self._node_low[node] = low
+        self._node_high[node] = high
+        self.num_nodes += 1
+
+        self._unique_table[key] = node
+
+        return node
+
+    def _setOrder(self, order):
+        """ Place the variables in the list `order` at the top of the
+            variable order, in that sequence. """
+
+        for level, var in enumerate(order):
+            self.var_order[var] = (level << 20) + var
+
+    def _reachableNodes(self, roots):
+        """ Return the set of all nodes reachable from the nodes in `roots`. """
+
+        seen = set()
+        stack = list(roots)
+        while stack:
+            u = stack.pop()
+            if u in seen:
+                continue
+            seen.add(u)
+            if u > self.TRUE:
+                stack.append(int(self._node_low[u]))
+                stack.append(int(self._node_high[u]))
+
+        return seen
+
+    def _support(self, roots):
+        """ Return a list of all variables in the BDDs with nodes `roots`,
+            sorted by the current variable order. """
+
+        support = set(int(self._node_var[u]) for u in self._reachableNodes(roots) if u > self.TRUE)
+        return sorted(support, key=lambda var: self.var_order.setdefault(var, (var << 20) + var))
+
+    def _transferInto(self, target, roots):
+        """ Rebuild the BDDs with nodes `roots` inside the backend `target`,
+            and return a list of the corresponding nodes there. """
+
+        memo = {self.FALSE: target.FALSE, self.TRUE: target.TRUE}
+        def transfer(u):
+            if u not in memo:
+                memo[u] = target._ite(int(self._node_var[u]),
+                                      transfer(int(self._node_high[u])),
+                                      transfer(int(self._node_low[u])))
+            return memo[u]
+
+        return [transfer(u) for u in roots]
+
+    def _sizeWithOrder(self, roots, order):
+        """ Return the number of nodes needed to represent the BDDs with nodes
+            `roots` if the variables were ordered according to `order`. """
+
+        scratch = PythonBDDBackend(op_cache_size=self.op_cache_size)
+        scratch._setOrder(order)
+        return len(scratch._reachableNodes(self._transferInto(scratch, roots)))
+
+    def _sift(self, roots, order, max_growth=1.2, time_limit=None):
+        """ Find a better variable order for the BDDs with nodes `roots` by
+            sifting: each variable in turn is moved through all positions
+            in the order (stopping early in each direction once the BDDs grow
+            by more than `max_growth`) and left at the best one found.
+
+            Sifting stops once `time_limit` seconds (by default,
+            SIFT_TIME_LIMIT) have passed, keeping the best order so far. """
+
+        if time_limit is None:
+            time_limit = self.SIFT_TIME_LIMIT
+        deadline = time.time() + time_limit
+
+        order = list(order)
+        best_size = self._sizeWithOrder(roots, order)
+
+        # Start with the variables that appear in the most nodes
+        node_counts = dict.fromkeys(order, 0)
+        for u in self._reachableNodes(roots):
+            if u > self.TRUE:
+                node_counts[int(self._node_var[u])] += 1
+
+        for var in sorted(order, key=lambda v: -node_counts[v]):
+            pos = order.index(var)
+            rest = order[:pos] + order[pos+1:]
+            best_pos = pos
+
+            for direction in (-1, 1):
+                new_pos = pos + direction
+                while 0 <= new_pos <= len(rest) and time.time() < deadline:
+                    size = self._sizeWithOrder(roots, rest[:new_pos] + [var] + rest[new_pos:])
+                    if size < best_size:
+                        best_size, best_pos = size, new_pos
+                    elif size > max_growth * best_size:
+                        break
+                    new_pos += direction
+
+            order = rest[:best_pos] + [var] + rest[best_pos:]
+
+        return order
+
+    def _split(self, node, order):
+        """ Return the (low, high) cofactors of `node` with respect to the
+            variable with sort key `order`. """
+
+        if self._orderOf(node) == order:
+            return int(self._node_low[node]), int(self._node_high[node])
+        else:
+            return node, node
+
+    def _cacheResult(self, key, result):
+        if len(self._op_cache) >= self.op_cache_size:
+            self._op_cache.clear()
+        self._op_cache[key] = result
+
+        return result
+
+    #### Basic operations ####
+
+    def _not(self, u):
+        if u <= self.TRUE:
+            return 1 - u
+
+        key = ("not", u)
+        try:
+            return self._op_cache[key]
+        except KeyError:
+            pass
+
+        var = int(self._node_var[u])
+        result = self._mk(var, self._not(int(self._node_low[u])), self._not(int(self._node_high[u])))
+
+        return self._cacheResult(key, result)
+
+    def _and(self, u, v):
+        if u == self.FALSE or v == self.FALSE:
+            return self.FALSE
+        if u == self.TRUE or u == v:
+            return v
+        if v == self.TRUE:
+            return u
+
+        return self._apply("and", self._and, u, v)
+
+    def _or(self, u, v):
+        if u == self.TRUE or v == self.TRUE:
+            return self.TRUE
+        if u == self.FALSE or u == v:
+            return v
+        if v == self.FALSE:
+            return u
+
+        return self._apply("or", self._or, u, v)
+
+    def _apply(self, op_name, op, u, v):
+        """ Recursive (Shannon expansion) step for the binary, commutative
+            operation `op` on non-leaf nodes. """
+
+        if u > v:
+            u, v = v, u
+
+        key = (op_name, u, v)
+        try:
+            return self._op_cache[key]
+        except KeyError:
+            pass
+
+        order = min(self._orderOf(u), self._orderOf(v))
+        top = int(self._node_var[u if self._orderOf(u) == order else v])
+        u_low, u_high = self._split(u, order)
+        v_low, v_high = self._split(v, order)
+
+        result = self._mk(top, op(u_low, v_low), op(u_high, v_high))
+
+        return self._cacheResult(key, result)
+
+    def _ite(self, var, high, low):
+        """ Return the node for "if `var` then `high` else `low`", regardless
+            of where `var` lies in the variable order. """
+
+        x = self._mk(var, self.FALSE, self.TRUE)
+        return self._or(self._and(x, high), self._and(self._not(x), low))
+
+    #### BDDBackend interface ####
+
+    def _wrap(self, node):
+        return PythonBDDNode(self, node)
+
+    def true(self):
+        return self._wrap(self.TRUE)
+
+    def false(self):
+        return self._wrap(self.FALSE)
+
+    def ithVar(self, index):
+        return self._wrap(self._mk(index, self.FALSE, self.TRUE))
+
+    def loadDDDMP(self, filename):
+        # Header fields we care about
+        ids = None
+        permids = None
+        root_ids = None
+
+        with open(filename, "r") as f:
+            for line in f:
+                tokens = line.split()
+                if not tokens:
+                    continue
+                elif tokens[0] == ".ids":
+                    ids = [int(t) for t in tokens[1:]]
+                elif tokens[0] == ".permids":
+                    permids = [int(t) for t in tokens[1:]]
+                elif tokens[0] == ".rootids":
+                    root_ids = [int(t) for t in tokens[1:]]
+                elif tokens[0] == ".nodes":
+                    break
+            else:
+                raise ValueError("No nodes found in DDDMP file {!r}".format(filename))
+
+            if root_ids is None:
+                raise ValueError("No root node specified in DDDMP file {!r}".format(filename))
+
+            # If we don't have any other BDDs yet, adopt the variable order
+            # from the file, so that it can be loaded without any reordering
+            if ids is not None and permids is not None and self.num_nodes == 2:
+                for var, level in zip(ids, permids):
+                    self.var_order[var] = (level << 20) + var
+
+            def child(node_id):
+                # Negative IDs denote complemented edges
+                if node_id < 0:
+                    return self._not(nodes[-node_id])
+                return nodes[node_id]
+
+            # File node ID -> our node.  Nodes are always listed children-first.
+            nodes = {}
+            for line in f:
+                tokens = line.split()
+                if not tokens:
+                    continue
+                if tokens[0] == ".end":
+                    break
+
+                node_id = int(tokens[0])
+                if tokens[1] == "T":
+                    # Leaf node; convert from a binary (0/1) ADD to a BDD
+                    nodes[node_id] = self.TRUE if float(tokens[2]) != 0 else self.FALSE
+                else:
+                    # The last three fields are always the variable index
+                    # (within the list of support variables), then, and else
+                    var, then_id, else_id = [int(t) for t in tokens[-3:]]
+                    if ids is not None:
+                        var = ids[var]
+                    nodes[node_id] = self._ite(var, child(then_id), child(else_id))
+
+        return self._wrap(child(root_ids[0]))
+
+    def swapVariables(self, bdd, varset1, varset2):
+        varset1 = [int(self._node_var[v.node]) for v in varset1]
+        varset2 = [int(self._node_var[v.node]) for v in varset2]
+
+        assert len(varset1) == len(varset2)
+
+        var_map = dict(zip(varset1, varset2))
+        var_map.update(zip(varset2, varset1))
+
+        memo = {}
+        def rename(u):
+            if u <= self.TRUE:
+                return u
+            if u not in memo:
+                var = int(self._node_var[u])
+                memo[u] = self._ite(var_map.get(var, var),
+                                    rename(int(self._node_high[u])),
+                                    rename(int(self._node_low[u])))
+            return memo[u]
+
+        return self._wrap(rename(bdd.node))
+
+    def existAbstract(self, bdd, variables):
+        quantified = set(int(self._node_var[v.node]) for v in variables)
+
+        memo = {}
+        def abstract(u):
+            if u <= self.TRUE:
+                return u
+            if u not in memo:
+                var = int(self._node_var[u])
+                low = abstract(int(self._node_low[u]))
+                high = abstract(int(self._node_high[u]))
+                if var in quantified:
+                    memo[u] = self._or(low, high)
+                else:
+                    memo[u] = self._mk(var, low, high)
+            return memo[u]
+
+        return self._wrap(abstract(bdd.node))
+
+    def iterateOverCubes(self, bdd):
+        # Depth-first walk over all paths to the True leaf
+        stack = [(bdd.node, {})]
+        while stack:
+            u, cube = stack.pop()
+            if u == self.TRUE:
+                yield cube
+            elif u != self.FALSE:
+                var = int(self._node_var[u])
+                for value, child in ((True, int(self._node_high[u])), (False, int(self._node_low[u]))):
+                    child_cube = dict(cube)
+                    child_cube[var] = value
+                    stack.append((child, child_cube))
+
+    def printMinterm(self, bdd):
+        num_vars = max(self.var_order.keys() or [-1]) + 1
+        for cube in self.iterateOverCubes(bdd):
+            print "".join(("1" if cube[i] else "0") if i in cube else "-" for i in xrange(num_vars)), 1
+
+    def nodeCount(self, bdd):
+        return len(self._reachableNodes([bdd.node]))
+
+    def getVariableOrder(self):
+        for var in set(int(v) for v in self._node_var[2:self.num_nodes]):
+            self.var_order.setdefault(var, (var << 20) + var)
+
+        return sorted(self.var_order, key=self.var_order.get)
+
+    def reorder(self, roots, order=None):
+        root_nodes = [r.node for r in roots]
+        current_order = self._support(root_nodes)
+
+        if order is None:
+            new_order = self._sift(root_nodes, current_order)
+        else:
+            new_order = list(order) + [v for v in current_order if v not in order]
+
+        # Rebuild everything in a fresh node table, and then switch over to it
+        fresh = PythonBDDBackend(op_cache_size=self.op_cache_size)
+        fresh._setOrder(new_order)
+        new_root_nodes = self._transferInto(fresh, root_nodes)
+
+        self._node_var = fresh._node_var
+        self._node_low = fresh._node_low
+        self._node_high = fresh._node_high
+        self.num_nodes = fresh.num_nodes
+        self._unique_table = fresh._unique_table
+        self._op_cache = fresh._op_cache
+        self.var_order = fresh.var_order
+
+        return [self._wrap(u) for u in new_root_nodes]
+
+    def dumpDDDMP(self, bdd, filename, var_names=None, comments=()):
+        # We can read the nodes straight out of the table, since there are
+        # no complemented edges
+        node_ids = {self.TRUE: 1, self.FALSE: 2}
+        nodes = []
+        def number(u):
+            if u not in node_ids:
+                number(int(self._node_low[u]))
+                number(int(self._node_high[u]))
+                nodes.append((int(self._node_var[u]), node_ids[int(self._node_high[u])],
+                              node_ids[int(self._node_low[u])]))
+                node_ids[u] = len(nodes) + 2
+        number(bdd.node)
+
+        support = self._support([bdd.node])
+        num_vars = max(support + (var_names.keys() if var_names else []) + [-1]) + 1
+
+        _writeDDDMP(filename, nodes, node_ids[bdd.node], support, num_vars, var_names, comments)
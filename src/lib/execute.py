@@ -6,7 +6,7 @@
 
     This module executes a hybrid controller for a robot in a simulated or real environment.
 
-    :Usage: ``execute.py [-hn] [-p listen_port] [-a automaton_file] [-s spec_file]``
+    :Usage: ``execute.py [-hnel] [-p listen_port] [-a automaton_file] [-s spec_file] [-c control_period]``
 
     * The controlling automaton is imported from the specified ``automaton_file``.
 
@@ -16,6 +16,10 @@
     * If no port to listen on is specified, an open one will be chosen randomly.
     * Unless otherwise specified with the ``-n`` or ``--no_gui`` option, a status/control window
       will also be opened for informational purposes.
+    * The controller runs once every ``control_period`` seconds (default 0.05).  With the ``-e`` or
+      ``--event-driven`` option, it also runs as soon as a sensor handler reports a change.
+    * With the ``-l`` or ``--measure-latency`` option, the time taken by each phase of execution
+      is recorded, made available over XML-RPC, and reported on shutdown.
 """
 
 import sys, os, getopt, textwrap
@@ -37,6 +41,7 @@ import fsa, project
 import handlerSubsystem
 import strategy
 from copy import deepcopy
+from collections import deque
 from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
 import xmlrpclib
 import socket
@@ -46,6 +51,7 @@ import traceback
 from resynthesis import ExecutorResynthesisExtensions
 from executeStrategy import ExecutorStrategyExtensions
 import globalConfig, logging
+import latencyStats
 
 
 ####################
@@ -56,7 +62,7 @@ def usage(script_name):
     """ Print command-line usage information. """
 
     print textwrap.dedent("""\
-                              Usage: %s [-hn] [-p listen_port] [-a automaton_file] [-s spec_file]
+                              Usage: %s [-hnelP] [-p listen_port] [-a automaton_file] [-s spec_file] [-c control_period]
 
                               -h, --help:
                                   Display this message
@@ -67,7 +73,247 @@ def usage(script_name):
                               -a FILE, --aut-file FILE:
                                   Load automaton from FILE
                               -s FILE, --spec-file FILE:
-                                  Load experiment configuration from FILE """ % script_name)
+                                  Load experiment configuration from FILE
+                              -c SECONDS, --control-period SECONDS:
+                                  Run the controller every SECONDS seconds (default: 0.05)
+                              -e, --event-driven:
+                                  Also run the controller immediately whenever sensors report a change
+                              -l, --measure-latency:
+                                  Record how long each phase of execution takes
+                              -P, --precompute-successors:
+                                  For BDD strategies, find the successors of all reachable states up front """ % script_name)
+
+class IterationScheduler(object):
+    """
+    Decides when the executor's main loop should run its next iteration.
+
+    Iterations are scheduled every `period` seconds.  Deadlines are
+    computed from the previous deadline rather than from when the previous
+    iteration finished, so that the rate doesn't drift; if we fall more than
+    a whole period behind, we start over from the current time instead of
+    trying to catch up.
+
+    If `event_driven` is True, notify() (e.g. on a change in sensor values)
+    makes the loop run its next iteration immediately.  interrupt() always
+    does, and is meant for pausing or quitting.
+    """
+
+    def __init__(self, period, event_driven=False, timer_func=time.time):
+        self.period = period
+        self.event_driven = event_driven
+        self.timer_func = timer_func
+
+        self._wakeup = threading.Event()
+        self._next_deadline = None
+
+    def reset(self):
+        """ Forget about any previous deadlines (e.g. after being paused). """
+
+        self._next_deadline = None
+
+    def notify(self):
+        """ Signal that something has changed that the next iteration should
+            respond to.  Ignored if the scheduler is not event-driven. """
+
+        if self.event_driven:
+            self._wakeup.set()
+
+    def interrupt(self):
+        """ Make the current (or next) wait() return immediately. """
+
+        self._wakeup.set()
+
+    def wait(self):
+        """ Block until the next iteration should be run.  Returns True if we
+            were woken up early by notify() or interrupt(). """
+
+        now = self.timer_func()
+
+        if self._next_deadline is None or now - self._next_deadline > self.period:
+            self._next_deadline = now
+        self._next_deadline += self.period
+
+        woken_early = self._wakeup.wait(max(0, self._next_deadline - now))
+        self._wakeup.clear()
+
+        if woken_early:
+            # Restart the schedule from this iteration
+            self._next_deadline = self.timer_func()
+
+        return bool(woken_early)
+
+class AsyncEventSender(object):
+    """
+    Sends events to a remote XML-RPC event target (e.g. simGUI) from a
+    background thread, so that posting an event never blocks the caller.
+
+    Events wait in a queue holding at most `max_queue_size` events; any more
+    are dropped (and counted).  For event types in `coalesced_types` only the
+    most recent event is kept, since older ones are obsolete anyway; it takes
+    the place in the queue of the oldest unsent event of its type, so events
+    are always sent in the order they were first posted.  Queued
+    events are sent in batches of up to `max_batch_size` using a single
+    XML-RPC multicall (falling back to individual calls if the target doesn't
+    support multicalls).
+
+    If the target can't be reached, it is unsubscribed and any queued events
+    are discarded.
+    """
+
+    def __init__(self, max_queue_size=1000, coalesced_types=("POSE", "FREQ"), max_batch_size=100):
+        self.max_queue_size = max_queue_size
+        self.coalesced_types = frozenset(coalesced_types)
+        self.max_batch_size = max_batch_size
+
+        self.target = None
+        self.use_multicall = True
+
+        self._condition = threading.Condition()
+        self._queue = deque()         # [eventType, eventData] in order
+        self._coalesced = {}          # eventType -> its entry in the queue, for coalesced types
+        self._sending = False         # Whether a batch is being sent right now
+        self._stopping = False
+        self._thread = None
+
+        # Statistics
+        self.sent_count = 0
+        self.dropped_count = 0
+        self.coalesced_count = 0
+
+    def setTarget(self, target):
+        """ Start sending events to the XML-RPC server proxy `target`
+            (or stop sending any, if `target` is None). """
+
+        with self._condition:
+            self.target = target
+            self.use_multicall = True
+            self._queue.clear()
+            self._coalesced.clear()
+
+            if target is not None and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="AsyncEventSender")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def post(self, eventType, eventData=None):
+        """ Queue an event for sending.  Never blocks on the network. """
+
+        with self._condition:
+            if self.target is None or self._stopping:
+                return
+
+            if eventType in self._coalesced:
+                # Replace the obsolete event that's still waiting to be sent
+                self._coalesced[eventType][1] = eventData
+                self.coalesced_count += 1
+            elif len(self._queue) >= self.max_queue_size:
+                self.dropped_count += 1
+                return
+            else:
+                entry = [eventType, eventData]
+                self._queue.append(entry)
+                if eventType in self.coalesced_types:
+                    self._coalesced[eventType] = entry
+
+            self._condition.notify()
+
+    def getStatistics(self):
+        """ Return a dictionary of counts of sent, dropped, coalesced and
+            currently-queued events. """
+
+        with self._condition:
+            return {"sent": self.sent_count,
+                    "dropped": self.dropped_count,
+                    "coalesced": self.coalesced_count,
+                    "queued": len(self._queue)}
+
+    def stop(self, timeout=1.0):
+        """ Try to send any queued events within `timeout` seconds, and then
+            stop the sender thread. """
+
+        deadline = time.time() + timeout
+        with self._condition:
+            while (self._queue or self._sending) and self.target is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            self._stopping = True
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _takeBatch(self):
+        """ Remove and return the next batch of events.  Must be called with
+            the lock held. """
+
+        batch = []
+        while self._queue and len(batch) < self.max_batch_size:
+            eventType, eventData = self._queue.popleft()
+            # Later events of this type can't be merged into this one anymore
+            self._coalesced.pop(eventType, None)
+            batch.append((eventType, eventData))
+
+        return batch
+
+    def _sendBatch(self, target, batch):
+        """ Send all the events in `batch` to `target`. """
+
+        if self.use_multicall and len(batch) > 1:
+            multicall = xmlrpclib.MultiCall(target)
+            for eventType, eventData in batch:
+                multicall.handleEvent(eventType, eventData)
+
+            try:
+                # Iterate over the results to raise any faults
+                for _ in multicall():
+                    pass
+                return
+            except xmlrpclib.Fault as e:
+                if "system.multicall" not in e.faultString:
+                    raise
+
+                logging.debug("Event target does not support multicalls; sending events one at a time.")
+                self.use_multicall = False
+
+        for eventType, eventData in batch:
+            target.handleEvent(eventType, eventData)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopping:
+                    self._condition.wait()
+
+                if self._stopping:
+                    return
+
+                target = self.target
+                batch = self._takeBatch()
+                self._sending = True
+
+            # Don't hold the lock while we're talking to the target
+            try:
+                self._sendBatch(target, batch)
+            except (socket.error, xmlrpclib.Error) as e:
+                with self._condition:
+                    # Forget about the target, unless it has been replaced in the meantime
+                    if self.target is target:
+                        self.target = None
+                        self._queue.clear()
+                        self._coalesced.clear()
+                    self._sending = False
+                    self._condition.notify_all()
+
+                logging.warning("Could not send event to remote event target: %s", e)
+                logging.warning("Forcefully unsubscribing target.")
+            else:
+                with self._condition:
+                    self.sent_count += len(batch)
+                    self._sending = False
+                    self._condition.notify_all()
 
 class LTLMoPExecutor(ExecutorStrategyExtensions,ExecutorResynthesisExtensions, object):
     """
@@ -75,13 +321,32 @@ class LTLMoPExecutor(ExecutorStrategyExtensions,ExecutorResynthesisExtensions, o
     with a set of handlers (as specified in a .config file) to create and run a hybrid controller
     """
 
-    def __init__(self):
+    # Default time between iterations of the main loop, in seconds
+    DEFAULT_CONTROL_PERIOD = 0.05
+
+    # Phases of each iteration that are timed when measuring latency
+    TIMED_PHASES = ["sensor", "strategy", "motion", "actuator", "gui"]
+
+    def __init__(self, control_period=DEFAULT_CONTROL_PERIOD, event_driven=False, measure_latency=False,
+                 precompute_successors=False):
         """
-        Create a new execution context object
+        Create a new execution context object.
+
+        The main loop runs once every `control_period` seconds.  If
+        `event_driven` is True, it also runs immediately whenever a sensor
+        handler calls notifySensorChange().
+
+        If `measure_latency` is True, the time spent in each phase of every
+        iteration is recorded (see getLatencyStatistics()).
+
+        If `precompute_successors` is True, BDD strategies are switched to
+        eager mode as soon as they are loaded, so that finding the next state
+        doesn't require any BDD operations (see BDDStrategy.precomputeSuccessors()).
         """
         super(LTLMoPExecutor, self).__init__()
 
         self.proj = project.Project() # this is the project that we are currently using to execute
+        self.hsub = None
         self.strategy = None
 
         # Choose a timer func with maximum accuracy for given platform
@@ -92,26 +357,34 @@ class LTLMoPExecutor(ExecutorStrategyExtensions,ExecutorResynthesisExtensions, o
 
         self.externalEventTarget = None
         self.externalEventTargetRegistered = threading.Event()
-        self.postEventLock = threading.Lock()
+        self.eventSender = AsyncEventSender()
         self.runStrategy = threading.Event()  # Start out paused
         self.alive = threading.Event()
         self.alive.set()
 
+        # Set whenever runStrategy or alive changes, to wake up the idle loop
+        self.runStateChanged = threading.Event()
+
+        self.scheduler = IterationScheduler(control_period, event_driven, self.timer_func)
+
+        # Per-phase latency histograms
+        self.phase_timer = latencyStats.PhaseTimer(self.TIMED_PHASES, enabled=measure_latency,
+                                                   timer_func=self.timer_func)
+
         self.current_outputs = {}     # keep track on current outputs values (for actuations)
 
+        self.precompute_successors = precompute_successors
+
     def postEvent(self, eventType, eventData=None):
-        """ Send a notice that an event occurred, if anyone wants it """
+        """ Send a notice that an event occurred, if anyone wants it.
+            Events are sent in the background, so this never blocks. """
 
-        with self.postEventLock:
-            if self.externalEventTarget is None:
-                return
+        self.eventSender.post(eventType, eventData)
 
-            try:
-                self.externalEventTarget.handleEvent(eventType, eventData)
-            except socket.error as e:
-                logging.warning("Could not send event to remote event target: %s", e)
-                logging.warning("Forcefully unsubscribing target.")
-                self.externalEventTarget = None
+    def getEventStatistics(self):
+        """ Return counts of events sent, dropped, coalesced and queued """
+
+        return self.eventSender.getStatistics()
 
     def loadSpecFile(self, filename):
         # Update with this new project
@@ -131,29 +404,64 @@ class LTLMoPExecutor(ExecutorStrategyExtensions,ExecutorResynthesisExtensions, o
         region_domain = strategy.Domain("region",  self.proj.rfi.regions, strategy.Domain.B0_IS_MSB)
         strat = strategy.createStrategyFromFile(filename,
                                                 self.proj.enabled_sensors,
-                                                self.proj.enabled_actuators + self.proj.all_customs +  [region_domain])
+                                                self.proj.enabled_actuators + self.proj.all_customs +  [region_domain],
+                                                precompute_successors=self.precompute_successors)
 
         return strat
 
     def _getCurrentRegionFromPose(self, rfi=None):
-        # TODO: move this to regions.py
         if rfi is None:
             rfi = self.proj.rfi
 
         pose = self.hsub.coordmap_lab2map(self.hsub.getPose())
 
-        region = next((i for i, r in enumerate(rfi.regions) if r.name.lower() != "boundary" and \
-                        r.objectContainsPoint(*pose)), None)
+        region = rfi.findRegionContainingPoint(pose[0], pose[1], ignore_boundary=True)
 
         if region is None:
             logging.warning("Pose of {} not inside any region!".format(pose))
 
         return region
 
+    def notifySensorChange(self):
+        """ Let the executor know that a sensor value has changed, so that
+            it can respond right away (if running in event-driven mode).
+            Safe to call from any thread. """
+
+        self.scheduler.notify()
+
+    def setControlPeriod(self, period):
+        """ Change the time between iterations of the main loop, in seconds """
+
+        if period <= 0:
+            raise ValueError("Control period must be positive")
+
+        self.scheduler.period = period
+
+    def getLatencyStatistics(self, lifetime=False):
+        """ Return a dictionary of phase name -> latency statistics (in
+            milliseconds) for the phases of each iteration, covering the
+            last minute or so, or the whole run if `lifetime` is True.
+
+            Returns an empty dictionary if latency measurement is disabled. """
+
+        if not self.phase_timer.enabled:
+            return {}
+
+        return self.phase_timer.getStatistics(lifetime)
+
+    def setLatencyMeasurement(self, enabled):
+        """ Turn per-phase latency measurement on or off """
+
+        self.phase_timer.enabled = bool(enabled)
+
     def shutdown(self):
         self.runStrategy.clear()
+        self.scheduler.interrupt()
         logging.info("QUITTING.")
 
+        if self.phase_timer.enabled:
+            logging.info("Latency statistics for this run:\n" + self.phase_timer.formatReport())
+
         all_handler_types = ['init', 'pose', 'locomotionCommand', 'drive', 'motionControl', 'sensor', 'actuator']
 
         for htype in all_handler_types:
@@ -173,17 +481,30 @@ class LTLMoPExecutor(ExecutorStrategyExtensions,ExecutorResynthesisExtensions, o
             else:
                 logging.debug("{} handler not found in h_instance".format(htype))
 
+        if self.hsub is not None:
+            self.hsub.stopSensorPool()
+
+        # Give any remaining events a chance to reach the GUI
+        self.eventSender.stop()
+        event_stats = self.eventSender.getStatistics()
+        if event_stats["dropped"] > 0:
+            logging.warning("{dropped} events were dropped because the event queue was full".format(**event_stats))
+
         self.alive.clear()
+        self.runStateChanged.set()
 
     def pause(self):
         """ pause execution of the automaton """
         self.runStrategy.clear()
+        self.scheduler.interrupt()
+        self.runStateChanged.set()
         time.sleep(0.1) # Wait for FSA to stop
         self.postEvent("PAUSE")
 
     def resume(self):
         """ start/resume execution of the automaton """
         self.runStrategy.set()
+        self.runStateChanged.set()
 
     def isRunning(self):
         """ return whether the automaton is currently executing """
@@ -191,9 +512,10 @@ class LTLMoPExecutor(ExecutorStrategyExtensions,ExecutorResynthesisExtensions, o
 
     def registerExternalEventTarget(self, address):
         self.externalEventTarget = xmlrpclib.ServerProxy(address, allow_none=True)
+        self.eventSender.setTarget(self.externalEventTarget)
 
         # Redirect all output to the log
-        redir = RedirectText(self.externalEventTarget.handleEvent)
+        redir = RedirectText(self.postEvent)
 
         sys.stdout = redir
         sys.stderr = redir
@@ -230,8 +552,7 @@ class LTLMoPExecutor(ExecutorStrategyExtensions,ExecutorResynthesisExtensions, o
         # make sure the coord transformation function is ready
         # get the main robot config
         robot_config = self.hsub.executing_config.getRobotByName(self.hsub.executing_config.main_robot)
-        self.hsub.coordmap_map2lab, self.hsub.coordmap_lab2map = robot_config.getCoordMaps()
-        self.proj.coordmap_map2lab, self.proj.coordmap_lab2map = robot_config.getCoordMaps()
+        self.hsub.setCoordinateTransform(robot_config.getCoordinateTransform())
 
 
         # Import the relevant handlers
@@ -303,9 +624,8 @@ class LTLMoPExecutor(ExecutorStrategyExtensions,ExecutorResynthesisExtensions, o
 
     def run(self):
         ### Get everything moving
-        # Rate limiting is approximately 20Hz
-        avg_freq = 20
-        last_gui_update_time = 0
+        avg_freq = 1.0 / self.scheduler.period
+        last_iteration_time = None
 
         # FIXME: don't crash if no spec file is loaded initially
         while self.alive.isSet():
@@ -313,9 +633,15 @@ class LTLMoPExecutor(ExecutorStrategyExtensions,ExecutorResynthesisExtensions, o
             if not self.runStrategy.isSet():
                 self.hsub.setVelocity(0,0)
 
-                # wait for either the FSA to unpause or for termination
-                while (not self.runStrategy.wait(0.1)) and self.alive.isSet():
-                    pass
+                # wait for either the FSA to unpause or for termination.
+                # The timeout is needed because an untimed Event.wait() can't
+                # be interrupted by Ctrl-C in Python 2, and we're on the main thread.
+                while self.alive.isSet() and not self.runStrategy.isSet():
+                    self.runStateChanged.wait(1.0)
+                    self.runStateChanged.clear()
+
+                self.scheduler.reset()
+                last_iteration_time = None
 
             # Exit immediately if we're quitting
             if not self.alive.isSet():
@@ -326,24 +652,20 @@ class LTLMoPExecutor(ExecutorStrategyExtensions,ExecutorResynthesisExtensions, o
 
             tic = self.timer_func()
             self.runStrategyIteration()
-            toc = self.timer_func()
 
             #self.checkForInternalFlags()
 
-            # Rate limiting of execution and GUI update
-            while (toc - tic) < 0.05:
-                time.sleep(0.005)
-                toc = self.timer_func()
-
             # Update GUI
-            # If rate limiting is disabled in the future add in rate limiting here for the GUI:
-            # if show_gui and (timer_func() - last_gui_update_time > 0.05)
-            avg_freq = 0.9 * avg_freq + 0.1 * 1 / (toc - tic) # IIR filter
-            self.postEvent("FREQ", int(math.ceil(avg_freq)))
-            pose = self.hsub.getPose(cached=True)[0:2]
-            self.postEvent("POSE", tuple(map(int, self.hsub.coordmap_lab2map(pose))))
+            if last_iteration_time is not None and tic > last_iteration_time:
+                avg_freq = 0.9 * avg_freq + 0.1 * 1 / (tic - last_iteration_time) # IIR filter
+            last_iteration_time = tic
+            with self.phase_timer.measure("gui"):
+                self.postEvent("FREQ", int(math.ceil(avg_freq)))
+                pose = self.hsub.getPose(cached=True)[0:2]
+                self.postEvent("POSE", tuple(map(int, self.hsub.coordmap_lab2map(pose))))
 
-            last_gui_update_time = self.timer_func()
+            # Wait until the next iteration is due (or something happens)
+            self.scheduler.wait()
 
         logging.debug("execute.py quitting...")
 
@@ -372,7 +694,9 @@ class RedirectText:
 # Main function, run when called from command-line #
 ####################################################
 
-def execute_main(listen_port=None, spec_file=None, aut_file=None, show_gui=False):
+def execute_main(listen_port=None, spec_file=None, aut_file=None, show_gui=False,
+                 control_period=LTLMoPExecutor.DEFAULT_CONTROL_PERIOD, event_driven=False, measure_latency=False,
+                 precompute_successors=False):
     logging.info("Hello. Let's do this!")
 
     # Create the XML-RPC server
@@ -390,7 +714,7 @@ def execute_main(listen_port=None, spec_file=None, aut_file=None, show_gui=False
         xmlrpc_server = SimpleXMLRPCServer(("127.0.0.1", listen_port), logRequests=False, allow_none=True)
 
     # Create the execution context object
-    e = LTLMoPExecutor()
+    e = LTLMoPExecutor(control_period, event_driven, measure_latency, precompute_successors)
 
     # Register functions with the XML-RPC server
     xmlrpc_server.register_instance(e)
@@ -436,9 +760,15 @@ if __name__ == "__main__":
     spec_file = None
     show_gui = True
     listen_port = None
+    control_period = LTLMoPExecutor.DEFAULT_CONTROL_PERIOD
+    event_driven = False
+    measure_latency = False
+    precompute_successors = False
 
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hnp:a:s:", ["help", "no-gui", "xmlrpc-listen-port=", "aut-file=", "spec-file="])
+        opts, args = getopt.getopt(sys.argv[1:], "hnp:a:s:c:elP", ["help", "no-gui", "xmlrpc-listen-port=", "aut-file=", "spec-file=",
+                                                             "control-period=", "event-driven", "measure-latency",
+                                                             "precompute-successors"])
     except getopt.GetoptError:
         logging.exception("Bad arguments")
         usage(sys.argv[0])
@@ -460,5 +790,20 @@ if __name__ == "__main__":
             aut_file = arg
         elif opt in ("-s", "--spec-file"):
             spec_file = arg
-
-    execute_main(listen_port, spec_file, aut_file, show_gui)
+        elif opt in ("-c", "--control-period"):
+            try:
+                control_period = float(arg)
+                if control_period <= 0:
+                    raise ValueError
+            except ValueError:
+                logging.error("Invalid control period '{}'".format(arg))
+                sys.exit(2)
+        elif opt in ("-e", "--event-driven"):
+            event_driven = True
+        elif opt in ("-l", "--measure-latency"):
+            measure_latency = True
+        elif opt in ("-P", "--precompute-successors"):
+            precompute_successors = True
+
+    execute_main(listen_port, spec_file, aut_file, show_gui, control_period, event_driven, measure_latency,
+                 precompute_successors)
@@ -36,7 +36,8 @@ class ExecutorStrategyExtensions(object):
 
                 # Run any actuator handlers if appropriate
                 if key in self.proj.enabled_actuators:
-                    self.hsub.setActuatorValue({key:output_val})
+                    with self.phase_timer.measure("actuator"):
+                        self.hsub.setActuatorValue({key:output_val})
 
                 self.current_outputs[key] = output_val
 
@@ -48,11 +49,13 @@ class ExecutorStrategyExtensions(object):
         self.current_region = self.strategy.current_state.getPropValue('region')
 
         # Take a snapshot of our current sensor readings
-        sensor_state = self.hsub.getSensorValue(self.proj.enabled_sensors)
+        with self.phase_timer.measure("sensor"):
+            sensor_state = self.hsub.getSensorValue(self.proj.enabled_sensors)
 
         # Let's try to transition
         # TODO: set current state so that we don't need to call from_state
-        next_states = self.strategy.findTransitionableStates(sensor_state, from_state= self.strategy.current_state)
+        with self.phase_timer.measure("strategy"):
+            next_states = self.strategy.findTransitionableStates(sensor_state, from_state= self.strategy.current_state)
 
         # Make sure we have somewhere to go
         if len(next_states) == 0:
@@ -91,7 +94,8 @@ class ExecutorStrategyExtensions(object):
 
         if not self.arrived:
             # Move one step towards the next region (or stay in the same region)
-            self.arrived = self.hsub.gotoRegion(self.current_region, self.next_region)
+            with self.phase_timer.measure("motion"):
+                self.arrived = self.hsub.gotoRegion(self.current_region, self.next_region)
 
         # Check for completion of motion
         if self.arrived and self.next_state != self.strategy.current_state:
@@ -2,123 +2,889 @@
 # -*- coding: UTF-8 -*-
 
 import re
+import os
+import mmap
+import array
+import struct
+import hashlib
+import tempfile
+import numpy
 import strategy
 import logging
+import globalConfig
 import sys
 import time
-from collections import defaultdict
+import collections
+
+# Minimum time (in seconds) between progress messages while loading large files
+PROGRESS_REPORT_INTERVAL = 2.0
+
+# Header of binary automaton cache files: magic string, format version,
+# array item size, byte order flag, source file modification time and size,
+# source file hash, proposition configuration hash, number of states, row
+# stride, number of transitions, goal table size
+CACHE_MAGIC = b"LTLMoP-AUTC"
+CACHE_VERSION = 2
+CACHE_HEADER = struct.Struct("<11sHBBdQ20s20sQIQQ")
+
+# Where the source file modification time and size are in the header
+CACHE_STAMP = struct.Struct("<dQ")
+CACHE_STAMP_OFFSET = struct.calcsize("<11sHBB")
+
+# Translation tables that map each byte value to "1" or "0" depending on
+# whether the given bit is set
+_BIT_TO_CHAR_TABLES = ["".join("1" if (c >> bit) & 1 else "0" for c in xrange(256))
+                       for bit in xrange(8)]
+
+def _toBytes(data):
+    """ Return the contents of `data` (a bytearray, array or numpy array) as a string. """
+
+    if isinstance(data, (numpy.ndarray, array.array)):
+        return data.tostring()
+    else:
+        return bytes(data)
+
+def _iterateBitset(bitset):
+    """ Yield the positions of all set bits in the integer `bitset`,
+        in ascending order. """
+
+    # Reversing the binary string puts the lowest bit first, after which we
+    # can let str.find() skip over the zeros
+    bits = bin(bitset)[:1:-1]
+    pos = bits.find("1")
+    while pos != -1:
+        yield pos
+        pos = bits.find("1", pos + 1)
+
+class PackedStates(object):
+    """
+    A compact, array-backed store for the states and transitions of an
+    explicit-state automaton.
+
+    Each state occupies one fixed-width row of the bytearray `rows`, in which
+    the value of the k-th binary proposition in `prop_names` is stored as bit
+    (k % 8) of byte (k // 8).  Successors are kept in CSR form: the indices of
+    the successors of state i are `succ_indices[succ_offsets[i]:succ_offsets[i+1]]`.
+    Goal IDs are interned in `goal_table` and referenced by index from the
+    parallel array `goal_indices`.
+
+    States must be added in order, each followed by a call to addSuccessors().
+    Once all states have been added, buildIndex() sets up an inverted index
+    from each proposition to the set of states in which it is True, stored as
+    a bitset (i.e. a Python integer whose i-th bit corresponds to state i).
+    The bitset for each proposition is only computed the first time it is
+    needed.
+
+    Tables loaded from a cache file (see loadFromCacheFile()) are read-only,
+    and their arrays are numpy arrays backed directly by the memory-mapped file.
+    """
+
+    def __init__(self, prop_names=()):
+        # Names of the binary propositions (i.e. with all domains expanded)
+        self.prop_names = list(prop_names)
+        self.prop_bits = {name: k for k, name in enumerate(self.prop_names)}
+
+        # Number of bytes per state row
+        self.stride = max(1, (len(self.prop_names) + 7) // 8)
+
+        self.rows = bytearray()
+        self.state_ids = array.array('l')    # State numbers assigned by the synthesizer
+        self.goal_indices = array.array('l') # Index into goal_table for each state
+        self.goal_table = []                 # All distinct goal IDs
+
+        self.succ_offsets = array.array('l', [0])
+        self.succ_indices = array.array('l')
+
+        # goal ID -> index into goal_table
+        self._goal_lookup = {}
+
+        # Proposition bit position -> bitset of states in which it is True,
+        # or None if that bitset hasn't been computed yet
+        self._prop_index = None
+
+    def __len__(self):
+        return len(self.state_ids)
+
+    def addState(self, state_id, goal_id, true_bits):
+        """ Append a new state with synthesizer-assigned number `state_id`,
+            goal ID `goal_id`, and in which exactly the propositions at the
+            bit positions in `true_bits` are True.  Returns the index of the
+            new state. """
+
+        index = len(self.state_ids)
+        base = len(self.rows)
+        self.rows.extend(b"\x00" * self.stride)
+
+        for k in true_bits:
+            self.rows[base + (k >> 3)] |= 1 << (k & 7)
+
+        self.state_ids.append(state_id)
+        self.goal_indices.append(self._internGoal(goal_id))
+
+        return index
+
+    def addSuccessors(self, indices):
+        """ Record the successors of the most recently-added state that does
+            not have any successors recorded yet. """
+
+        self.succ_indices.extend(indices)
+        self.succ_offsets.append(len(self.succ_indices))
+
+    def resolveSuccessorIDs(self):
+        """ Convert the successors of all states from synthesizer-assigned
+            state numbers (as written in the automaton file, where they may
+            refer to states that have not been read yet) to state indices. """
+
+        if not self.state_ids:
+            return
+
+        # Build a state number -> index lookup table
+        lookup = array.array('l', [-1]) * (max(self.state_ids) + 1)
+        for index, state_id in enumerate(self.state_ids):
+            lookup[state_id] = index
+
+        for pos, state_id in enumerate(self.succ_indices):
+            if state_id >= len(lookup) or lookup[state_id] == -1:
+                raise ValueError("Transition to unknown state {}.".format(state_id))
+            self.succ_indices[pos] = lookup[state_id]
+
+    def _internGoal(self, goal_id):
+        try:
+            return self._goal_lookup[goal_id]
+        except KeyError:
+            self.goal_table.append(goal_id)
+            self._goal_lookup[goal_id] = len(self.goal_table) - 1
+            return self._goal_lookup[goal_id]
+
+    def buildIndex(self):
+        """ (Re)build the inverted proposition index.  Must be called
+            after any states are added. """
+
+        self._prop_index = [None] * len(self.prop_names)
+
+    def _getPropBitset(self, k):
+        """ Return the bitset of states in which the k-th proposition is True. """
+
+        bitset = self._prop_index[k]
+        if bitset is None:
+            # Pull out the byte containing this proposition for every state,
+            # and convert it to a string of "0"s and "1"s (lowest state first)
+            column = _toBytes(self.rows[(k >> 3)::self.stride])
+            column = column.translate(_BIT_TO_CHAR_TABLES[k & 7])
+            bitset = self._prop_index[k] = int(column[::-1], 2) if column else 0
+
+        return bitset
+
+    def findMatchingIndices(self, constraints):
+        """ Return an iterator over the indices (in ascending order) of all
+            states that satisfy `constraints`, a list of (bit position, value)
+            pairs.  Uses the inverted index, so buildIndex() must have been
+            called already. """
+
+        if self._prop_index is None:
+            raise RuntimeError("Index has not been built yet.")
+
+        all_states = (1 << len(self)) - 1
+        matches = all_states
+        for k, value in constraints:
+            if value:
+                matches &= self._getPropBitset(k)
+            else:
+                matches &= all_states ^ self._getPropBitset(k)
+
+            if not matches:
+                return iter(())
+
+        return _iterateBitset(matches)
+
+    def rowSatisfies(self, index, constraints):
+        """ Returns True iff state `index` satisfies `constraints`, a list of
+            (bit position, value) pairs. """
+
+        row = index * self.stride
+        return all(bool((self.rows[row + (k >> 3)] >> (k & 7)) & 1) == value
+                   for k, value in constraints)
+
+    def saveToCacheFile(self, filename, source_stamp, source_hash, config_hash):
+        """ Write this table to the binary cache file `filename`.  The cache will
+            only be considered valid for a source file with (modification time,
+            size) `source_stamp` or SHA-1 digest `source_hash`, and a
+            proposition configuration with digest `config_hash`.
+
+            The file is written to a uniquely-named temporary file first and
+            then renamed into place, so a partially-written cache will never be
+            read, even if several processes write the same cache at once. """
+
+        goal_data = b"\n".join(self.goal_table)
+        header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION,
+                                   self.state_ids.itemsize, sys.byteorder == "little",
+                                   source_stamp[0], source_stamp[1], source_hash, config_hash,
+                                   len(self), self.stride, len(self.succ_indices), len(goal_data))
+
+        fd, tmp_filename = tempfile.mkstemp(prefix=os.path.basename(filename) + ".",
+                                            suffix=".tmp", dir=os.path.dirname(filename) or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(_toBytes(self.rows))
+                for a in (self.state_ids, self.goal_indices, self.succ_offsets, self.succ_indices):
+                    f.write(_toBytes(a))
+                f.write(goal_data)
+
+            if os.name == "nt" and os.path.exists(filename):
+                # Windows won't let us rename onto an existing file
+                os.remove(filename)
+            os.rename(tmp_filename, filename)
+        except:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+
+    @classmethod
+    def loadFromCacheFile(cls, filename, prop_names, source_stamp, get_source_hash, config_hash):
+        """ Load a table from the binary cache file `filename`.  The file is
+            memory-mapped, and the table's arrays are views of the mapping
+            rather than copies of it.
+
+            Returns None if the cache does not exist, or was not created from
+            the source file and a proposition configuration with digest
+            `config_hash`.  The source file is assumed to be unchanged if its
+            (modification time, size) still matches `source_stamp`; otherwise,
+            `get_source_hash()` is called to compare its SHA-1 digest, and if
+            that matches, the cache is updated with the new `source_stamp` so
+            that the file doesn't need to be hashed again next time. """
+
+        try:
+            f = open(filename, "rb")
+        except IOError:
+            return None
+
+        with f:
+            if os.fstat(f.fileno()).st_size < CACHE_HEADER.size:
+                return None
+
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, itemsize, little_endian, cached_mtime, cached_size, cached_source_hash,
+         cached_config_hash, num_states, stride, num_transitions, goal_data_size) = CACHE_HEADER.unpack_from(data)
+
+        packed = cls(prop_names)
+
+        if (magic, version, cached_config_hash, stride) != \
+           (CACHE_MAGIC, CACHE_VERSION, config_hash, packed.stride) or \
+           itemsize != packed.state_ids.itemsize or little_endian != (sys.byteorder == "little"):
+            data.close()
+            return None
+
+        stamp_changed = (cached_mtime, cached_size) != tuple(source_stamp)
+        if stamp_changed and cached_source_hash != get_source_hash():
+            data.close()
+            return None
+
+        sizes = [num_states * stride] + \
+                [length * itemsize for length in (num_states, num_states, num_states + 1, num_transitions)] + \
+                [goal_data_size]
+        if CACHE_HEADER.size + sum(sizes) != len(data):
+            data.close()
+            raise ValueError("Automaton cache file {!r} is corrupted.".format(filename))
+
+        if stamp_changed:
+            # The source file was touched, but its contents are the same
+            updateCacheFileStamp(filename, source_stamp)
+
+        # Map each section in turn.  The arrays keep the mapping open for as
+        # long as they're in use.
+        pos = CACHE_HEADER.size
+        packed.rows = numpy.frombuffer(data, numpy.uint8, sizes[0], pos)
+        pos += sizes[0]
+
+        arrays = []
+        for length, size in zip((num_states, num_states, num_states + 1, num_transitions), sizes[1:5]):
+            arrays.append(numpy.frombuffer(data, numpy.int_, length, pos))
+            pos += size
+        packed.state_ids, packed.goal_indices, packed.succ_offsets, packed.succ_indices = arrays
+
+        packed.goal_table = data[pos:pos+goal_data_size].split(b"\n") if num_states > 0 else []
+        packed._goal_lookup = {goal_id: n for n, goal_id in enumerate(packed.goal_table)}
+
+        packed.buildIndex()
+
+        return packed
+
+    def getBit(self, index, k):
+        """ Return the value of the k-th proposition in state `index`. """
+
+        return bool((self.rows[index * self.stride + (k >> 3)] >> (k & 7)) & 1)
+
+    def getGoalID(self, index):
+        return self.goal_table[self.goal_indices[index]]
+
+    def getSuccessors(self, index):
+        """ Return the indices of all successors of state `index`. """
+
+        return self.succ_indices[self.succ_offsets[index]:self.succ_offsets[index+1]]
+
+def updateCacheFileStamp(filename, source_stamp):
+    """ Record the source file (modification time, size) `source_stamp` in
+        the header of the existing cache file `filename`.  Failing to do so
+        is not an error; the source file will just be hashed again next time. """
+
+    try:
+        with open(filename, "r+b") as f:
+            f.seek(CACHE_STAMP_OFFSET)
+            f.write(CACHE_STAMP.pack(*source_stamp))
+    except EnvironmentError as e:
+        logging.debug("Could not update automaton cache file {!r}: {}".format(filename, e))
+
+def getFileStamp(filename):
+    """ Return the (modification time, size) of the file `filename`, which is
+        a much cheaper (if less certain) way of noticing changes than hashFile(). """
+
+    st = os.stat(filename)
+    return (st.st_mtime, st.st_size)
+
+def hashFile(filename):
+    """ Return the SHA-1 digest of the contents of the file `filename`. """
+
+    h = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+
+    return h.digest()
+
+def hashPropositionConfiguration(prop_names):
+    """ Return a digest identifying the packed row layout for the binary
+        propositions `prop_names`. """
+
+    return hashlib.sha1("\n".join(prop_names)).digest()
+
+def getCacheFilename(filename):
+    """ Return the name of the binary cache file for automaton file `filename`
+        (e.g. "foo.aut" -> "foo.autc"). """
+
+    return filename + "c"
+
+def loadPackedStatesFromFile(filename, prop_names, use_mmap=True):
+    """
+    Read the automaton file `filename` produced by a synthesizer, such as JTLV
+    or Slugs, and return a PackedStates table over the binary propositions
+    `prop_names`.
+
+    The file is read line-by-line in a single pass, so it never needs to be held
+    in memory in its entirety.  If `use_mmap` is True, the file is memory-mapped
+    instead of being read through a normal file buffer.
+    """
+
+    packed = PackedStates(prop_names)
+    all_bits = (1 << len(packed.prop_names)) - 1
+
+    # A magical regex to slurp up a state and its information all at once
+    state_re = re.compile(r"^\s*State (?P<state_id>\d+) with rank (?P<goal_id>[\d\(\),-]+) -> <(?P<conds>(?:\w+:\d(?:, )?)*)>", re.IGNORECASE)
+    successors_re = re.compile(r"^\s*With successors\s*:\s*(?P<ends>\d+(?:\s*,\s*\d+)*)", re.IGNORECASE)
+
+    # Cache of "PROP:VALUE" term -> (bit position, value), since the same
+    # terms appear over and over again
+    term_cache = {}
+
+    def parse_term(term, state_id):
+        prop_name, _, prop_value = term.partition(":")
+
+        #### TEMPORARY HACK: REMOVE ME AFTER OTHER COMPONENTS ARE UPDATED!!!
+        # Rewrite proposition names to make the old bitvector system work
+        # with the new one
+        prop_name = re.sub(r'^bit(\d+)$', r'region_b\1', prop_name)
+        #################################################################
+
+        if prop_name not in packed.prop_bits:
+            raise ValueError("Unknown proposition/domain {!r}".format(prop_name))
+
+        # Cast string "0" or "1" to appropriate boolean values
+        if prop_value not in ("0", "1"):
+            raise ValueError("Proposition '{}' value of {!r} in state {} is invalid.".format(prop_name, prop_value, state_id))
+
+        return packed.prop_bits[prop_name], prop_value == "1"
+
+    with open(filename, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+
+        if use_mmap and file_size > 0:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            lines = iter(source.readline, "")
+        else:
+            source = None
+            lines = f
+
+        bytes_read = 0
+        last_report_time = globalConfig.best_timer()
+
+        # Whether the most recently read state still needs its successors recorded
+        pending_successors = False
+
+        try:
+            for line in lines:
+                bytes_read += len(line)
+
+                m = state_re.match(line)
+                if m is not None:
+                    if pending_successors:
+                        packed.addSuccessors(())
+
+                    # Get the State ID (at least the number that JTLV assigned the
+                    # state; JTLV deletes states during optimization, resulting in
+                    # non-consecutive numbering which would be bad for binary encoding
+                    # efficiency, so we don't use these numbers internally except as
+                    # state names) and Goal ID ("rank" is a misnomer in the JTLV
+                    # output; actually corresponds to index of currently pursued goal
+                    # -- aka "jx").
+                    state_id = m.group('state_id')
+
+                    true_bits = []
+                    assigned_bits = 0
+                    conds = m.group('conds')
+                    for term in (conds.split(", ") if conds else ()):
+                        try:
+                            k, value = term_cache[term]
+                        except KeyError:
+                            k, value = term_cache[term] = parse_term(term, state_id)
+
+                        if value:
+                            true_bits.append(k)
+                        assigned_bits |= 1 << k
+
+                    if assigned_bits != all_bits:
+                        missing = [name for k, name in enumerate(packed.prop_names) if not (assigned_bits >> k) & 1]
+                        raise ValueError("State {} does not assign a value to proposition(s) {}.".format(state_id, ", ".join(missing)))
+
+                    packed.addState(int(state_id), m.group('goal_id'), true_bits)
+                    pending_successors = True
+                elif pending_successors and line.strip():
+                    # Successors are recorded using state numbers for now, because
+                    # they might refer to states that we haven't read yet
+                    m = successors_re.match(line)
+                    if m is not None:
+                        packed.addSuccessors(int(end) for end in m.group('ends').split(","))
+                    else:
+                        # e.g. "With no successors."
+                        packed.addSuccessors(())
+                    pending_successors = False
+
+                # Let people know how things are going with big files
+                now = globalConfig.best_timer()
+                if now - last_report_time > PROGRESS_REPORT_INTERVAL:
+                    logging.info("Loading automaton... {:.0%} ({} states)".format(float(bytes_read)/file_size, len(packed)))
+                    last_report_time = now
+        finally:
+            if source is not None:
+                source.close()
+
+    if pending_successors:
+        packed.addSuccessors(())
+
+    packed.resolveSuccessorIDs()
+    packed.buildIndex()
+
+    return packed
+
+def loadPackedStates(filename, prop_names, use_cache=True, use_mmap=True):
+    """
+    Return a PackedStates table for the automaton file `filename` over the
+    binary propositions `prop_names`.
+
+    If `use_cache` is True, the table is read from the binary cache file next
+    to `filename` if that is up-to-date, and otherwise the automaton file is
+    parsed and the cache is (re)created.  `use_mmap` is passed on to
+    loadPackedStatesFromFile().
+
+    This is a plain function so that it can also be run in worker processes
+    (see strategy.createStrategiesFromFiles()).
+    """
+
+    if not use_cache:
+        packed = loadPackedStatesFromFile(filename, prop_names, use_mmap)
+        logging.info("Loaded %d states.", len(packed))
+        return packed
+
+    # Try the cache first
+    cache_filename = getCacheFilename(filename)
+    source_stamp = getFileStamp(filename)
+    config_hash = hashPropositionConfiguration(prop_names)
+
+    try:
+        packed = PackedStates.loadFromCacheFile(cache_filename, prop_names, source_stamp,
+                                                lambda: hashFile(filename), config_hash)
+    except (ValueError, struct.error, EnvironmentError) as e:
+        logging.warning("Could not read automaton cache file {!r}: {}".format(cache_filename, e))
+        packed = None
+
+    if packed is not None:
+        logging.info("Loaded %d states from cache file %r.", len(packed), cache_filename)
+        return packed
+
+    # Hash the file before parsing it, so that the cache can't end up
+    # claiming to match a version of the file that we didn't parse
+    source_hash = hashFile(filename)
+    packed = loadPackedStatesFromFile(filename, prop_names, use_mmap)
+
+    try:
+        packed.saveToCacheFile(cache_filename, source_stamp, source_hash, config_hash)
+    except EnvironmentError as e:
+        logging.warning("Could not write automaton cache file {!r}: {}".format(cache_filename, e))
+
+    # All done, hooray!
+    logging.info("Loaded %d states.", len(packed))
+
+    return packed
+
+def savePackedStatesToFile(packed, filename):
+    """
+    Write the PackedStates table `packed` to the file `filename`, in the same
+    automaton format that loadPackedStatesFromFile() reads.
+    """
+
+    #### TEMPORARY HACK: REMOVE ME AFTER OTHER COMPONENTS ARE UPDATED!!!
+    # Write region bits the way that the synthesizer does
+    file_prop_names = [re.sub(r'^region_b(\d+)$', r'bit\1', name) for name in packed.prop_names]
+    #################################################################
+
+    with open(filename, "w") as f:
+        for i in xrange(len(packed)):
+            conds = ", ".join("{}:{}".format(name, int(packed.getBit(i, k)))
+                              for k, name in enumerate(file_prop_names))
+            f.write("State {} with rank {} -> <{}>\n".format(packed.state_ids[i], packed.getGoalID(i), conds))
+
+            successors = packed.getSuccessors(i)
+            if len(successors) > 0:
+                f.write("\tWith successors : {}\n".format(", ".join(str(packed.state_ids[j]) for j in successors)))
+            else:
+                f.write("\tWith no successors.\n")
+
+def minimizePackedStates(packed):
+    """
+    Return a new PackedStates table in which all bisimilar states of `packed`
+    have been merged.
+
+    Two states are bisimilar if they have the same proposition values and
+    goal, and for every successor of one there is a bisimilar successor of
+    the other.  Merging them therefore does not change which sequences of
+    proposition values (and goals) the automaton can produce.
+
+    The coarsest such partition is found by partition refinement: starting
+    from blocks of states with identical values and goals, each block in a
+    worklist is used as a splitter, dividing every other block into the states
+    that do and don't have a successor in the splitter.  Whenever a block is
+    split, its parts are added back to the worklist.  The first state of each
+    block (and its state number) is used to represent the block.
+    """
+
+    num_states = len(packed)
+
+    # Build the predecessor lists in CSR form
+    pred_counts = array.array('l', [0]) * (num_states + 1)
+    for j in packed.succ_indices:
+        pred_counts[j+1] += 1
+    pred_offsets = array.array('l', [0]) * (num_states + 1)
+    for i in xrange(num_states):
+        pred_offsets[i+1] = pred_offsets[i] + pred_counts[i+1]
+    pred_indices = array.array('l', [0]) * len(packed.succ_indices)
+    fill = array.array('l', pred_offsets)
+    for i in xrange(num_states):
+        for j in packed.getSuccessors(i):
+            pred_indices[fill[j]] = i
+            fill[j] += 1
+
+    # Initial partition: states with the same row and goal
+    blocks = []
+    block_of = array.array('l', [0]) * num_states
+    label_to_block = {}
+    stride = packed.stride
+    for i in xrange(num_states):
+        label = (_toBytes(packed.rows[i*stride:(i+1)*stride]), packed.goal_indices[i])
+        b = label_to_block.get(label)
+        if b is None:
+            b = label_to_block[label] = len(blocks)
+            blocks.append(set())
+        blocks[b].add(i)
+        block_of[i] = b
+
+    worklist = collections.deque(xrange(len(blocks)))
+    in_worklist = set(worklist)
+
+    while worklist:
+        splitter = worklist.popleft()
+        in_worklist.discard(splitter)
+
+        # Find all states with a successor in the splitter, grouped by block
+        hits = {}
+        for j in blocks[splitter]:
+            for pos in xrange(pred_offsets[j], pred_offsets[j+1]):
+                i = pred_indices[pos]
+                hits.setdefault(block_of[i], set()).add(i)
+
+        for b, hit in hits.iteritems():
+            if len(hit) == len(blocks[b]):
+                continue
+
+            # Split the block, moving whichever part is smaller
+            moved = hit if 2*len(hit) <= len(blocks[b]) else blocks[b] - hit
+            blocks[b] -= moved
+            new_b = len(blocks)
+            blocks.append(moved)
+            for i in moved:
+                block_of[i] = new_b
+
+            worklist.append(new_b)
+            in_worklist.add(new_b)
+            if b not in in_worklist:
+                worklist.append(b)
+                in_worklist.add(b)
+
+    # Build the quotient, keeping the states in their original order
+    representatives = sorted(min(block) for block in blocks)
+    new_index = {block_of[rep]: n for n, rep in enumerate(representatives)}
+
+    minimized = PackedStates(packed.prop_names)
+    for rep in representatives:
+        minimized.addState(packed.state_ids[rep], packed.getGoalID(rep),
+                           [k for k in xrange(len(packed.prop_names)) if packed.getBit(rep, k)])
+
+        successors = []
+        for j in packed.getSuccessors(rep):
+            n = new_index[block_of[j]]
+            if n not in successors:
+                successors.append(n)
+        minimized.addSuccessors(successors)
+
+    minimized.buildIndex()
+
+    return minimized
+
+class PackedState(strategy.State):
+    """
+    A lightweight view of a single state stored in a PackedStates table.
+
+    Views are created on demand, and read their proposition values directly
+    from the packed rows.  Like any other State, a view is equal to (and hashes
+    the same as) every state in the same StateCollection with the same
+    assignment and goal.  Assigning a value to any proposition detaches the
+    view from the table (after copying over all of its values), after which
+    it behaves exactly like a normal State.
+    """
+
+    def __init__(self, parent, packed, index):
+        super(PackedState, self).__init__(parent)
+
+        self.packed = packed
+        self.index = index
+
+        self.state_id = str(packed.state_ids[index])
+        self.goal_id = packed.getGoalID(index)
+
+    def getPropValue(self, name):
+        """ Return the value of the proposition `name` in this state. """
+
+        if self.packed is None or name in self.assignment:
+            return super(PackedState, self).getPropValue(name)
+
+        k = self.packed.prop_bits.get(name)
+        if k is not None:
+            return self.packed.getBit(self.index, k)
+
+        domain = self.context.getDomainByName(name)
+        if domain is not None:
+            return domain.propAssignmentsToValue(self.getPropValues(domain.getPropositions()))
+
+        raise ValueError("Proposition of name '{}' is undefined in this state".format(name))
+
+    def setPropValue(self, prop_name, prop_value):
+        """ Sets the assignment of propositions `prop_name` to `prop_value` in this state.
+            This detaches the state from its packed table. """
+
+        if self.packed is not None:
+            self.assignment = {name: self.packed.getBit(self.index, k)
+                               for k, name in enumerate(self.packed.prop_names)}
+            self.packed = None
+            self.index = None
+
+        super(PackedState, self).setPropValue(prop_name, prop_value)
+
+    def __eq__(self, other):
+        # Two views of the same row are certainly equal, but different rows
+        # may still hold the same assignment and goal
+        if self.packed is not None and isinstance(other, PackedState) and \
+           self.packed is other.packed and self.index == other.index:
+            return True
+
+        return super(PackedState, self).__eq__(other)
 
 class FSAStrategy(strategy.Strategy):
     """
     An automaton object is a collection of state objects along with information about the
     current state of the automaton when being executed.
+
+    States and transitions are kept in a packed, array-backed table (see
+    PackedStates); State objects are only created as views when they are
+    requested.
     """
 
     def __init__(self):
         super(FSAStrategy, self).__init__()
 
-        # A collection of state objects belonging to the automaton
+        # A state collection that provides the proposition context for our
+        # states.  Note that the states themselves are not stored here.
         self.states = strategy.StateCollection()
 
-        # A data structure for recording valid transitions between states
-        self.transitions = defaultdict(lambda: defaultdict(bool)) # (state1, state2) -> T/F
+        # The packed table of states and transitions
+        self.packed = PackedStates()
+
+        # Whether to memory-map automaton files when loading them
+        self.use_mmap = True
+
+        # Whether to use (and create) binary cache files, to avoid parsing
+        # the same automaton file over and over again
+        self.use_cache = True
+
+        # State key -> index of the first state in the packed table with that
+        # key, built on demand by getStateIndex()
+        self._key_index = None
+        self._key_index_packed = None
 
     def _loadFromFile(self, filename):
         """
         Create an automaton by reading in a file produced by a synthesizer,
         such as JTLV or Slugs.
-
-        Basically just a lot of regexes.
         """
 
         # Clear any existing states
         self.states.clearStates()
 
-        # Initialize our state ID -> state object mapping, for fast lookup
-        state_by_id = {}
-
-        # Load the whole file into memory
-        with open(filename, "r") as f:
-            fsa_description = f.read()
-
-        ###################
-        # Read in states: #
-        ###################
-
-        # A magical regex to slurp up a state and its information all at once
-        p = re.compile(r"State (?P<state_id>\d+) with rank (?P<goal_id>[\d\(\),-]+) -> <(?P<conds>(?:\w+:\d(?:, )?)+)>", re.IGNORECASE|re.MULTILINE)
-
-        m = p.finditer(fsa_description)
-
-        # Now, for each state we find:
-        for match in m:
-            # We'll add transitions later; first we have to create all the
-            # states so we can refer to them when we define transitions
-
-            # Get the State ID (at least the number that JTLV assigned the
-            # state; JTLV deletes states during optimization, resulting in
-            # non-consecutive numbering which would be bad for binary encoding
-            # efficiency, so we don't use these numbers internally except as
-            # state names) and Goal ID ("rank" is a misnomer in the JTLV
-            # output; actually corresponds to index of currently pursued goal
-            # -- aka "jx").  This is the easy part.
-
-            new_state = self.states.addNewState()
-            new_state.state_id = match.group('state_id')
-            new_state.goal_id = match.group('goal_id')
-
-            # A regex so we can iterate over "PROP = VALUE" terms
-            p2 = re.compile(r"(?P<var>\w+):(?P<val>\d)", re.IGNORECASE|re.MULTILINE)
-            for prop_setting in p2.finditer(match.group('conds')):
-                # Set the value of the proposition, casting string "0" or "1" to
-                # appropriate boolean values
-                prop_name, prop_value = prop_setting.groups()
-
-                #### TEMPORARY HACK: REMOVE ME AFTER OTHER COMPONENTS ARE UPDATED!!!
-                # Rewrite proposition names to make the old bitvector system work
-                # with the new one
-                prop_name = re.sub(r'^bit(\d+)$', r'region_b\1', prop_name)
-                #################################################################
-
-                if prop_value == "0":
-                    new_state.setPropValue(prop_name, False)
-                elif prop_value == "1":
-                    new_state.setPropValue(prop_name, True)
-                else:
-                    raise ValueError("Proposition '{}' value of {!r} in state {} is invalid.".format(prop_name, prop_value, new_state.state_id))
-
-            # Update mapping
-            state_by_id[new_state.state_id] = new_state
-
-        ########################
-        # Read in transitions: #
-        ########################
-
-        # Another simple regex, this time for reading in transition definitions
-        p = re.compile(r"State (?P<start>\d+)[^\n]+\s*With successors : (?P<ends>(?:\d+(?:, )?)+)", re.IGNORECASE|re.MULTILINE)
-        m = p.finditer(fsa_description)
-
-        # For each line:
-        for match in m:
-            # Get the state that the transitions come FROM
-            start = match.group('start')
-            # And make a list of the states that the transitions go TO
-            ends = match.group('ends').split(', ')
-
-            for end in ends:
-                self.transitions[state_by_id[start]][state_by_id[end]] = True
-
-        # All done, hooray!
-        logging.info("Loaded %d states.", len(self.states))
+        prop_names = self.states.getPropositions(expand_domains=True)
+        self.packed = loadPackedStates(filename, prop_names, self.use_cache, self.use_mmap)
+
+    def setPackedStates(self, packed):
+        """ Use the already-loaded PackedStates table `packed` (e.g. from
+            loadPackedStates()), whose propositions must match this strategy's
+            configuration. """
+
+        prop_names = self.states.getPropositions(expand_domains=True)
+        if packed.prop_names != prop_names:
+            raise ValueError("Packed states do not match the configured propositions")
+
+        self.states.clearStates()
+        self.packed = packed
+
+    def minimize(self):
+        """ Merge all bisimilar states (see minimizePackedStates()).
+
+            Existing views of states (including the current state) should be
+            looked up again with getStateIndex() afterwards.  Returns the new
+            number of states. """
+
+        old_size = len(self.packed)
+
+        tic = globalConfig.best_timer()
+        self.packed = minimizePackedStates(self.packed)
+        toc = globalConfig.best_timer()
+
+        logging.info("Minimized automaton from %d to %d states in %f seconds.", old_size, len(self.packed), toc-tic)
+
+        return len(self.packed)
+
+    def saveToFile(self, filename):
+        """ Write the automaton to the file `filename`, in the format produced
+            by the synthesizer.  If caching is enabled, a matching binary cache
+            file is written too. """
+
+        savePackedStatesToFile(self.packed, filename)
+
+        if self.use_cache:
+            prop_names = self.states.getPropositions(expand_domains=True)
+            self.packed.saveToCacheFile(getCacheFilename(filename), getFileStamp(filename),
+                                        hashFile(filename), hashPropositionConfiguration(prop_names))
+
+        logging.info("Wrote %d states to file %r.", len(self.packed), filename)
+
+    def getState(self, index):
+        """ Return a view of the state at position `index` in the packed table. """
+
+        return PackedState(self.states, self.packed, index)
+
+    def getStateIndex(self, state):
+        """ Return the position of `state` in the packed table.
+
+            Raises ValueError if the state is not part of this strategy. """
+
+        if isinstance(state, PackedState) and state.packed is self.packed:
+            return state.index
+
+        # Otherwise, look for a packed state with the same assignment and goal
+        if state.context is self.states:
+            if self._key_index_packed is not self.packed:
+                self._key_index = {}
+                for i in xrange(len(self.packed) - 1, -1, -1):
+                    self._key_index[self.getState(i).getKey()] = i
+                self._key_index_packed = self.packed
+
+            index = self._key_index.get(state.getKey())
+        else:
+            # Keys are only comparable within the same StateCollection
+            match = next((s for s in self.searchForStates(state.getAll())
+                          if s.goal_id == state.goal_id), None)
+            index = None if match is None else match.index
+
+        if index is None:
+            raise ValueError("State {!r} is not part of this strategy".format(state))
+
+        return index
+
+    def iterateOverStates(self):
+        """ Returns an iterator over all known states. """
+
+        return (self.getState(i) for i in xrange(len(self.packed)))
+
+    def _propAssignmentToConstraints(self, prop_assignments):
+        """ Convert `prop_assignments` into a list of (bit position, value)
+            pairs for querying the packed table.
+
+            Returns None if the assignment cannot be satisfied by any state
+            (e.g. because it assigns a value that is outside of a domain). """
+
+        try:
+            prop_assignments = self.states.expandDomainsInPropAssignment(prop_assignments)
+        except ValueError:
+            return None
+
+        constraints = []
+        for prop_name, prop_value in prop_assignments.iteritems():
+            if prop_name not in self.packed.prop_bits:
+                raise ValueError("Proposition of name '{}' is undefined in this state".format(prop_name))
+            if prop_value not in (True, False):
+                return None
+            constraints.append((self.packed.prop_bits[prop_name], bool(prop_value)))
+
+        return constraints
 
     def searchForStates(self, prop_assignments, state_list=None):
         """ Returns an iterator for the subset of all known states (or a subset
             specified in `state_list`) that satisfy `prop_assignments`. """
 
+        constraints = self._propAssignmentToConstraints(prop_assignments)
+        if constraints is None:
+            return iter(())
+
         if state_list is None:
-            state_list = self.states
+            # Look up all matching states in the index
+            return (self.getState(i) for i in self.packed.findMatchingIndices(constraints))
+
+        # Otherwise, check the states we were given, directly against the
+        # packed table wherever possible
+        def state_satisfies(s):
+            if isinstance(s, PackedState) and s.packed is self.packed:
+                return self.packed.rowSatisfies(s.index, constraints)
+            else:
+                return s.satisfies(prop_assignments)
 
-        satisfying_states = (s for s in state_list if s.satisfies(prop_assignments))
+        satisfying_states = (s for s in state_list if state_satisfies(s))
 
         return satisfying_states
 
@@ -132,6 +898,7 @@ class FSAStrategy(strategy.Strategy):
                 raise ValueError("You must specify from_state if no current_state is set.")
             from_state = self.current_state
 
-        transitionable_states = self.searchForStates(prop_assignments, state_list=self.transitions[from_state])
+        successors = (self.getState(i) for i in self.packed.getSuccessors(self.getStateIndex(from_state)))
+        transitionable_states = self.searchForStates(prop_assignments, state_list=successors)
 
         return list(transitionable_states)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+""" ===========================================================================
+    handlerIndex.py - Index of handler metadata, gathered without importing
+    ===========================================================================
+
+    Finding out which methods a handler has (and what their parameters are)
+    used to require importing every handler module, which pulls in all of
+    their dependencies (ROS, NAO, NXT, OMPL, ...) just to read some
+    docstrings.  Instead, handler source files are inspected statically by
+    parsing them into an AST, and the results are cached on disk so that they
+    only need to be recomputed when a handler file changes.
+
+    Handler modules are still imported when a handler is actually
+    instantiated (see HandlerSubsystem.prepareHandler()).
+"""
+
+import os
+import ast
+import json
+import logging
+import globalConfig
+import handlers.handlerTemplates as ht
+
+# Bump this whenever the format of the information stored changes
+INDEX_VERSION = 1
+
+DEFAULT_INDEX_FILENAME = os.path.join(globalConfig.get_ltlmop_root(), "lib", "handlers", ".handler_index.json")
+
+TEMPLATES_FILENAME = os.path.splitext(ht.__file__)[0] + ".py"
+
+def getHandlerFilename(handler_module_path):
+    """ Return the source file for a handler module path such as
+        "lib.handlers.share.Sensor.DummySensorHandler". """
+
+    parts = handler_module_path.split(".")
+    if parts[0] == "lib":
+        parts = parts[1:]
+
+    return os.path.join(globalConfig.get_ltlmop_root(), "lib", *parts) + ".py"
+
+def _getBaseName(node):
+    """ Return the name of the class referred to by the base class expression
+        `node` (e.g. "SensorHandler" for `handlerTemplates.SensorHandler`),
+        or None if it's not a plain (dotted) name. """
+
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    elif isinstance(node, ast.Name):
+        return node.id
+    else:
+        return None
+
+def _isStaticMethod(node):
+    return any(_getBaseName(d) == "staticmethod" for d in node.decorator_list)
+
+def _getClassMethods(class_node):
+    """ Return a dictionary of method name -> method information for each
+        method defined in the body of `class_node`, in the same form that
+        inspectHandlerFile() uses. """
+
+    methods = {}
+    for node in class_node.body:
+        if isinstance(node, ast.FunctionDef) and not _isStaticMethod(node):
+            methods[node.name] = {"name": node.name,
+                                  "doc": ast.get_docstring(node),
+                                  "args": [a.id for a in node.args.args if isinstance(a, ast.Name)]}
+
+    return methods
+
+def _parseClasses(filename):
+    """ Return a list of the top-level ClassDef nodes in `filename`. """
+
+    with open(filename, "rU") as f:
+        tree = ast.parse(f.read(), filename)
+
+    return [node for node in tree.body if isinstance(node, ast.ClassDef)]
+
+def _getTemplateMethods():
+    """ Return a dictionary of handler type name (e.g. "SensorHandler") ->
+        methods that a handler of that type inherits from the templates. """
+
+    classes = {node.name: node for node in _parseClasses(TEMPLATES_FILENAME)}
+    base_methods = _getClassMethods(classes["Handler"])
+
+    template_methods = {}
+    for type_name in ht.getAllHandlerTypeName(short_name=False):
+        methods = dict(base_methods)
+        methods.update(_getClassMethods(classes[type_name]))
+        template_methods[type_name] = methods
+
+    return template_methods
+
+def inspectHandlerFile(filename, template_methods=None):
+    """
+    Find the handler class in the source file `filename` without importing it.
+
+    Returns a dictionary with the class name ("class_name"), the handler type
+    name without the trailing "Handler" ("h_type"), and a list of its methods,
+    sorted by name ("methods").  Each method is described by a dictionary with
+    its "name", its docstring ("doc") and the names of its positional
+    arguments ("args").  Methods inherited from the handler templates are
+    included.
+
+    Returns None if the file doesn't contain a class that directly subclasses
+    one of the handler types, in which case the module has to be imported to
+    find out what it contains.
+    """
+
+    if template_methods is None:
+        template_methods = _getTemplateMethods()
+
+    try:
+        classes = _parseClasses(filename)
+    except SyntaxError as e:
+        logging.warning("Could not parse handler file {!r}: {}".format(filename, e))
+        return None
+
+    handler_classes = []
+    for class_node in classes:
+        base_names = [_getBaseName(b) for b in class_node.bases]
+        if len(base_names) == 1 and base_names[0] in template_methods:
+            handler_classes.append((class_node.name, class_node, base_names[0]))
+
+    if not handler_classes:
+        return None
+
+    # Same choice as HandlerConfig.loadHandlerClass() would make
+    handler_classes.sort()
+    if len(handler_classes) > 1:
+        logging.warning("Multiple handler classes found in file {}. Randomly choose one to import.".format(filename))
+    class_name, class_node, type_name = handler_classes[0]
+
+    methods = dict(template_methods[type_name])
+    methods.update(_getClassMethods(class_node))
+
+    return {"class_name": class_name,
+            "h_type": type_name[:-len("Handler")],
+            "methods": [methods[name] for name in sorted(methods)]}
+
+def _toStr(value):
+    """ Convert all the unicode strings decoded from JSON in `value` back into
+        plain strings, which is what inspecting a handler gives us. """
+
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    elif isinstance(value, list):
+        return [_toStr(v) for v in value]
+    elif isinstance(value, dict):
+        return {_toStr(k): _toStr(v) for k, v in value.iteritems()}
+    else:
+        return value
+
+class HandlerIndex(object):
+    """
+    A cache of the results of inspectHandlerFile(), saved to the file
+    `filename` (or only kept in memory, if `filename` is None).
+
+    An entry is reused as long as the modification time and size of the handler
+    file are the same as when it was inspected.  The whole index is thrown
+    away if the handler templates change.
+    """
+
+    def __init__(self, filename=DEFAULT_INDEX_FILENAME):
+        self.filename = filename
+        self.entries = {}
+        self.dirty = False
+        self._template_methods = None
+
+        self.templates_stamp = self._getStamp(TEMPLATES_FILENAME)
+
+        if self.filename is not None:
+            self.load()
+
+    @staticmethod
+    def _getStamp(filename):
+        st = os.stat(filename)
+        return [st.st_mtime, st.st_size]
+
+    def load(self):
+        """ Read the index from disk, if there's a valid one. """
+
+        try:
+            with open(self.filename, "r") as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return
+
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION \
+           or data.get("templates_stamp") != self.templates_stamp:
+            logging.debug("Ignoring out-of-date handler index {!r}".format(self.filename))
+            return
+
+        self.entries = _toStr(data.get("entries", {}))
+
+    def save(self):
+        """ Write the index to disk, if anything has changed.  Failing to do so
+            is not an error; it'll just have to be rebuilt next time. """
+
+        if not self.dirty or self.filename is None:
+            return
+
+        data = {"version": INDEX_VERSION,
+                "templates_stamp": self.templates_stamp,
+                "entries": self.entries}
+
+        tmp_filename = self.filename + ".tmp"
+        try:
+            with open(tmp_filename, "w") as f:
+                json.dump(data, f)
+
+            if os.path.exists(self.filename):
+                # Windows won't let us rename onto an existing file
+                os.remove(self.filename)
+            os.rename(tmp_filename, self.filename)
+        except (IOError, OSError) as e:
+            logging.debug("Could not save handler index {!r}: {}".format(self.filename, e))
+        else:
+            self.dirty = False
+
+    def getHandlerInfo(self, filename):
+        """ Return the result of inspectHandlerFile() for the handler file
+            `filename`, inspecting it only if it has changed. """
+
+        key = os.path.normcase(os.path.abspath(filename))
+        stamp = self._getStamp(filename)
+
+        entry = self.entries.get(key)
+        if entry is not None and entry["stamp"] == stamp:
+            return entry["info"]
+
+        if self._template_methods is None:
+            self._template_methods = _getTemplateMethods()
+
+        logging.debug("Indexing handler file {!r}".format(filename))
+        info = inspectHandlerFile(filename, self._template_methods)
+
+        self.entries[key] = {"stamp": stamp, "info": info}
+        self.dirty = True
+
+        return info
+
+_default_index = None
+
+def getDefaultIndex():
+    """ Return the handler index shared by everything in this process. """
+
+    global _default_index
+
+    if _default_index is None:
+        _default_index = HandlerIndex()
+
+    return _default_index
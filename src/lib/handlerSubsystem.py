@@ -23,6 +23,7 @@ sys.path.append(os.path.join(p,"src","lib"))
 
 import re
 import time
+from multiprocessing.pool import ThreadPool
 import fileMethods
 from copy import deepcopy
 import project
@@ -30,6 +31,7 @@ import globalConfig, logging
 from hsubConfigObjects import MethodParameterConfig,HandlerMethodConfig,\
                                 HandlerConfig,RobotConfig,ExperimentConfig
 import handlers.handlerTemplates as ht
+import handlerIndex
 from hsubParsingUtils import parseCallString
 
 # TODO: Get rid of this todo list
@@ -48,6 +50,12 @@ from hsubParsingUtils import parseCallString
 # TODO: print out which file is loading
 
 
+# Default time to wait for a sensor that is read in parallel, in seconds
+DEFAULT_SENSOR_TIMEOUT = 0.5
+
+# Largest number of threads to use for reading sensors in parallel
+MAX_SENSOR_THREADS = 16
+
 ###################################################
 # Define individual objects for handler subsystem #
 ###################################################
@@ -70,8 +78,19 @@ class HandlerSubsystem:
 
         self.prop2func = {}         # a mapping from a proporsition to a handler function for execution
         self.handler_instance = []  # a list of handler instances that are instantiated
+        self.handler_registry = {}  # resolved handler instances [(robot_name, handler type class)]
+
+        # bound methods of the main robot's handlers, for the frequently-called wrappers
+        self.set_velocity_method = None
+        self.goto_region_method = None
+        self.get_pose_method = None
         self.method_configs = set() # a set of func references
 
+        self.sensor_pool = None             # thread pool for reading sensors in parallel
+        self.pending_sensor_reads = {}      # parallel sensor reads that haven't finished yet [prop_name]
+        self.last_sensor_values = {}        # the most recent value read from each parallel sensor [prop_name]
+
+        self.coord_transform = None # CoordinateTransform between map and lab coordinates of the main robot
         self.coordmap_map2lab = None# function that maps from map coord to lab coord
         self.coordmap_lab2map = None# function that maps from lab coord to map coord
 
@@ -136,6 +155,9 @@ class HandlerSubsystem:
                     self.handler_configs[robot_type][handler_config.h_type] = []
                 self.handler_configs[robot_type][handler_config.h_type].append(handler_config)
 
+        # remember what we found out for next time
+        handlerIndex.getDefaultIndex().save()
+
     def findHandlerTypeStringFromName(self, handler_name):
         """
         given a handler name, find folder of this handler in the handlers/share folder
@@ -180,6 +202,9 @@ class HandlerSubsystem:
         except ImportError as import_error:
             # TODO: Log an error here if the handler is necessary
             handler_config = None
+        except ht.LoadingError as e:
+            logging.warning("Cannot load handler {}: {}".format(handler_module, e))
+            handler_config = None
 
         return handler_config
 
@@ -249,6 +274,7 @@ class HandlerSubsystem:
         set the current executing config to the experiment config with the given name
         """
         self.executing_config = None
+        self.clearHandlerRegistry()
         for config_object in self.configs:
             if config_object_name == config_object.name:
                 self.executing_config = config_object
@@ -294,6 +320,9 @@ class HandlerSubsystem:
             return os.path.join(self.config_path,file_name), False
         else:
             return experiment_config, True
+        finally:
+            # remember what we found out about its handlers for next time
+            handlerIndex.getDefaultIndex().save()
 
     def getRobotByType(self, t):
         """
@@ -336,20 +365,73 @@ class HandlerSubsystem:
                 raise ValueError("A robot name is required when looking for instance of sensor or actuator handler")
             else:
                 # we assume it is asking for the handler of main robot
-                robot_config = self.getMainRobot()
-        else:
-            # find the robot config of the given name
-            robot_config = self.executing_config.getRobotByName(robot_name)
+                if self.executing_config is None:
+                    raise ValueError("Cannot find executing config for handlersubsystem")
+                robot_name = self.executing_config.main_robot
+
+        # first check whether we've already found it
+        handler_instance = self.handler_registry.get((robot_name, handler_type_class))
+        if handler_instance is not None:
+            return handler_instance
+
+        # find the robot config of the given name
+        robot_config = self.executing_config.getRobotByName(robot_name)
 
         # now look for the handler instance of the given type
         handler_instance = self.getHandlerInstanceByName(robot_config.getHandlerOfRobot(handler_type_class).name)
 
+        # remember it for next time, unless it hasn't been instantiated yet
+        if handler_instance is not None:
+            self.handler_registry[(robot_name, handler_type_class)] = handler_instance
+
         return handler_instance
 
+    def buildHandlerRegistry(self):
+        """
+        Resolve the handler instance of every handler type of every robot in the
+        current executing config, so that getHandlerInstanceByType() doesn't
+        have to search for them, and bind the methods used by setVelocity(),
+        gotoRegion() and getPose()
+        """
+
+        self.clearHandlerRegistry()
+
+        for robot in self.executing_config.robots:
+            for handler_type_class, handler_config in robot.handlers.iteritems():
+                handler_instance = self.getHandlerInstanceByName(handler_config.name)
+                if handler_instance is not None:
+                    self.handler_registry[(robot.name, handler_type_class)] = handler_instance
+
+        main_robot = self.executing_config.main_robot
+        drive_handler_instance = self.handler_registry.get((main_robot, ht.DriveHandler))
+        motion_handler_instance = self.handler_registry.get((main_robot, ht.MotionControlHandler))
+        pose_handler_instance = self.handler_registry.get((main_robot, ht.PoseHandler))
+
+        if drive_handler_instance is not None:
+            self.set_velocity_method = drive_handler_instance.setVelocity
+        if motion_handler_instance is not None:
+            self.goto_region_method = motion_handler_instance.gotoRegion
+        if pose_handler_instance is not None:
+            self.get_pose_method = pose_handler_instance.getPose
+
+    def clearHandlerRegistry(self):
+        """
+        Forget all resolved handler instances
+        """
+
+        self.handler_registry = {}
+        self.set_velocity_method = None
+        self.goto_region_method = None
+        self.get_pose_method = None
+
     def setVelocity(self, x, y):
         """
         a wrapper function that set the velocity to the drive handler of the main robot
         """
+        if self.set_velocity_method is not None:
+            self.set_velocity_method(x, y)
+            return
+
         # get the drive handler
         drive_handler_instance = self.getHandlerInstanceByType(ht.DriveHandler)
 
@@ -363,15 +445,18 @@ class HandlerSubsystem:
         """
         a wrapper function that set the target region to the motionControl handler of the main robot
         """
-        # get the motionControl handler
-        motion_handler_instance = self.getHandlerInstanceByType(ht.MotionControlHandler)
-
         # if the region is object, we need to find the index of it
         if not isinstance(current_region, int):
             current_region = self.executor.proj.rfi.regions.index(current_region)
         if not isinstance(next_region, int):
             next_region = self.executor.proj.rfi.regions.index(next_region)
 
+        if self.goto_region_method is not None:
+            return self.goto_region_method(current_region, next_region)
+
+        # get the motionControl handler
+        motion_handler_instance = self.getHandlerInstanceByType(ht.MotionControlHandler)
+
         if motion_handler_instance is None:
             raise ValueError("Cannot set target region, because no motionControl handler instance is found for the main robot")
 
@@ -385,13 +470,14 @@ class HandlerSubsystem:
         A wrapper function that returns the pose from the pose handler of the main robot in the
         current executing config
         """
-        # get the main robot config
-        robot_config = self.getMainRobot()
-
         # first make sure the coord transformation function is ready
         if self.coordmap_map2lab is None:
-            self.coordmap_map2lab, self.coordmap_lab2map = robot_config.getCoordMaps()
-            self.executor.proj.coordmap_map2lab, self.executor.proj.coordmap_lab2map = robot_config.getCoordMaps()
+            # get the main robot config
+            robot_config = self.getMainRobot()
+            self.setCoordinateTransform(robot_config.getCoordinateTransform())
+
+        if self.get_pose_method is not None:
+            return self.get_pose_method(cached)
 
         pose_handler_instance = self.getHandlerInstanceByType(ht.PoseHandler)
 
@@ -401,6 +487,17 @@ class HandlerSubsystem:
         return pose_handler_instance.getPose(cached)
 
 
+    def setCoordinateTransform(self, coord_transform):
+        """
+        Use the given CoordinateTransform for converting between map and lab
+        coordinates, both here and in the project of the executor
+        """
+        self.coord_transform = coord_transform
+        self.coordmap_map2lab = coord_transform.map2lab
+        self.coordmap_lab2map = coord_transform.lab2map
+        self.executor.proj.coordmap_map2lab = coord_transform.map2lab
+        self.executor.proj.coordmap_lab2map = coord_transform.lab2map
+
     def initializeAllMethods(self):
         """
         initialize all method in self.prop2func mapping with initial=True
@@ -495,17 +592,38 @@ class HandlerSubsystem:
         # Save it to a list so we can initialize it later
         self.method_configs.add(hmc)
 
-        # Return a reference to this HMC's execute function
-        return hmc.execute
+        # Return a function that calls this HMC's method with its arguments already bound
+        return hmc.getExecutionFunction()
+
+    def _getSensorEvaluationRank(self, call_descriptor):
+        """ Return the position of the given call in the sensor evaluation order
+            of the executing config, for ordering compound sensor mappings.
+            Calls that aren't listed come after all those that are. """
+
+        evaluation_order = self.executing_config.sensor_evaluation_order
+        call_name = ".".join(call_descriptor.name)
+
+        for rank, name in enumerate(evaluation_order):
+            if call_name == name or call_name.startswith(name + "."):
+                return rank
+
+        return len(evaluation_order)
 
     def createPropositionMappingExecutionFunctionFromString(self, func_string, mode):
         """ Given a string description of the function(s) that some
             proposition maps to, create the appropriate HandlerMethodConfigs
             and return the function that will evaluate their execute() methods. """
 
+        # Evaluate the cheapest sensors first, if the config says which those are
+        if mode == "sensor" and self.executing_config.sensor_evaluation_order:
+            order_key = self._getSensorEvaluationRank
+        else:
+            order_key = None
+
         # Call the parser with appropriate arguments
         call_descriptors, eval_function = parseCallString(func_string, mode,
-                                                          self._makeHandlerMethodConfigAndGetExecutionFunction)
+                                                          self._makeHandlerMethodConfigAndGetExecutionFunction,
+                                                          order_key)
         # Return the resulting function to be evaluated
         return eval_function
 
@@ -525,10 +643,12 @@ class HandlerSubsystem:
                         self.executor.proj.shared_data = h.getSharedData()
             else:
                 # this is a non-main robot
-                h = self.prepareHandler(robot_config.getHandlerOfRobot(ht.InitHandler))
+                h = self.prepareHandler(robot.getHandlerOfRobot(ht.InitHandler))
                 # this is a init handler, set the shared_data
                 self.executor.proj.shared_data = h.getSharedData()
 
+        # now that everything is instantiated, remember where to find it
+        self.buildHandlerRegistry()
 
     def createHandlerMethodConfig(self, robot_name, handler_name, method_name, kwargs):
         """
@@ -674,17 +794,108 @@ class HandlerSubsystem:
         """
         given a list of proposition names, return dictionary with {prop_name:sensor_value},
         where sensor_value is a boolean value returned by sensor handler
+
+        Sensors listed as parallel-safe in the executing config are all read
+        at once in a thread pool, while the rest are read one after another.
+        If a parallel read takes longer than its timeout, the last value read
+        from that sensor is used instead (and no new read of it is started
+        until the slow one finishes).  If there is no such value yet, a
+        RuntimeError is raised.
         """
 
-        sensor_state = {}
         for prop_name in prop_name_list:
-            if prop_name not in self.prop2func.keys():
+            if prop_name not in self.prop2func:
                 raise ValueError("Cannot find proposition {} in the given proposition mapping".format(prop_name))
-            else:
-                sensor_state[prop_name] = self.prop2func[prop_name](initial=False)
+
+        if self.executing_config is not None:
+            parallel_sensors = self.executing_config.parallel_sensors
+        else:
+            parallel_sensors = {}
+
+        parallel_props = [p for p in prop_name_list if p in parallel_sensors]
+        sequential_props = [p for p in prop_name_list if p not in parallel_sensors]
+
+        # Kick off the parallel reads first so they overlap with the sequential ones
+        start_time = time.time()
+        if parallel_props:
+            self._startParallelSensorReads(parallel_props)
+
+        sensor_state = {}
+        for prop_name in sequential_props:
+            sensor_state[prop_name] = self.prop2func[prop_name](initial=False)
+
+        for prop_name in parallel_props:
+            timeout = parallel_sensors[prop_name]
+            if timeout is None:
+                timeout = self.executing_config.sensor_timeout
+            if timeout is None:
+                timeout = DEFAULT_SENSOR_TIMEOUT
+
+            sensor_state[prop_name] = self._finishParallelSensorRead(prop_name, start_time + timeout)
 
         return sensor_state
 
+    def _startParallelSensorReads(self, prop_name_list):
+        """
+        Start reading each of the given sensors in the thread pool, unless a
+        previous read of it is still in progress
+        """
+
+        if self.sensor_pool is None:
+            num_threads = min(len(self.executing_config.parallel_sensors), MAX_SENSOR_THREADS)
+            logging.debug("Starting {} threads for reading sensors in parallel".format(num_threads))
+            self.sensor_pool = ThreadPool(num_threads)
+
+        for prop_name in prop_name_list:
+            pending_read = self.pending_sensor_reads.get(prop_name)
+            if pending_read is not None:
+                if not pending_read.ready():
+                    continue
+
+                # A read that timed out last time has since finished
+                if pending_read.successful():
+                    self.last_sensor_values[prop_name] = pending_read.get()
+
+            self.pending_sensor_reads[prop_name] = self.sensor_pool.apply_async(self.prop2func[prop_name],
+                                                                                kwds={"initial": False})
+
+    def _finishParallelSensorRead(self, prop_name, deadline):
+        """
+        Return the value of the given sensor, waiting until `deadline` at the
+        latest.  If the read doesn't finish in time, return the last known value,
+        or raise a RuntimeError if the sensor has never been read successfully.
+        Any exception raised by the sensor is re-raised here.
+        """
+
+        pending_read = self.pending_sensor_reads[prop_name]
+        pending_read.wait(max(deadline - time.time(), 0))
+
+        if not pending_read.ready():
+            if prop_name not in self.last_sensor_values:
+                # The read is left running, so a later call may still pick it up
+                raise RuntimeError("Reading sensor {} timed out, and there is no previous value to use instead".format(prop_name))
+
+            logging.debug("Reading sensor {} timed out; using its last known value".format(prop_name))
+            return self.last_sensor_values[prop_name]
+
+        del self.pending_sensor_reads[prop_name]
+        value = pending_read.get()
+        self.last_sensor_values[prop_name] = value
+
+        return value
+
+    def stopSensorPool(self):
+        """
+        Shut down the threads used for reading sensors in parallel
+        """
+
+        if self.sensor_pool is not None:
+            self.sensor_pool.terminate()
+            self.sensor_pool = None
+
+        self.pending_sensor_reads = {}
+        self.last_sensor_values = {}
+
     def setActuatorValue(self, actuator_state):
         """
         given a dictionary with {prop_name:actuator_value},
@@ -62,6 +62,15 @@ class SensorHandler(Handler):
     def __init__(self, *args, **kwds):
         super(SensorHandler, self).__init__(*args, **kwds)
 
+    def _notifyChange(self):
+        """
+        Let the executor know that a sensor value has changed, so that it can respond
+        right away instead of at its next scheduled iteration.  Safe to call from any thread.
+        """
+        executor = getattr(self, "executor", None)
+        if hasattr(executor, "notifySensorChange"):
+            executor.notifySensorChange()
+
 class ActuatorHandler(Handler):
     """
     Handle connection to actuators and abstraction (discretized actuator value -> continuous action)
@@ -70,8 +70,7 @@ class BugControllerHandler(handlerTemplates.MotionControlHandler):
 
         # Get information about regions
         self.proj = executor.proj
-        self.coordmap_map2lab = self.hsub.coordmap_map2lab
-        self.coordmap_lab2map = self.hsub.coordmap_lab2map
+        self.coord_transform = executor.hsub.coord_transform
         self.last_warning = 0
 
 
@@ -254,7 +253,7 @@ class BugControllerHandler(handlerTemplates.MotionControlHandler):
 
                 for i in range(len(self.proj.rfi.transitions[current_reg][next_reg])):
                     pointArray_transface = [x for x in self.proj.rfi.transitions[current_reg][next_reg][i]]
-                    transFace = asarray(map(self.coordmap_map2lab,pointArray_transface))
+                    transFace = self.coord_transform.map2labArray(pointArray_transface)
                     bundle_x = (transFace[0,0] +transFace[1,0])/2    #mid-point coordinate x
                     bundle_y = (transFace[0,1] +transFace[1,1])/2    #mid-point coordinate y
                     q_gBundle = hstack((q_gBundle,vstack((bundle_x,bundle_y))))
@@ -696,8 +695,7 @@ class BugControllerHandler(handlerTemplates.MotionControlHandler):
             print "WARNING: Left current region but not in expected destination region"
             # Figure out what region we think we stumbled into
             for r in self.proj.rfi.regions:
-                pointArray = [self.coordmap_map2lab(x) for x in r.getPoints()]
-                vertices = mat(pointArray).T
+                vertices = mat(self.coord_transform.getRegionVerticesInLab(r)).T
 
                 if is_inside([pose[0], pose[1]], vertices):
                     #print "I think I'm in " + r.name
@@ -799,12 +797,7 @@ class BugControllerHandler(handlerTemplates.MotionControlHandler):
         """
         This function takes in the region points and make it a Polygon.
         """
-        if hole == None:
-            pointArray = [x for x in region.getPoints()]
-        else:
-            pointArray = [x for x in region.getPoints(hole_id = hole)]
-        pointArray = map(self.coordmap_map2lab, pointArray)
-        regionPoints = [(pt[0],pt[1]) for pt in pointArray]
+        regionPoints = [tuple(pt) for pt in self.coord_transform.getRegionVerticesInLab(region, hole).tolist()]
         formedPolygon= Polygon.Polygon(regionPoints)
         return formedPolygon
 
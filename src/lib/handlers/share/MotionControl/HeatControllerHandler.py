@@ -21,7 +21,7 @@ class HeatControllerHandler(handlerTemplates.MotionControlHandler):
         """
         self.drive_handler = executor.hsub.getHandlerInstanceByType(handlerTemplates.DriveHandler)
         self.pose_handler = executor.hsub.getHandlerInstanceByType(handlerTemplates.PoseHandler)
-        self.fwd_coordmap = executor.hsub.coordmap_map2lab
+        self.coord_transform = executor.hsub.coord_transform
         self.rfi = executor.proj.rfi
         self.last_warning = 0
 
@@ -46,8 +46,7 @@ class HeatControllerHandler(handlerTemplates.MotionControlHandler):
         self.drive_handler.setVelocity(X[0,0], X[1,0], pose[2])
 
         # Transform the region vertices into real coordinates
-        pointArray = [self.fwd_coordmap(x) for x in self.rfi.regions[next_reg].getPoints()]
-        vertices = mat(pointArray).T
+        vertices = mat(self.coord_transform.getRegionVerticesInLab(self.rfi.regions[next_reg])).T
 
         # Figure out whether we've reached the destination region
         if is_inside([pose[0], pose[1]], vertices):
@@ -58,14 +57,11 @@ class HeatControllerHandler(handlerTemplates.MotionControlHandler):
         if (arrived != (not inside)) and (time.time()-self.last_warning) > 0.5:
             print "WARNING: Left current region but not in expected destination region"
             # Figure out what region we think we stumbled into
-            for r in self.rfi.regions:
-                pointArray = [self.fwd_coordmap(x) for x in r.getPoints()]
-                vertices = mat(pointArray).T
-
-                if is_inside([pose[0], pose[1]], vertices):
-                    print "I think I'm in " + r.name
-                    print pose
-                    break
+            map_pose = self.coord_transform.lab2map(pose[0:2])
+            r = self.rfi.findRegionContainingPoint(map_pose[0], map_pose[1])
+            if r is not None:
+                print "I think I'm in " + self.rfi.regions[r].name
+                print pose
             self.last_warning = time.time()
 
         return arrived
@@ -97,8 +93,8 @@ class HeatControllerHandler(handlerTemplates.MotionControlHandler):
             # TODO: Why don't we just store this as the index?
             transFaceIdx = None
             max_magsq = 0
-            for i, face in enumerate(self.rfi.regions[current_reg].getFaces()):
-                if face not in self.rfi.transitions[current_reg][next_reg]:
+            for i, face in enumerate(self.rfi.regions[current].getFaces()):
+                if face not in self.rfi.transitions[current][next]:
                     continue
 
                 tf_pta, tf_ptb = face
@@ -109,12 +105,10 @@ class HeatControllerHandler(handlerTemplates.MotionControlHandler):
                     max_magsq = magsq
 
             if transFaceIdx is None:
-                print "ERROR: Unable to find transition face between regions %s and %s.  Please check the decomposition (try viewing projectname_decomposed.regions in RegionEditor or a text editor)." % (self.rfi.regions[current_reg].name, self.rfi.regions[next_reg].name)
+                print "ERROR: Unable to find transition face between regions %s and %s.  Please check the decomposition (try viewing projectname_decomposed.regions in RegionEditor or a text editor)." % (self.rfi.regions[current].name, self.rfi.regions[next].name)
 
         # Transform the region vertices into real coordinates
-        pointArray = [x for x in self.rfi.regions[current].getPoints()]
-        pointArray = map(self.fwd_coordmap, pointArray)
-        vertices = mat(pointArray).T
+        vertices = mat(self.coord_transform.getRegionVerticesInLab(self.rfi.regions[current])).T
 
         # Get a controller function
         controller = heatControllerHelper.getController(vertices, transFaceIdx, last)
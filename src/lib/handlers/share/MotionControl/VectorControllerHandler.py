@@ -26,7 +26,7 @@ class VectorControllerHandler(handlerTemplates.MotionControlHandler):
 
         # Get information about regions
         self.rfi = executor.proj.rfi
-        self.coordmap_map2lab = executor.hsub.coordmap_map2lab
+        self.coord_transform = executor.hsub.coord_transform
         self.last_warning = 0
 
     def gotoRegion(self, current_reg, next_reg, last=False):
@@ -53,9 +53,7 @@ class VectorControllerHandler(handlerTemplates.MotionControlHandler):
             return False
 
         # NOTE: Information about region geometry can be found in self.rfi.regions:
-        pointArray = [x for x in self.rfi.regions[current_reg].getPoints()]
-        pointArray = map(self.coordmap_map2lab, pointArray)
-        vertices = mat(pointArray).T
+        vertices = mat(self.coord_transform.getRegionVerticesInLab(self.rfi.regions[current_reg])).T
 
         if last:
             transFaceIdx = None
@@ -88,9 +86,7 @@ class VectorControllerHandler(handlerTemplates.MotionControlHandler):
         self.drive_handler.setVelocity(V[0], V[1], pose[2])
 
         departed = not is_inside([pose[0], pose[1]], vertices)
-        pointArray = [x for x in self.rfi.regions[next_reg].getPoints()]
-        pointArray = map(self.coordmap_map2lab, pointArray)
-        vertices = mat(pointArray).T
+        vertices = mat(self.coord_transform.getRegionVerticesInLab(self.rfi.regions[next_reg])).T
         # Figure out whether we've reached the destination region
         arrived = is_inside([pose[0], pose[1]], vertices)
 
@@ -98,8 +94,7 @@ class VectorControllerHandler(handlerTemplates.MotionControlHandler):
             #print "WARNING: Left current region but not in expected destination region"
             # Figure out what region we think we stumbled into
             for r in self.rfi.regions:
-                pointArray = [self.coordmap_map2lab(x) for x in r.getPoints()]
-                vertices = mat(pointArray).T
+                vertices = mat(self.coord_transform.getRegionVerticesInLab(r)).T
 
                 if is_inside([pose[0], pose[1]], vertices):
                     #print "I think I'm in " + r.name
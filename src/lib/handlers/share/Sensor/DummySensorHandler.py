@@ -22,6 +22,7 @@ class DummySensorHandler(handlerTemplates.SensorHandler):
         # Since we don't want to have to poll the subwindow for each request,
         # we need a data structure to cache sensor states:
         self.sensorValue = {}
+        self.executor = executor
         self.proj = executor.proj
         self.sensorListenInitialized = False
         self._running = True
@@ -155,3 +156,5 @@ class DummySensorHandler(handlerTemplates.SensorHandler):
                 self.sensorValue[args[0]] = False
             else:
                 self.sensorValue[args[0]] = args[1]
+
+            self._notifyChange()
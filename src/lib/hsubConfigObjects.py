@@ -13,14 +13,16 @@
 import os, sys, re
 import fileMethods
 import inspect, types
-from numpy import linalg, array, finfo, mat
+from numpy import linalg, array, asarray, ndarray, finfo, eye
 from copy import deepcopy
 import ast
 import json
+import functools
 import traceback
 import globalConfig, logging
 import importlib
 import handlers.handlerTemplates as ht
+import handlerIndex
 from hsubParsingUtils import parseCallString
 
 
@@ -255,6 +257,17 @@ class HandlerMethodConfig(object):
 
         return self.method_reference(**arg_dict)
 
+    def getExecutionFunction(self):
+        """
+        Return a function that behaves like execute(), but with the stored
+        parameter values bound once now instead of on every call.
+        Parameter changes made afterwards are not seen by the returned function.
+        """
+        if self.method_reference is None:
+            raise ValueError("No reference of method {} is set.".format(self.name))
+
+        return functools.partial(self.method_reference, **self.getArgDict())
+
     def fromMethod(self, method, handler_config):
         """
         Create a HandlerMethodConfig from the python method object
@@ -263,11 +276,23 @@ class HandlerMethodConfig(object):
         handler_config: instance of HandlerConfig where this HandlerMethodConfig locates
         """
 
-        self.name = method.__name__
+        self.fromMethodInfo(method.__name__, inspect.getdoc(method), inspect.getargspec(method)[0], handler_config)
+
+    def fromMethodInfo(self, name, doc, arg_names, handler_config):
+        """
+        Create a HandlerMethodConfig from a description of a method, so that
+        the method's module doesn't have to be imported
+
+        name: name of the method
+        doc: docstring of the method (cleaned up as by inspect.getdoc), or None
+        arg_names: list of names of the method's positional arguments
+        handler_config: instance of HandlerConfig where this HandlerMethodConfig locates
+        """
+
+        self.name = name
         self.handler = handler_config
 
         # parse the description of the function
-        doc = inspect.getdoc(method)
         if doc is not None:
             for line in doc.split('\n'):
 
@@ -291,7 +316,7 @@ class HandlerMethodConfig(object):
         self.comment = self.comment.strip()
 
         # check what Python thinks are the parameters of the method
-        para_names = set(inspect.getargspec(method)[0])
+        para_names = set(arg_names)
 
         # make sure we have a description for every non-ignored parameter
         for n in para_names - self.handler.ignore_parameters:
@@ -412,12 +437,28 @@ class HandlerConfig(object):
 
         return name, h_type, handler_class
 
-    def loadHandlerMethod(self, handler_module_path, onlyLoadInit=False):
+    def loadHandlerMethod(self, handler_module_path, onlyLoadInit=False, use_index=True):
         """
         Load method info (name, arg...) in the given handler file
         If onlyLoadInit is True, only the info of __init__ method will be loaded
-        If over_write_h_type is given, then over write the handler type with it
+        If use_index is True, the info is taken from the handler index (see
+        handlerIndex.py) if possible, so that the handler module is not imported
         """
+        if use_index:
+            if not handler_module_path.startswith('lib.'): handler_module_path = 'lib.' + handler_module_path
+            handler_file = handlerIndex.getHandlerFilename(handler_module_path)
+            if not os.path.isfile(handler_file):
+                logging.warning("Cannot find handler file {!r}".format(handler_file))
+                raise ImportError
+
+            handler_info = handlerIndex.getDefaultIndex().getHandlerInfo(handler_file)
+            if handler_info is not None:
+                self._loadHandlerMethodFromInfo(handler_module_path, handler_info, onlyLoadInit)
+                return
+
+            # we can't tell what's in there without importing it
+            logging.debug("Handler {} could not be indexed; importing it instead".format(handler_module_path))
+
         # load the handler class first
         name, h_type, handler_class = self.loadHandlerClass(handler_module_path)
 
@@ -444,6 +485,104 @@ class HandlerConfig(object):
                 # add this method into the method list of the handler
                 self.methods.append(method_config)
 
+    def _loadHandlerMethodFromInfo(self, handler_module_path, handler_info, onlyLoadInit=False):
+        """
+        Load method info from the handler index entry `handler_info` (see
+        handlerIndex.inspectHandlerFile) for the given handler module
+        """
+        handler_module_name = handler_module_path.rpartition('.')[2]
+        if handler_info["class_name"].lower() != handler_module_name.lower():
+            logging.warning("File name: {0} mismatch with class name: {1}.".format(handler_module_name, handler_info["class_name"]))
+
+        self.name = handler_module_name
+        self.h_type = ht.getHandlerTypeClass(handler_info["h_type"])
+
+        for method_info in handler_info["methods"]:
+            method_name = method_info["name"]
+            if ((not onlyLoadInit and (not method_name.startswith('_')) or method_name=='__init__') ):
+                method_config = HandlerMethodConfig(name=method_name)
+                try:
+                    method_config.fromMethodInfo(method_name, method_info["doc"], method_info["args"], self)
+                except SyntaxError as e:
+                    raise ht.LoadingError("Error while inspecting method {!r} of handler {!r}: {}".format(method_name, handler_module_path, e))
+
+                self.methods.append(method_config)
+
+class CoordinateTransform(object):
+    """
+    Converts points between map coordinates (those of the region file) and lab
+    coordinates (those of the robot), given the 3x3 calibration matrix that
+    maps lab->map.  The inverse is computed only once.
+
+    map2lab() and lab2map() convert a single point, and return it as a list
+    [x, y].  map2labArray() and lab2mapArray() convert a whole sequence of
+    points at once, and return an Nx2 array.
+
+    The vertices of regions in lab coordinates are cached by
+    getRegionVerticesInLab(); call clearRegionCache() if any region changes shape.
+    """
+
+    def __init__(self, lab2map_matrix=None):
+        if lab2map_matrix is None:
+            lab2map_matrix = eye(3)
+
+        self.lab2map_matrix = array(lab2map_matrix, dtype=float)
+        self.map2lab_matrix = linalg.inv(self.lab2map_matrix)
+
+        # Only the affine part is used, as the homogeneous coordinate is ignored
+        self._lab2map_coeffs = tuple(self.lab2map_matrix[0:2].flatten().tolist())
+        self._map2lab_coeffs = tuple(self.map2lab_matrix[0:2].flatten().tolist())
+
+        self.clearRegionCache()
+
+    def map2lab(self, pt):
+        """ Return the lab coordinates [x, y] of the map point `pt` """
+        a, b, c, d, e, f = self._map2lab_coeffs
+        x, y = pt[0], pt[1]
+        return [a*x + b*y + c, d*x + e*y + f]
+
+    def lab2map(self, pt):
+        """ Return the map coordinates [x, y] of the lab point `pt` """
+        a, b, c, d, e, f = self._lab2map_coeffs
+        x, y = pt[0], pt[1]
+        return [a*x + b*y + c, d*x + e*y + f]
+
+    @staticmethod
+    def _transformArray(matrix, points):
+        if not isinstance(points, ndarray):
+            points = [(pt[0], pt[1]) for pt in points]
+        points = asarray(points, dtype=float).reshape(-1, 2)
+
+        return points.dot(matrix[0:2, 0:2].T) + matrix[0:2, 2]
+
+    def map2labArray(self, points):
+        """ Return an Nx2 array of the lab coordinates of the N map points `points` """
+        return self._transformArray(self.map2lab_matrix, points)
+
+    def lab2mapArray(self, points):
+        """ Return an Nx2 array of the map coordinates of the N lab points `points` """
+        return self._transformArray(self.lab2map_matrix, points)
+
+    def getRegionVerticesInLab(self, region, hole_id=None):
+        """
+        Return a read-only Nx2 array of the vertices of `region` (or of its
+        hole `hole_id`) in lab coordinates
+        """
+        key = (id(region), hole_id)
+        entry = self._region_cache.get(key)
+
+        # Make sure the id hasn't been reused by a different region
+        if entry is None or entry[0] is not region:
+            vertices = self.map2labArray(list(region.getPoints(hole_id=hole_id)))
+            vertices.setflags(write=False)
+            entry = self._region_cache[key] = (region, vertices)
+
+        return entry[1]
+
+    def clearRegionCache(self):
+        """ Forget all transformed region vertices """
+        self._region_cache = {}
+
 class RobotConfig(object):
     """
     A Robot config object
@@ -501,9 +640,9 @@ class RobotConfig(object):
                 .format(h_type, self.name, self.r_type))
         return None
 
-    def getCoordMaps(self):
+    def getCoordinateTransform(self):
         """
-        Returns forward (map->lab) and reverse (lab->map) coordinate mapping functions, in that order
+        Returns a CoordinateTransform for this robot's calibration matrix
         """
 
         if self.calibration_matrix is None:
@@ -517,11 +656,16 @@ class RobotConfig(object):
             logging.warning("Singular calibration matrix.  Ignoring, and using identity matrix.")
             T = eye(3)
 
-        #### Create the coordmap functions
-        coordmap_map2lab = lambda pt: (linalg.inv(T) * mat([pt[0], pt[1], 1]).T).T.tolist()[0][0:2]
-        coordmap_lab2map = lambda pt: (T * mat([pt[0], pt[1], 1]).T).T.tolist()[0][0:2]
+        return CoordinateTransform(T)
+
+    def getCoordMaps(self):
+        """
+        Returns forward (map->lab) and reverse (lab->map) coordinate mapping functions, in that order
+        """
+
+        coord_transform = self.getCoordinateTransform()
 
-        return coordmap_map2lab, coordmap_lab2map
+        return coord_transform.map2lab, coord_transform.lab2map
 
     def _setSuccess(self, success = False):
         """
@@ -685,7 +829,8 @@ class ExperimentConfig(object):
     """
     A config file object!
     """
-    def __init__(self, name="", robots = None, prop_mapping = {}, initial_truths = None , main_robot = "", region_tags = {}, file_name = ""):
+    def __init__(self, name="", robots = None, prop_mapping = {}, initial_truths = None , main_robot = "", region_tags = {}, file_name = "",
+                 parallel_sensors = None, sensor_timeout = None, sensor_evaluation_order = None):
         self.name = name                    # name of the config file
         self.robots = robots                # list of robot object used in this config file
         self.prop_mapping = prop_mapping    # dictionary for storing the propositions mapping
@@ -693,6 +838,11 @@ class ExperimentConfig(object):
         self.main_robot = main_robot        # name of robot for moving in this config
         self.region_tags = region_tags      # dictionary mapping tag names to region groups, for quantification
         self.file_name = file_name          # full path filename of the config
+        self.parallel_sensors = parallel_sensors # dictionary mapping sensor propositions that are safe to read in parallel
+                                                 # to their read timeout in seconds (or None for the default timeout)
+        self.sensor_timeout = sensor_timeout     # default timeout for parallel sensor reads, or None for the system default
+        self.sensor_evaluation_order = sensor_evaluation_order # list of handler methods (or handlers, or robots) to evaluate first
+                                                               # in compound sensor mappings, cheapest first
 
         # To avoid recursive setting
         if self.robots is None:
@@ -700,6 +850,12 @@ class ExperimentConfig(object):
         # To avoid recursive setting
         if self.initial_truths is None:
             self.initial_truths = []
+        # To avoid recursive setting
+        if self.parallel_sensors is None:
+            self.parallel_sensors = {}
+        # To avoid recursive setting
+        if self.sensor_evaluation_order is None:
+            self.sensor_evaluation_order = []
 
     def __repr__(self):
         """
@@ -800,6 +956,25 @@ class ExperimentConfig(object):
             except ValueError:
                 logging.warning("Wrong region tags")
 
+        if 'Parallel_Sensors' in config_data['General Config']:
+            # parse the sensors that can be read in parallel, each optionally with a timeout
+            for entry in config_data['General Config']['Parallel_Sensors']:
+                prop, _, timeout = [s.strip() for s in entry.partition('=')]
+                try:
+                    self.parallel_sensors[prop] = float(timeout) if timeout else None
+                except ValueError:
+                    logging.warning("Wrong parallel sensor timeout -- {!r}".format(entry))
+
+        if 'Sensor_Timeout' in config_data['General Config']:
+            try:
+                self.sensor_timeout = float(config_data['General Config']['Sensor_Timeout'][0])
+            except (ValueError, IndexError):
+                logging.warning("Wrong sensor timeout")
+
+        if 'Sensor_Evaluation_Order' in config_data['General Config']:
+            # parse the order in which to evaluate the parts of compound sensor mappings
+            self.sensor_evaluation_order = [name.strip() for name in config_data['General Config']['Sensor_Evaluation_Order']]
+
         # Load main robot name
         try:
             self.main_robot = config_data['General Config']['Main_Robot'][0]
@@ -873,6 +1048,13 @@ class ExperimentConfig(object):
         data['General Config']['Main_Robot'] = self.main_robot
         data['General Config']['Initial_Truths'] = self.initial_truths
         data['General Config']['Region_Tags'] = json.dumps(self.region_tags)
+        if self.parallel_sensors:
+            data['General Config']['Parallel_Sensors'] = [prop if timeout is None else "{} = {}".format(prop, timeout)
+                                                          for prop, timeout in sorted(self.parallel_sensors.iteritems())]
+        if self.sensor_timeout is not None:
+            data['General Config']['Sensor_Timeout'] = str(self.sensor_timeout)
+        if self.sensor_evaluation_order:
+            data['General Config']['Sensor_Evaluation_Order'] = self.sensor_evaluation_order
 
         for i, robot in enumerate(self.robots):
             header = 'Robot'+str(i+1)+' Config'
@@ -910,7 +1092,10 @@ class ExperimentConfig(object):
                     "Name": 'Configuration name',
                     "Main_Robot":'The name of the robot used for moving in this config',
                     "Initial_Truths": "Initially true propositions",
-                    "Region_Tags": "Mapping from tag names to region groups, for quantification"}
+                    "Region_Tags": "Mapping from tag names to region groups, for quantification",
+                    "Parallel_Sensors": "Sensor propositions that are safe to read in parallel, each optionally followed by '= timeout' in seconds",
+                    "Sensor_Timeout": "Default timeout in seconds for reading sensors in parallel",
+                    "Sensor_Evaluation_Order": "Handler methods (robot.handler.method), handlers or robots to evaluate first in compound sensor mappings, cheapest first"}
 
         fileMethods.writeToFile(file_name, data, comments)
         return True
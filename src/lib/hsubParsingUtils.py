@@ -27,7 +27,7 @@ class CallDescriptor(namedtuple("CallDescriptor",
     pass
 
 
-def parseCallString(text, mode="single", make_call_function=None):
+def parseCallString(text, mode="single", make_call_function=None, order_key=None):
     """ Inputs: 
         - A string of calls, e.g. "a.b(c=1, d=2)", optionally joined by the boolean
           operators "and" or "or".
@@ -38,6 +38,12 @@ def parseCallString(text, mode="single", make_call_function=None):
         - Also optionally accepts a `make_call_function` function that
           takes a CallDescriptor and returns a function that takes any kwargs
           and returns a boolean result.
+        - Also optionally accepts an `order_key` function that takes a
+          CallDescriptor and returns a sort key.  In "sensor" mode, the operands
+          of each boolean operator are then evaluated in increasing order of
+          the smallest key of any call they contain, so that cheap calls can
+          short-circuit expensive ones.  Operands with equal keys are evaluated
+          in the order they appear in the input string.
 
         Outputs:
         - A list of CallDescriptors (in the order they appeared in the input string).
@@ -64,7 +70,7 @@ def parseCallString(text, mode="single", make_call_function=None):
     # Start the recursion from the first & only Expr (which itself is always
     # wrapped in a top-level Module)
     try:
-        call_list, f = parseCallTree(tree.body[0].value, mode, make_call_function)
+        call_list, f = parseCallTree(tree.body[0].value, mode, make_call_function, order_key)
     except SyntaxError:
         logging.error("Error while parsing line {!r}".format(text))
         raise
@@ -75,9 +81,6 @@ def parseCallString(text, mode="single", make_call_function=None):
         f.func_name = re.sub("\W", "_", text)
         f.__doc__ = text
 
-    # Collapse the itertools chain
-    call_list = list(call_list)
-
     # Do some sneaky calculations to figure out end_pos values
     # because AST will only give us start_pos
     for k in xrange(len(call_list)):
@@ -98,7 +101,7 @@ def parseCallString(text, mode="single", make_call_function=None):
 
     return call_list, f
 
-def parseCallTree(tree, mode, make_call_function):
+def parseCallTree(tree, mode, make_call_function, order_key=None):
     """ This function contains the recursive parts of parseCallString. """
 
     if isinstance(tree, ast.BoolOp):
@@ -107,10 +110,10 @@ def parseCallTree(tree, mode, make_call_function):
             raise SyntaxError("Boolean operators are not permitted in 'single' parsing mode.")
 
         # Evaluate our children
-        subresults = [parseCallTree(t, mode, make_call_function) for t in tree.values]
+        subresults = [parseCallTree(t, mode, make_call_function, order_key) for t in tree.values]
 
         # Combine all the CallDescriptors from our children
-        joined_calls = chain.from_iterable(r[0] for r in subresults)
+        joined_calls = list(chain.from_iterable(r[0] for r in subresults))
 
         # If make_call_function is None, we don't need to construct f so
         # we are done here
@@ -120,14 +123,14 @@ def parseCallTree(tree, mode, make_call_function):
         # Construct a function appropriately joining our subfunctions
         if isinstance(tree.op, ast.And):
             if mode == "sensor":
-                f = lambda **kwargs: all(r[1](**kwargs) for r in subresults)
+                f = _makeShortCircuitFunction(_orderOperands(subresults, order_key), False)
             elif mode == "actuator":
                 # For actuators, we treat "and" as "and next..."
                 # We can return a list of the return values, but it's probably not useful
-                f = lambda **kwargs: [r[1](**kwargs) for r in subresults]
+                f = _makeSequenceFunction([r[1] for r in subresults])
         elif isinstance(tree.op, ast.Or):
             if mode == "sensor":
-                f = lambda **kwargs: any(r[1](**kwargs) for r in subresults)
+                f = _makeShortCircuitFunction(_orderOperands(subresults, order_key), True)
             elif mode == "actuator":
                 raise SyntaxError("OR operator is not permitted in actuators because it doesn't make sense.")
 
@@ -148,7 +151,7 @@ def parseCallTree(tree, mode, make_call_function):
             try:
                 kwargs[kw.arg] =  ast.literal_eval(kw.value)
             except ValueError:
-                name = ".".join(name)
+                name = ".".join(name_parts)
                 raise ValueError("Invalid value for argument {!r} of handler/method named {!r}".format(kw.arg, name))
 
         # Make a CallDescriptor
@@ -168,6 +171,64 @@ def parseCallTree(tree, mode, make_call_function):
     else:
         raise SyntaxError("Encountered unexpected node of type {}".format(type(tree)))
 
+def _orderOperands(subresults, order_key):
+    """ Return the functions from `subresults` (a list of (call list, function)
+        pairs) in the order they should be evaluated. """
+
+    if order_key is None:
+        return [f for calls, f in subresults]
+
+    keyed_operands = [(min(order_key(cd) for cd in calls), i, f) for i, (calls, f) in enumerate(subresults)]
+    keyed_operands.sort(key=lambda k: k[:2])
+
+    return [f for key, i, f in keyed_operands]
+
+def _makeShortCircuitFunction(funcs, stop_value):
+    """ Return a function that calls each of `funcs` in turn with its kwargs,
+        and returns `stop_value` as soon as any of them does (or the opposite
+        if none do).  A `stop_value` of False gives AND; True gives OR.
+
+        Operands that are themselves short-circuit functions with the same
+        `stop_value` are merged in, so that nested expressions are evaluated
+        in a single loop. """
+
+    flat_funcs = []
+    for g in funcs:
+        if getattr(g, "short_circuit_value", None) is stop_value:
+            flat_funcs.extend(g.operands)
+        else:
+            flat_funcs.append(g)
+    flat_funcs = tuple(flat_funcs)
+
+    if stop_value:
+        def f(**kwargs):
+            for g in flat_funcs:
+                if g(**kwargs):
+                    return True
+            return False
+    else:
+        def f(**kwargs):
+            for g in flat_funcs:
+                if not g(**kwargs):
+                    return False
+            return True
+
+    f.short_circuit_value = stop_value
+    f.operands = flat_funcs
+
+    return f
+
+def _makeSequenceFunction(funcs):
+    """ Return a function that calls each of `funcs` in turn with its kwargs,
+        and returns a list of their return values. """
+
+    funcs = tuple(funcs)
+
+    def f(**kwargs):
+        return [g(**kwargs) for g in funcs]
+
+    return f
+
 if __name__ == "__main__":
     logging.info("Running doctests...")
     import doctest
@@ -191,4 +252,10 @@ if __name__ == "__main__":
         print f
         print f(initial=True)
 
+    # Evaluate calls on robot "cheap" first
+    cds, f = parseCallString("expensive.a() and (cheap.b() or expensive.c())", mode="sensor",
+                             make_call_function=make_fake_function,
+                             order_key=lambda cd: cd.name[0] != "cheap")
+    print f(initial=False)
+
     
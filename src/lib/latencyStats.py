@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+""" ===========================================================================
+    latencyStats.py - Latency histograms for timing the phases of execution
+    ===========================================================================
+
+    Latencies are recorded into HDR-style histograms: durations are stored in
+    microseconds, in buckets whose width grows with the magnitude of the value
+    so that every value is kept to within about 1.5% regardless of scale,
+    using a small, fixed amount of memory.
+
+    >>> h = LatencyHistogram()
+    >>> for ms in range(1, 101):
+    ...     h.record(ms / 1000.0)
+    >>> h.getCount()
+    100
+    >>> abs(h.getPercentile(50) - 0.050) < 0.001
+    True
+    >>> abs(h.getPercentile(99) - 0.099) < 0.002
+    True
+
+    PhaseTimer keeps one rolling histogram per named phase:
+
+    >>> timer = PhaseTimer(["sensor", "motion"])
+    >>> with timer.measure("sensor"):
+    ...     pass
+    >>> timer.getStatistics()["sensor"]["count"]
+    1
+"""
+
+import threading
+import collections
+import globalConfig
+
+# Values below 2**SUB_BUCKET_BITS microseconds get a bucket each; above that,
+# each power of two is divided into 2**(SUB_BUCKET_BITS-1) buckets
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF_COUNT = SUB_BUCKET_COUNT >> 1
+
+# Largest value that can be recorded, in microseconds (about an hour);
+# anything longer is counted as this value
+MAX_TRACKABLE_VALUE = (1 << 32) - 1
+
+def _bucketIndex(value):
+    """ Return the index of the bucket for `value` (in microseconds). """
+
+    if value < SUB_BUCKET_COUNT:
+        return value
+
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKET_COUNT + (shift - 1) * SUB_BUCKET_HALF_COUNT + ((value >> shift) - SUB_BUCKET_HALF_COUNT)
+
+def _bucketRange(index):
+    """ Return the (lowest, highest) values (in microseconds) in the bucket `index`. """
+
+    if index < SUB_BUCKET_COUNT:
+        return index, index
+
+    shift = (index - SUB_BUCKET_COUNT) // SUB_BUCKET_HALF_COUNT + 1
+    mantissa = (index - SUB_BUCKET_COUNT) % SUB_BUCKET_HALF_COUNT + SUB_BUCKET_HALF_COUNT
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+NUM_BUCKETS = _bucketIndex(MAX_TRACKABLE_VALUE) + 1
+
+class LatencyHistogram(object):
+    """
+    A histogram of durations, with roughly constant relative precision.
+    Durations are given and returned in seconds.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """ Forget all recorded values. """
+
+        self.counts = [0] * NUM_BUCKETS
+        self.total_count = 0
+        self.total_time = 0.0
+        self.min_value = None
+        self.max_value = None
+
+    def record(self, duration):
+        """ Add a duration of `duration` seconds to the histogram. """
+
+        value = min(max(int(duration * 1e6), 0), MAX_TRACKABLE_VALUE)
+        self.counts[_bucketIndex(value)] += 1
+        self.total_count += 1
+        self.total_time += duration
+
+        if self.min_value is None or duration < self.min_value:
+            self.min_value = duration
+        if self.max_value is None or duration > self.max_value:
+            self.max_value = duration
+
+    def merge(self, other):
+        """ Add all values recorded in the histogram `other` to this one. """
+
+        if other.total_count == 0:
+            return
+
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total_count += other.total_count
+        self.total_time += other.total_time
+        self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+        self.max_value = other.max_value if self.max_value is None else max(self.max_value, other.max_value)
+
+    def getCount(self):
+        return self.total_count
+
+    def getMean(self):
+        """ Return the mean duration, or None if nothing has been recorded. """
+
+        if self.total_count == 0:
+            return None
+
+        return self.total_time / self.total_count
+
+    def getPercentile(self, percentile):
+        """ Return the duration below which `percentile` percent of the
+            recorded durations fall, or None if nothing has been recorded. """
+
+        if self.total_count == 0:
+            return None
+
+        # Rank of the value we're looking for (1-based)
+        target = max(1, int(round(percentile / 100.0 * self.total_count)))
+
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                low, high = _bucketRange(index)
+                # Report the middle of the bucket, within the observed range
+                value = (low + high) / 2.0 / 1e6
+                return min(max(value, self.min_value), self.max_value)
+
+        return self.max_value
+
+    def getSummary(self):
+        """ Return a dictionary of summary statistics, with durations in milliseconds. """
+
+        def to_ms(value):
+            return None if value is None else value * 1000.0
+
+        return {"count": self.total_count,
+                "min": to_ms(self.min_value),
+                "mean": to_ms(self.getMean()),
+                "p50": to_ms(self.getPercentile(50)),
+                "p90": to_ms(self.getPercentile(90)),
+                "p99": to_ms(self.getPercentile(99)),
+                "p99.9": to_ms(self.getPercentile(99.9)),
+                "max": to_ms(self.max_value)}
+
+class RollingLatencyHistogram(object):
+    """
+    A histogram that only covers roughly the last `window` seconds.
+
+    Values are recorded into one of `num_intervals` histograms, each covering
+    an equal part of the window; the oldest one is discarded as time moves on.
+    A separate histogram of all values ever recorded is kept in `lifetime`.
+    """
+
+    def __init__(self, window=60.0, num_intervals=6, timer_func=globalConfig.best_timer):
+        self.interval = float(window) / num_intervals
+        self.timer_func = timer_func
+
+        self.intervals = collections.deque([LatencyHistogram()], maxlen=num_intervals)
+        self.interval_start = self.timer_func()
+        self.lifetime = LatencyHistogram()
+
+    def _rotate(self):
+        """ Start new intervals for any time that has passed. """
+
+        now = self.timer_func()
+        elapsed_intervals = int((now - self.interval_start) // self.interval)
+        if elapsed_intervals <= 0:
+            return
+
+        for _ in xrange(min(elapsed_intervals, self.intervals.maxlen)):
+            self.intervals.append(LatencyHistogram())
+        self.interval_start += elapsed_intervals * self.interval
+
+    def record(self, duration):
+        self._rotate()
+        self.intervals[-1].record(duration)
+        self.lifetime.record(duration)
+
+    def getHistogram(self):
+        """ Return a LatencyHistogram of the values recorded during the window. """
+
+        self._rotate()
+
+        merged = LatencyHistogram()
+        for h in self.intervals:
+            merged.merge(h)
+
+        return merged
+
+class _NullMeasurement(object):
+    """ Stands in for _PhaseMeasurement when timing is disabled. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_MEASUREMENT = _NullMeasurement()
+
+class _PhaseMeasurement(object):
+    """ Context manager that records the time spent inside it. """
+
+    __slots__ = ("phase_timer", "phase", "start_time")
+
+    def __init__(self, phase_timer, phase):
+        self.phase_timer = phase_timer
+        self.phase = phase
+
+    def __enter__(self):
+        self.start_time = self.phase_timer.timer_func()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.phase_timer.record(self.phase, self.phase_timer.timer_func() - self.start_time)
+        return False
+
+class PhaseTimer(object):
+    """
+    Collects a RollingLatencyHistogram of durations for each of several named
+    phases.  Use measure() around the code to be timed:
+
+        with phase_timer.measure("sensor"):
+            ...
+
+    If `enabled` is False, nothing is recorded and measure() costs almost nothing.
+    Statistics may be read from a different thread than the one recording them.
+    """
+
+    def __init__(self, phases=(), enabled=True, window=60.0, num_intervals=6, timer_func=globalConfig.best_timer):
+        self.enabled = enabled
+        self.window = window
+        self.num_intervals = num_intervals
+        self.timer_func = timer_func
+
+        self._lock = threading.Lock()
+
+        # Keep phases in the order they were given, for reports
+        self.histograms = collections.OrderedDict()
+        for phase in phases:
+            self._addPhase(phase)
+
+    def _addPhase(self, phase):
+        self.histograms[phase] = RollingLatencyHistogram(self.window, self.num_intervals, self.timer_func)
+        return self.histograms[phase]
+
+    def measure(self, phase):
+        """ Return a context manager that records the time spent inside it under `phase`. """
+
+        if not self.enabled:
+            return _NULL_MEASUREMENT
+
+        return _PhaseMeasurement(self, phase)
+
+    def record(self, phase, duration):
+        """ Record a duration of `duration` seconds for `phase`. """
+
+        if not self.enabled:
+            return
+
+        with self._lock:
+            histogram = self.histograms.get(phase)
+            if histogram is None:
+                histogram = self._addPhase(phase)
+            histogram.record(duration)
+
+    def getStatistics(self, lifetime=False):
+        """ Return a dictionary of phase name -> summary statistics (see
+            LatencyHistogram.getSummary()), covering either the rolling
+            window, or everything since we started if `lifetime` is True. """
+
+        with self._lock:
+            return {phase: (h.lifetime if lifetime else h.getHistogram()).getSummary()
+                    for phase, h in self.histograms.iteritems()}
+
+    def formatReport(self, lifetime=True):
+        """ Return a human-readable table of the statistics for all phases. """
+
+        columns = ["count", "min", "mean", "p50", "p90", "p99", "p99.9", "max"]
+        stats = self.getStatistics(lifetime)
+
+        lines = ["{:<12}".format("phase (ms)") + "".join("{:>10}".format(c) for c in columns)]
+        for phase in self.histograms:
+            cells = []
+            for c in columns:
+                value = stats[phase][c]
+                if value is None:
+                    cells.append("{:>10}".format("-"))
+                elif c == "count":
+                    cells.append("{:>10d}".format(value))
+                else:
+                    cells.append("{:>10.3f}".format(value))
+            lines.append("{:<12}".format(phase) + "".join(cells))
+
+        return "\n".join(lines)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
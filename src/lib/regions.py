@@ -163,6 +163,8 @@ class RegionFileInterface(object):
         self.transitions = transitions
         self.filename = None
 
+        self.invalidateSpatialIndex()
+
     def setToDefaultName(self, region):
         if region.name is '':
             # Find an available name
@@ -318,6 +320,119 @@ class RegionFileInterface(object):
 
         return (leftMargin, topMargin, rightExtent, downExtent)
 
+    def invalidateSpatialIndex(self):
+        """
+        Forget the spatial index used by findRegionContainingPoint().
+
+        The index is rebuilt automatically when regions are added, removed or
+        replaced (even if `self.regions` itself is replaced by another list),
+        but this must be called if the shape, position or name of a region
+        changes.
+        """
+
+        self._spatial_index = None
+        self._spatial_index_regions = None  # (the indexed list, a tuple of the regions it held)
+
+    def _spatialIndexIsStale(self):
+        """
+        Return True iff the spatial index was built for a different list of
+        regions, or for different contents of the current one.
+        """
+
+        if self._spatial_index_regions is None:
+            return True
+
+        indexed_list, indexed_regions = self._spatial_index_regions
+        if indexed_list is not self.regions or len(indexed_regions) != len(self.regions):
+            return True
+
+        return not all(indexed_regions[i] is region for i, region in enumerate(self.regions))
+
+    def _buildSpatialIndex(self):
+        """
+        Build a uniform grid over the bounding boxes of all regions, with
+        about as many cells as there are regions.  Each cell lists (in order)
+        the regions whose bounding boxes overlap it, along with their
+        absolute coordinates for point-in-polygon tests.
+        """
+
+        entries = []
+        for i, region in enumerate(self.regions):
+            boundary = [(pt.x, pt.y) for pt in region.getPoints()]
+            if not boundary:
+                continue
+
+            xs = [pt[0] for pt in boundary]
+            ys = [pt[1] for pt in boundary]
+            bbox = (min(xs), min(ys), max(xs), max(ys))
+
+            if region.type == reg_RECT:
+                # The bounding box test is all we need
+                boundary = None
+                holes = []
+            else:
+                holes = [[(pt.x, pt.y) for pt in region.getPoints(hole_id=h)]
+                         for h in range(len(region.holeList))]
+
+            entries.append((i, region.name.lower(), bbox, boundary, holes))
+
+        if not entries:
+            return None
+
+        min_x = min(e[2][0] for e in entries)
+        min_y = min(e[2][1] for e in entries)
+        max_x = max(e[2][2] for e in entries)
+        max_y = max(e[2][3] for e in entries)
+
+        num_cells = int(math.ceil(math.sqrt(len(entries))))
+        cell_width = (max_x - min_x) / num_cells or 1.0
+        cell_height = (max_y - min_y) / num_cells or 1.0
+
+        cells = {}
+        for entry in entries:
+            x0, y0, x1, y1 = entry[2]
+            for cx in range(int((x0 - min_x) / cell_width), min(int((x1 - min_x) / cell_width), num_cells - 1) + 1):
+                for cy in range(int((y0 - min_y) / cell_height), min(int((y1 - min_y) / cell_height), num_cells - 1) + 1):
+                    cells.setdefault((cx, cy), []).append(entry)
+
+        return (min_x, min_y, max_x, max_y, cell_width, cell_height, num_cells, cells)
+
+    def findRegionContainingPoint(self, x, y, ignore_boundary=False):
+        """
+        Return the index of the first region that contains the point (x, y),
+        or None if there isn't one.  If `ignore_boundary` is True, the region
+        named "boundary" is never returned.
+
+        Only the few regions whose bounding boxes overlap the same cell of a
+        spatial index as the point are tested for containment.
+        """
+
+        if self._spatialIndexIsStale():
+            self._spatial_index = self._buildSpatialIndex()
+            self._spatial_index_regions = (self.regions, tuple(self.regions))
+
+        if self._spatial_index is None:
+            return None
+
+        min_x, min_y, max_x, max_y, cell_width, cell_height, num_cells, cells = self._spatial_index
+
+        if x < min_x or x > max_x or y < min_y or y > max_y:
+            return None
+
+        cx = min(int((x - min_x) / cell_width), num_cells - 1)
+        cy = min(int((y - min_y) / cell_height), num_cells - 1)
+
+        for i, name, (x0, y0, x1, y1), boundary, holes in cells.get((cx, cy), ()):
+            if x < x0 or x > x1 or y < y0 or y > y1:
+                continue
+            if ignore_boundary and name == "boundary":
+                continue
+            if boundary is None or (polygonContainsPoint(boundary, x, y) and
+                                    not any(polygonContainsPoint(h, x, y) for h in holes)):
+                return i
+
+        return None
+
     def getExternalFaces(self):
         """
         Returns a list of faces that are not connected to any
@@ -452,6 +567,7 @@ class RegionFileInterface(object):
                 self.regions[self.indexOfRegionWithName(rname)].isObstacle = True
             
         self.filename = filename
+        self.invalidateSpatialIndex()
 
         return True
    
@@ -1079,6 +1195,26 @@ def findRegionBetween(regionA, regionB,name = 'newRegion'):
 
     return newRegion
 
+def polygonContainsPoint(points, x, y):
+    """
+    Return True iff the point (x, y) is inside the polygon with vertices
+    `points` (a list of (x, y) tuples), using the crossing-number test.
+
+    >>> square = [(0.0, 0.0), (2.0, 0.0), (2.0, 2.0), (0.0, 2.0)]
+    >>> polygonContainsPoint(square, 1.0, 1.0), polygonContainsPoint(square, 3.0, 1.0)
+    (True, False)
+    """
+
+    inside = False
+    x1, y1 = points[-1]
+    for x2, y2 in points:
+        # Count the edges crossed by a ray from the point towards +x
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+
+    return inside
+
 def pointLineIntersection(pt1, pt2, test_pt):
     """
     Given two points (pt1, pt2), find the point on the line formed by those points that is nearest
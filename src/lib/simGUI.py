@@ -112,6 +112,7 @@ class SimGUI_Frame(wx.Frame):
 
         # Register functions with the XML-RPC server
         self.xmlrpc_server.register_function(self.handleEvent)
+        self.xmlrpc_server.register_multicall_functions() # The executor sends events in batches
 
         # Kick off the XML-RPC server thread    
         self.XMLRPCServerThread = threading.Thread(target=self.xmlrpc_server.serve_forever)
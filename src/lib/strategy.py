@@ -15,6 +15,10 @@ import regions
 import sys
 import collections
 import copy
+import os
+import gzip
+import json
+import xml.sax.saxutils
 import globalConfig
 
 # TODO: make sure this works with mopsy
@@ -24,28 +28,137 @@ import globalConfig
 # TODO: should we be using region names instead of objects to avoid
 # weird errors if two copies of the same map are used?
 
-def createStrategyFromFile(filename, input_propositions, output_propositions):
+def createStrategyFromFile(filename, input_propositions, output_propositions, use_cache=True,
+                           precompute_successors=False, optimize=False):
     """ High-level method for loading a strategy of any type from file.
 
         Takes a filename and lists of input and output propositions.
-        Returns a fully-loaded instance of a Strategy subclass."""
+        Returns a fully-loaded instance of a Strategy subclass.
+
+        If `use_cache` is True, explicit-state strategies will be loaded from
+        a binary cache file next to the original (e.g. "foo.autc" for
+        "foo.aut") whenever it is up-to-date, and the cache will be
+        (re)created otherwise.
+
+        If `precompute_successors` is True, BDD strategies will build an
+        explicit table of the successors of all reachable states as soon as
+        they are loaded (see BDDStrategy.precomputeSuccessors()).
+
+        If `optimize` is True, BDD strategies will be optimized with the
+        default settings as soon as they are loaded (see BDDStrategy.optimize())."""
+
+    new_strategy = _createEmptyStrategy(filename, input_propositions, output_propositions,
+                                        use_cache, precompute_successors, optimize)
+    new_strategy.loadFromFile(filename)
+
+    return new_strategy
+
+def _createEmptyStrategy(filename, input_propositions, output_propositions, use_cache,
+                         precompute_successors, optimize):
+    """ Instantiate the appropriate subclass of Strategy for `filename` and
+        configure its propositions, without loading anything yet. """
 
-    # Instantiate the appropriate subclass of strategy
     if filename.endswith(".aut"):
         import fsa
         new_strategy = fsa.FSAStrategy()
+        new_strategy.use_cache = use_cache
     elif filename.endswith(".bdd"):
         import bdd
-        new_strategy = bdd.BDDStrategy()
+        new_strategy = bdd.BDDStrategy(precompute_successors=precompute_successors, optimize=optimize)
     else:
         raise ValueError("Unsupported strategy file type.  Filename must end with either '.aut' or '.bdd'.")
 
-    # Configure and load
     new_strategy.configurePropositions(input_propositions, output_propositions)
-    new_strategy.loadFromFile(filename)
 
     return new_strategy
 
+def createStrategiesFromFiles(strategy_specs, use_cache=True, processes=None, precompute_successors=False,
+                              optimize=False):
+    """ Batch version of createStrategyFromFile(), for loading several
+        strategies at once.
+
+        `strategy_specs` is a list of (filename, input_propositions,
+        output_propositions) tuples.  Returns a list of fully-loaded
+        Strategy instances, in the same order.
+
+        Explicit-state (.aut) strategies are parsed in parallel by a pool of
+        `processes` worker processes (by default, one per CPU), which send
+        back their packed state tables.  Only proposition names are sent to
+        the workers, so domains (e.g. of regions) never need to be pickled.
+        BDD strategies cannot be transferred between processes, so they are
+        loaded in this process while the workers are busy.
+
+        `use_cache`, `precompute_successors` and `optimize` have the same
+        meaning as for createStrategyFromFile(). """
+
+    import fsa
+    import multiprocessing
+
+    # Set up all the strategy objects first, so that any configuration
+    # errors are raised before we start any work
+    new_strategies = [_createEmptyStrategy(filename, input_propositions, output_propositions,
+                                           use_cache, precompute_successors, optimize)
+                      for filename, input_propositions, output_propositions in strategy_specs]
+
+    fsa_jobs = [(n, filename) for n, (filename, _, _) in enumerate(strategy_specs) if filename.endswith(".aut")]
+
+    logging.info("Loading {} strategies...".format(len(new_strategies)))
+    tic = globalConfig.best_timer()
+
+    # There's no point in starting a pool for a single automaton
+    pool = None
+    if len(fsa_jobs) > 1:
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(min(processes, len(fsa_jobs)))
+
+    try:
+        pending = {}
+        if pool is not None:
+            for n, filename in fsa_jobs:
+                prop_names = new_strategies[n].states.getPropositions(expand_domains=True)
+                pending[n] = pool.apply_async(fsa.loadPackedStates,
+                                              (filename, prop_names, use_cache, new_strategies[n].use_mmap))
+            pool.close()
+
+        # Load everything else here in the meantime
+        for n, (filename, _, _) in enumerate(strategy_specs):
+            if n not in pending:
+                new_strategies[n].loadFromFile(filename)
+
+        for n, result in pending.iteritems():
+            new_strategies[n].setPackedStates(result.get())
+
+        if pool is not None:
+            pool.join()
+    except:
+        if pool is not None:
+            pool.terminate()
+        raise
+
+    toc = globalConfig.best_timer()
+    logging.info("Loaded {} strategies in {} seconds.".format(len(new_strategies), toc-tic))
+
+    return new_strategies
+
+class _ImmutableDict(dict):
+    """ A dictionary that cannot be modified, so that it can be safely
+        shared between callers.  Copies are ordinary dictionaries. """
+
+    def _readOnly(self, *args, **kwds):
+        raise TypeError("This dictionary is shared and cannot be modified; make a copy first.")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readOnly
+
+    def copy(self):
+        return dict(self)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
 class Domain(object):
     """ A Domain is a bit-vector abstraction, allowing a proposition to effectively
     have values other than just True and False.
@@ -102,6 +215,42 @@ class Domain(object):
         else:
             self.num_props = num_props
 
+        self._buildTables()
+
+    def _buildTables(self):
+        """ Precompute the lookup tables used for converting between values
+            and proposition assignments. """
+
+        self._prop_names = tuple("{}_b{}".format(self.name, bit) for bit in range(self.num_props))
+
+        # Numeric weight of each subproposition
+        if self.endianness == Domain.B0_IS_MSB:
+            self._bit_weights = tuple(2**((self.num_props-1)-bit) for bit in range(self.num_props))
+        else:
+            self._bit_weights = tuple(2**bit for bit in range(self.num_props))
+        self._weighted_props = zip(self._prop_names, self._bit_weights)
+
+        # Number -> (immutable) assignment dictionary.  This is filled in
+        # lazily for numbers outside of the value mapping.
+        self._assignment_table = {}
+
+        # Value -> number, for values that can be hashed
+        self._value_to_number = {}
+
+        if self.value_mapping is not None:
+            for n, value in enumerate(self.value_mapping):
+                self._assignment_table[n] = self._makeAssignment(n)
+                try:
+                    self._value_to_number.setdefault(value, n)
+                except TypeError:
+                    pass
+
+    def _makeAssignment(self, number):
+        """ Create the assignment dictionary for the integer `number`. """
+
+        return _ImmutableDict((prop_name, bool(number & weight))
+                              for prop_name, weight in self._weighted_props)
+
     def propAssignmentsToValue(self, prop_assignments):
         """ Return the value of this domain, based on a dictionary [prop_name(str)->value(bool)] of
             the values of the propositions composing this domain.
@@ -114,7 +263,7 @@ class Domain(object):
             try:
                 return self.value_mapping[n]
             except IndexError:
-                relevant_assignments = {k: v for k, v in prop_assignments.iteritems() if k in self.getPropositions()}
+                relevant_assignments = {k: v for k, v in prop_assignments.iteritems() if k in self._prop_names}
                 raise ValueError("Invalid assignment of {!r} to domain {!r} ({} > {})".format(relevant_assignments, self.name,
                                                                                               n, len(self.value_mapping)-1))
 
@@ -124,56 +273,69 @@ class Domain(object):
         """
 
         value = 0
-        for bit, prop_name in enumerate(self.getPropositions()):
-            if prop_name not in prop_assignments:
-                raise ValueError("Cannot evaluate domain {!r} because expected subproposition {!r} is undefined.".format(self.name, prop_name))
-
-            if prop_assignments[prop_name]:
-                if self.endianness == Domain.B0_IS_MSB:
-                    value += 2**((self.num_props-1)-bit)
-                else:
-                    value += 2**bit
+        try:
+            for prop_name, weight in self._weighted_props:
+                if prop_assignments[prop_name]:
+                    value += weight
+        except KeyError:
+            raise ValueError("Cannot evaluate domain {!r} because expected subproposition {!r} is undefined.".format(self.name, prop_name))
 
         return value
 
     def valueToPropAssignments(self, value):
         """ Convert a value into the corresponding dictionary [prop_name(str)->value(bool)]
-            of propositions composing this domain
+            of propositions composing this domain.
+
+            The returned dictionary is shared, and cannot be modified.
         """
 
+        return self.numericValueToPropAssignments(self.valueToNumericValue(value))
+
+    def valueToNumericValue(self, value):
+        """ Convert a value into the corresponding integer value. """
+
         if self.value_mapping is None:
             if isinstance(value, int):
-                n = value
+                return value
             else:
                 raise TypeError("Non-integral values are not permitted without a value_mapping.")
         else:
-            n = self.value_mapping.index(value)
-
-        return self.numericValueToPropAssignments(n)
+            try:
+                return self._value_to_number[value]
+            except (KeyError, TypeError):
+                return self.value_mapping.index(value)
 
     def numericValueToPropAssignments(self, number):
         """ Convert an integer value into the corresponding dictionary [prop_name(str)->value(bool)]
-            of propositions composing this domain
+            of propositions composing this domain.
+
+            The returned dictionary is shared, and cannot be modified.
         """
 
         # Perform input sanity checks
         if not isinstance(number, int):
             raise TypeError("Cannot set domain to non-integral value.")
 
+        try:
+            return self._assignment_table[number]
+        except KeyError:
+            pass
+
         if number < 0:
             raise TypeError("Cannot set domain to negative value.")
 
-        # Convert to a left-padded bitstring
-        bs = "{0:0>{1}}".format(bin(number)[2:], self.num_props)
+        if number >= 2**self.num_props:
+            raise ValueError("Value {} is too large for domain {!r} ({} bits)".format(number, self.name, self.num_props))
+
+        assignment = self._makeAssignment(number)
+        self._assignment_table[number] = assignment
 
-        # Create a dictionary based on the bitstring
-        return {"{}_b{}".format(self.name, bit):(v=="1") for bit, v in
-                enumerate(bs if self.endianness == Domain.B0_IS_MSB else reversed(bs))}
+        return assignment
 
     def getPropositions(self):
         """ Returns a list of the names of the propositions that are covered by this domain. """
 
-        return ["{}_b{}".format(self.name, bit) for bit in range(self.num_props)]
+        return list(self._prop_names)
 
     def __str__(self):
         return '<Domain "{0}" ({0}_b0:{0}_b{1})>'.format(self.name, self.num_props-1)
@@ -222,13 +384,31 @@ class State(object):
         self.context = parent
         self.assignment = {}
 
+        # Canonical key for hashing and comparison; see getKey()
+        self._key = None
+
         # Some optional meta-data
         self.state_id = None  # If you want to give the state a unique identifier
         self.goal_id = None   # Index of currently-pursued goal
 
+        # Storage for other representations of this state that are derived
+        # from its assignment (e.g. BDDs), which is cleared whenever the
+        # assignment changes
+        self.derived_cache = {}
+
         if prop_assignments is not None:
             self.setPropValues(prop_assignments)
 
+    @property
+    def goal_id(self):
+        """ Index of currently-pursued goal """
+        return self._goal_id
+
+    @goal_id.setter
+    def goal_id(self, value):
+        self._goal_id = value
+        self._key = None
+
     def getName(self):
         if self.state_id is None:
             # Make sure the unique ID is positive
@@ -332,9 +512,7 @@ class State(object):
         # has been upconverted will cause problems
 
         # Check that this is a known prop_name
-        if (prop_name not in self.context.input_props) and \
-           (prop_name not in self.context.output_props) and \
-           (self.context.getDomainOfProposition(prop_name) is None):
+        if not self.context.isKnownProposition(prop_name):
             raise ValueError("Unknown proposition/domain {!r}".format(prop_name))
 
         # Make sure that the value makes sense
@@ -348,6 +526,8 @@ class State(object):
 
         # Store the value
         self.assignment[prop_name] = prop_value
+        self.derived_cache.clear()
+        self._key = None
 
     def setPropValues(self, prop_assignments):
         """ Update the assignments in this state according to `prop_assignments`.
@@ -387,17 +567,38 @@ class State(object):
         else:
             return sys_state
 
+    def getKey(self):
+        """ Return a canonical key for this state, which is equal for two states
+            in the same StateCollection iff they have the same assignment and goal.
+
+            The key packs the values of all propositions (with each domain
+            as its numeric value) into a single integer, and is only
+            recalculated after the state has been modified. """
+
+        if self._key is None:
+            # Use getPropValue() instead of self.assignment directly so that
+            # the key is consistent between states with different levels of
+            # Domain "up-conversion"
+            packed = 0
+            for name, domain, width in self.context.getKeyLayout():
+                value = self.getPropValue(name)
+                if domain is not None:
+                    value = domain.valueToNumericValue(value)
+                packed = (packed << width) | value
+
+            self._key = (packed, self.goal_id)
+
+        return self._key
+
     def __eq__(self, other):
-        return isinstance(other, State) and hash(self) == hash(other)
+        return isinstance(other, State) and self.context is other.context and \
+               self.getKey() == other.getKey()
+
+    def __ne__(self, other):
+        return not self == other
 
     def __hash__(self):
-        # We need to call getAll() instead of using self.assignment directly so
-        # that the hash is consistent between states with different levels of
-        # Domain "up-conversion"
-        # TODO: This design choice might be worth reconsidering at some point.
-        return hash((id(self.context),
-                     frozenset(self.getAll().items()),
-                     self.goal_id))
+        return hash((id(self.context), self.getKey()))
 
     def __repr__(self):
         return "<State with assignment: inputs = {}, outputs = {} (goal_id = {})>".format(self.getInputs(), self.getOutputs(), self.goal_id)
@@ -449,6 +650,24 @@ class StateCollection(list):
         self.output_props = []
         self.domains = []
 
+        self._rebuildLookupTables()
+
+    def _rebuildLookupTables(self):
+        """ Recreate the dictionaries used to quickly find domains by name
+            or by subproposition name.  This must be called whenever the
+            propositions or domains change. """
+
+        self._domains_by_name = {d.name: d for d in self.domains}
+        self._domains_by_subprop = {p: d for d in self.domains for p in d.getPropositions()}
+        self._known_prop_names = set(self.input_props) | set(self.output_props) | set(self._domains_by_subprop)
+
+        # (name, domain or None, number of bits) for each proposition, in the
+        # order they are packed into state keys
+        self._key_layout = []
+        for name in self.input_props + self.output_props:
+            domain = self._domains_by_name.get(name)
+            self._key_layout.append((name, domain, 1 if domain is None else domain.num_props))
+
     def clearStates(self):
         """ Remove all states. """
 
@@ -469,6 +688,8 @@ class StateCollection(list):
             else:
                 target.append(prop)
 
+        self._rebuildLookupTables()
+
     def addInputPropositions(self, prop_list):
         """ Register the propositions in `prop_list` as input propositions.
             Each element of `prop_list` may be either a bare string,
@@ -526,22 +747,33 @@ class StateCollection(list):
 
         return new_state
 
+    def getKeyLayout(self):
+        """ Return a list of (name, domain, number of bits) for each
+            proposition, describing how states' keys are packed (see
+            State.getKey()).  `domain` is None for binary propositions. """
+
+        return self._key_layout
+
+    def isKnownProposition(self, prop_name):
+        """ Returns True iff `prop_name` is the name of a proposition, domain,
+            or subproposition of a domain in this collection. """
+
+        return prop_name in self._known_prop_names
+
     def getDomainOfProposition(self, prop_name):
         """ Returns the Domain object for which proposition `prop_name`
             is a subproposition.
 
             If no such Domain is found, returns None. """
 
-        # TODO: We could do this faster by just using the beginning of the
-        #       proposition's name-- it would be more hard-coded, though.
-        return next((d for d in self.domains if prop_name in d.getPropositions()), None)
+        return self._domains_by_subprop.get(prop_name)
 
     def getDomainByName(self, name):
         """ Returns the Domain object with name `name`.
 
             If no such Domain is found, returns None. """
 
-        return next((d for d in self.domains if d.name == name), None)
+        return self._domains_by_name.get(name)
 
 class Strategy(object):
     """
@@ -613,65 +845,273 @@ class Strategy(object):
 
         return next(self.searchForStates(prop_assignments, state_list), None)
 
-    def exportAsDotFile(self, filename, starting_states=None):
+    def exportAsDotFile(self, filename, starting_states=None, max_depth=None, max_states=None):
         """ Output an explicit-state strategy to a .dot file of name `filename`.
-            (For use with GraphViz.) """
+            (For use with GraphViz.)  See exportToFile() for the other arguments. """
+
+        self.exportToFile(filename, starting_states, "dot", max_depth, max_states)
+
+    def exportToFile(self, filename, starting_states=None, file_format=None, max_depth=None, max_states=None):
+        """ Output the part of the strategy reachable from `starting_states` (or
+            from all states, if omitted) to the file `filename`.
+
+            `file_format` is one of "dot" (for GraphViz), "graphml", or "jsonl"
+            (one JSON object per state or transition; gzip-compressed if the
+            filename ends with ".gz").  If omitted, it is guessed from the filename.
+
+            If `starting_states` is given, states are explored breadth-first
+            and written out as they are found.  If `max_depth` is given, states
+            more than that many transitions from the starting states are left
+            out.  Otherwise, every state is a starting state, so the states are
+            simply written out in turn as they are enumerated, without holding
+            on to any of them.  In either case, if `max_states` is given, at
+            most that many states are written.
+
+            States are only remembered by their names (see State.getName()),
+            so memory use is bounded by `max_states` (if given) and by the
+            number of states reached from `starting_states` (if given). """
+
+        if file_format is None:
+            file_format = _guessExportFormat(filename)
+
+        try:
+            writer_class = _EXPORT_WRITERS[file_format]
+        except KeyError:
+            raise ValueError("Unknown export format {!r}; choose one of {}".format(file_format, ", ".join(sorted(_EXPORT_WRITERS))))
+
+        # Names of all states that have been admitted into the export
+        exported_names = set()
+        truncated = [False]
+        def admit(name):
+            """ Returns True iff the state named `name` is (now) part of the export. """
+            if name in exported_names:
+                return True
+            if max_states is not None and len(exported_names) >= max_states:
+                truncated[0] = True
+                return False
+            exported_names.add(name)
+            return True
+
+        if filename.endswith(".gz"):
+            f_out = gzip.open(filename, 'wb')
+        else:
+            f_out = open(filename, 'w')
+
+        with f_out:
+            writer = writer_class(f_out, self.states)
+            writer.writeHeader()
+
+            if starting_states is None:
+                # Every state will be written when the enumeration reaches
+                # it, so we only need to remember which ones were admitted
+                # if there's a limit on their number
+                for this_state in self.iterateOverStates():
+                    this_name = this_state.getName()
+                    if max_states is not None and not admit(this_name):
+                        continue
+                    writer.writeState(this_name, this_state)
+
+                    for next_state in self.findTransitionableStates({}, from_state=this_state):
+                        next_name = next_state.getName()
+                        if max_states is None or admit(next_name):
+                            writer.writeTransition(this_name, next_name, next_state)
+            else:
+                states_to_process = collections.deque()
+                def add_state(state, depth):
+                    name = state.getName()
+                    if name in exported_names:
+                        return True
+                    if max_depth is not None and depth > max_depth:
+                        truncated[0] = True
+                        return False
+                    if not admit(name):
+                        return False
+                    states_to_process.append((state, depth))
+                    return True
+
+                for state in starting_states:
+                    add_state(state, 0)
+
+                while states_to_process:
+                    this_state, depth = states_to_process.popleft()
+                    this_name = this_state.getName()
+                    writer.writeState(this_name, this_state)
+
+                    for next_state in self.findTransitionableStates({}, from_state=this_state):
+                        # Only include transitions between states that are exported
+                        if add_state(next_state, depth+1):
+                            writer.writeTransition(this_name, next_state.getName(), next_state)
+
+            writer.writeFooter()
+
+        if truncated[0]:
+            logging.warning("Strategy export to {!r} was truncated at {} states".format(filename, len(exported_names)))
+
+def _guessExportFormat(filename):
+    """ Guess the strategy export format from the extension of `filename`. """
+
+    name = filename[:-3] if filename.endswith(".gz") else filename
+    extension = os.path.splitext(name)[1].lower()
+
+    if extension in (".graphml", ".xml"):
+        return "graphml"
+    elif extension in (".jsonl", ".json"):
+        return "jsonl"
+    else:
+        return "dot"
+
+class _ExportWriter(object):
+    """ Base class for the file writers used by Strategy.exportToFile().
+
+        Transition labels are cached by input assignment, and identical labels
+        are shared, so that each distinct assignment to the inputs only needs
+        to be formatted once.  Neither cache refers to any states, and both
+        are bounded by the number of distinct labels. """
+
+    def __init__(self, f_out, context):
+        self.f_out = f_out
+        self.context = context
+        self._transition_labels = {}
+        self._label_pool = {}
+
+    def _intern(self, label):
+        return self._label_pool.setdefault(label, label)
+
+    def getStateLabel(self, state):
+        """ Return the label for `state`, showing its outputs and goal. """
+
+        # Each state is only written once, so there's no need to cache this
+        return self._intern(self.formatStateLabel(state))
+
+    def getTransitionLabel(self, next_state):
+        """ Return the label for a transition into `next_state`, showing its inputs. """
+
+        inputs = frozenset(next_state.getInputs().iteritems())
+        try:
+            return self._transition_labels[inputs]
+        except KeyError:
+            label = self._transition_labels[inputs] = self._intern(self.formatTransitionLabel(next_state))
+            return label
+
+    def formatStateLabel(self, state):
+        raise NotImplementedError("Use a subclass of _ExportWriter")
+
+    def formatTransitionLabel(self, next_state):
+        raise NotImplementedError("Use a subclass of _ExportWriter")
+
+    def writeHeader(self):
+        pass
+
+    def writeState(self, name, state):
+        raise NotImplementedError("Use a subclass of _ExportWriter")
+
+    def writeTransition(self, from_name, to_name, next_state):
+        raise NotImplementedError("Use a subclass of _ExportWriter")
+
+    def writeFooter(self):
+        pass
+
+def _prettyPrintAssignment(name, val):
+    """ Return a human-readable representation of a single proposition value. """
+
+    if isinstance(val, bool):
+        return name if val else "!"+name
+    elif isinstance(val, regions.Region):
+        val = val.name + " ()" # TODO: parent region
+
+    return "{} = {}".format(name, val)
+
+class _DotWriter(_ExportWriter):
+    """ Writes a GraphViz .dot file.  Edges may be written before the nodes
+        they refer to, which GraphViz allows. """
+
+    def formatStateLabel(self, state):
+        state_label = "\\n".join((_prettyPrintAssignment(k, v)
+                                  for k, v in state.getOutputs().iteritems()))
+        return state_label + "\\n[Goal #{}]".format(state.goal_id)
+
+    def formatTransitionLabel(self, next_state):
+        return "\\n".join((_prettyPrintAssignment(k, v)
+                           for k, v in next_state.getInputs().iteritems()))
 
-        if starting_states is None:
-            starting_states = self.iterateOverStates()
+    def writeHeader(self):
+        self.f_out.write(textwrap.dedent("""
+            digraph A {
+                rankdir = LR;
+                overlap = false;
+                ratio = "compress";
+        """))
 
-        processed_states = set()
-        states_to_process = collections.deque(starting_states)
+    def writeState(self, name, state):
+        self.f_out.write('\t{} [style="bold", width=0, height=0, fontsize=20, label="{}"];\n'\
+                         .format(name, self.getStateLabel(state)))
 
-        # We will save the transitions in memory to output at the end of the file, after the states
-        transitions = []
+    def writeTransition(self, from_name, to_name, next_state):
+        self.f_out.write('\t{} -> {} [style="bold", arrowsize=1.5, fontsize=20, label="{}"];\n'\
+                         .format(from_name, to_name, self.getTransitionLabel(next_state)))
 
-        with open(filename, 'w') as f_out:
-            # Header
-            f_out.write(textwrap.dedent("""
-                digraph A {
-                    rankdir = LR;
-                    overlap = false;
-                    ratio = "compress";
-            """))
+    def writeFooter(self):
+        self.f_out.write("} \n")
 
-            # Define a helper function
-            def pprint_assignment(name, val):
-                if isinstance(val, bool):
-                    return name if val else "!"+name
-                elif isinstance(val, regions.Region):
-                    val = val.name + " ()" # TODO: parent region
+class _GraphMLWriter(_ExportWriter):
+    """ Writes a GraphML file, with labels and goals as node/edge data. """
 
-                return "{} = {}".format(name, val)
+    def formatStateLabel(self, state):
+        return xml.sax.saxutils.escape("\n".join(_prettyPrintAssignment(k, v)
+                                                 for k, v in state.getOutputs().iteritems()))
 
-            while states_to_process:
-                this_state = states_to_process.pop()
+    def formatTransitionLabel(self, next_state):
+        return xml.sax.saxutils.escape("\n".join(_prettyPrintAssignment(k, v)
+                                                 for k, v in next_state.getInputs().iteritems()))
+
+    def writeHeader(self):
+        self.f_out.write(textwrap.dedent("""\
+            <?xml version="1.0" encoding="UTF-8"?>
+            <graphml xmlns="http://graphml.graphdrawing.org/xmlns">
+              <key id="label" for="all" attr.name="label" attr.type="string"/>
+              <key id="goal" for="node" attr.name="goal" attr.type="string"/>
+              <graph id="strategy" edgedefault="directed">
+        """))
 
-                # Skip this if we processed this already earlier on the stack
-                if this_state in processed_states:
-                    continue
+    def writeState(self, name, state):
+        self.f_out.write('    <node id={}><data key="label">{}</data><data key="goal">{}</data></node>\n'\
+                         .format(xml.sax.saxutils.quoteattr(str(name)), self.getStateLabel(state),
+                                 xml.sax.saxutils.escape(str(state.goal_id))))
 
-                state_label = "\\n".join((pprint_assignment(k, v)
-                                          for k, v in this_state.getOutputs().iteritems()))
-                state_label += "\\n[Goal #{}]".format(this_state.goal_id)
-                f_out.write('\t{} [style="bold", width=0, height=0, fontsize=20, label="{}"];\n'\
-                            .format(this_state.getName(), state_label))
+    def writeTransition(self, from_name, to_name, next_state):
+        self.f_out.write('    <edge source={} target={}><data key="label">{}</data></edge>\n'\
+                         .format(xml.sax.saxutils.quoteattr(str(from_name)), xml.sax.saxutils.quoteattr(str(to_name)),
+                                 self.getTransitionLabel(next_state)))
 
-                processed_states.add(this_state)
+    def writeFooter(self):
+        self.f_out.write("  </graph>\n</graphml>\n")
 
-                for next_state in self.findTransitionableStates({}, from_state=this_state):
-                    trans_label = "\\n".join((pprint_assignment(k, v)
-                                              for k, v in next_state.getInputs().iteritems()))
-                    transitions.append('\t{} -> {} [style="bold", arrowsize=1.5, fontsize=20, label="{}"];\n'\
-                                .format(this_state.getName(), next_state.getName(), trans_label))
+class _JSONLinesWriter(_ExportWriter):
+    """ Writes one JSON object per line for each state and each transition.
+        Labels are the JSON-encoded proposition assignments. """
 
-                    if next_state not in processed_states:
-                        states_to_process.append(next_state)
+    @staticmethod
+    def _encodeAssignment(assignment):
+        return json.dumps({k: (v.name if isinstance(v, regions.Region) else v)
+                           for k, v in assignment.iteritems()}, sort_keys=True)
 
-            f_out.writelines(transitions)
+    def formatStateLabel(self, state):
+        return self._encodeAssignment(state.getOutputs())
 
-            # Close the digraph
-            f_out.write("} \n")
+    def formatTransitionLabel(self, next_state):
+        return self._encodeAssignment(next_state.getInputs())
+
+    def writeState(self, name, state):
+        self.f_out.write('{{"type": "state", "id": {}, "goal": {}, "outputs": {}}}\n'\
+                         .format(json.dumps(name), json.dumps(state.goal_id), self.getStateLabel(state)))
+
+    def writeTransition(self, from_name, to_name, next_state):
+        self.f_out.write('{{"type": "transition", "from": {}, "to": {}, "inputs": {}}}\n'\
+                         .format(json.dumps(from_name), json.dumps(to_name), self.getTransitionLabel(next_state)))
+
+_EXPORT_WRITERS = {"dot": _DotWriter,
+                   "graphml": _GraphMLWriter,
+                   "jsonl": _JSONLinesWriter}
 
 def TestLoadAndDump(spec_filename):
     import project
@@ -0,0 +1,553 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+""" ===========================================================================
+    strategyAnalysis.py - Reachability and statistics for synthesized strategies
+    ===========================================================================
+
+    Measures a strategy without running it: which states are reachable from
+    a set of initial states, which of those have no successors, how many steps
+    each goal can take, the distribution of out-degrees, and the strongly
+    connected components of the reachable part of the strategy.
+
+    Works with both explicit-state (FSA) and symbolic (BDD) strategies.  All
+    analyses run in time linear in the number of reachable states and
+    transitions.
+
+    :Usage: ``strategyAnalysis.py [-h] [-o output_file] [-i assignment] spec_file [strategy_file]``
+"""
+
+import sys
+import getopt
+import textwrap
+import json
+import logging
+from array import array
+from collections import deque
+
+import strategy
+import globalConfig
+
+class StrategyGraph(object):
+    """
+    An explicit transition graph extracted from a strategy.
+
+    States are numbered from 0 to `num_states`-1; the successors of state i are
+    `targets[offsets[i]:offsets[i+1]]`.  `goal_ids[i]` is the goal pursued in
+    state i, and getState(i) returns the corresponding State object.
+    """
+
+    def __init__(self, offsets, targets, goal_ids, get_state):
+        self.offsets = offsets
+        self.targets = targets
+        self.goal_ids = goal_ids
+        self.getState = get_state
+        self.num_states = len(offsets) - 1
+
+    def getSuccessors(self, index):
+        """ Return the indices of all successors of state `index`. """
+
+        return self.targets[self.offsets[index]:self.offsets[index+1]]
+
+    def getOutDegree(self, index):
+        return self.offsets[index+1] - self.offsets[index]
+
+    def getReverseGraph(self):
+        """ Return (offsets, sources) describing the predecessors of each
+            state, in the same format as the successors. """
+
+        counts = [0] * (self.num_states + 1)
+        for t in self.targets:
+            counts[t+1] += 1
+
+        rev_offsets = array('l', [0]) * (self.num_states + 1)
+        for i in xrange(self.num_states):
+            rev_offsets[i+1] = rev_offsets[i] + counts[i+1]
+
+        sources = array('l', [0]) * len(self.targets)
+        fill = array('l', rev_offsets[:-1])
+        offsets, targets = self.offsets, self.targets
+        for i in xrange(self.num_states):
+            for pos in xrange(offsets[i], offsets[i+1]):
+                t = targets[pos]
+                sources[fill[t]] = i
+                fill[t] += 1
+
+        return rev_offsets, sources
+
+def buildStrategyGraph(strat, initial_states=None):
+    """ Extract the transition graph of `strat`, which must be an FSAStrategy
+        or a BDDStrategy.
+
+        Returns a tuple of (StrategyGraph, list of indices of the initial
+        states).  If `initial_states` is omitted, the states where execution
+        of a BDD strategy can start are used (see
+        BDDStrategy.getInitialStates()); an FSA strategy doesn't record which
+        states are initial, so all of its states are used instead. """
+
+    # Import here so that we don't require the BDD backends for FSA strategies
+    import fsa
+
+    if isinstance(strat, fsa.FSAStrategy):
+        # We can use the packed table directly
+        packed = strat.packed
+        graph = StrategyGraph(packed.succ_offsets, packed.succ_indices,
+                              [packed.goal_table[g] for g in packed.goal_indices],
+                              strat.getState)
+
+        if initial_states is None:
+            initial_indices = range(graph.num_states)
+        else:
+            initial_indices = [strat.getStateIndex(s) for s in initial_states]
+
+        return graph, initial_indices
+
+    import bdd
+
+    if isinstance(strat, bdd.BDDStrategy):
+        # Enumerate all reachable states explicitly
+        if initial_states is None:
+            initial_states = list(strat.getInitialStates())
+        else:
+            initial_states = list(initial_states)
+
+        # Reuse the strategy's own successor table if it covers everything
+        # we need, but don't replace it, since it's used during execution
+        successor_table = strat.successor_table
+        if successor_table is None or any(s not in successor_table for s in initial_states):
+            successor_table = strat.buildSuccessorTable(initial_states)
+
+        # Number the states
+        state_list = list(successor_table)
+        state_index = {s: i for i, s in enumerate(state_list)}
+
+        offsets = array('l', [0])
+        targets = array('l')
+        for s in state_list:
+            # Both "Z" and "Y" moves are possible
+            successors = []
+            for next_states in successor_table[s]:
+                successors.extend(state_index[n] for n in next_states)
+            targets.extend(sorted(set(successors)))
+            offsets.append(len(targets))
+
+        graph = StrategyGraph(offsets, targets, [s.goal_id for s in state_list],
+                              state_list.__getitem__)
+
+        return graph, [state_index[s] for s in initial_states]
+
+    else:
+        raise TypeError("Unsupported strategy type {!r}".format(type(strat).__name__))
+
+class StrategyAnalyzer(object):
+    """
+    Computes reachability and statistics for a StrategyGraph, restricted to
+    the states reachable from a list of initial state indices.
+    """
+
+    def __init__(self, graph, initial_indices):
+        self.graph = graph
+        self.initial_indices = list(initial_indices)
+
+        self.reachable = self._findReachableStates()
+
+    def _findReachableStates(self):
+        """ Return a list of the indices of all reachable states, in BFS order. """
+
+        graph = self.graph
+        seen = bytearray(graph.num_states)
+        order = []
+
+        queue = deque()
+        for i in self.initial_indices:
+            if not seen[i]:
+                seen[i] = 1
+                queue.append(i)
+
+        while queue:
+            i = queue.popleft()
+            order.append(i)
+            for j in graph.getSuccessors(i):
+                if not seen[j]:
+                    seen[j] = 1
+                    queue.append(j)
+
+        self._reachable_mask = seen
+        return order
+
+    def isReachable(self, index):
+        return bool(self._reachable_mask[index])
+
+    def iterateOverDeadStates(self):
+        """ Yield the indices of all reachable states without successors. """
+
+        return (i for i in self.reachable if self.graph.getOutDegree(i) == 0)
+
+    def getOutDegreeDistribution(self):
+        """ Return a dictionary mapping out-degree -> number of reachable states. """
+
+        histogram = {}
+        for i in self.reachable:
+            d = self.graph.getOutDegree(i)
+            histogram[d] = histogram.get(d, 0) + 1
+
+        return histogram
+
+    def iterateOverSCCs(self):
+        """ Yield each strongly connected component of the reachable part of
+            the graph as a list of state indices, using an iterative version
+            of Tarjan's algorithm.  Components are produced in reverse
+            topological order. """
+
+        graph = self.graph
+        offsets, targets = graph.offsets, graph.targets
+
+        UNVISITED = -1
+        index_of = array('l', [UNVISITED]) * graph.num_states
+        lowlink = array('l', [0]) * graph.num_states
+        on_stack = bytearray(graph.num_states)
+        stack = []
+        next_index = 0
+
+        for root in self.reachable:
+            if index_of[root] != UNVISITED:
+                continue
+
+            # Each frame is [state, position of next successor edge to visit]
+            index_of[root] = lowlink[root] = next_index
+            next_index += 1
+            stack.append(root)
+            on_stack[root] = 1
+            call_stack = [[root, offsets[root]]]
+
+            while call_stack:
+                frame = call_stack[-1]
+                v, pos = frame
+
+                if pos < offsets[v+1]:
+                    frame[1] = pos + 1
+                    w = targets[pos]
+                    if index_of[w] == UNVISITED:
+                        index_of[w] = lowlink[w] = next_index
+                        next_index += 1
+                        stack.append(w)
+                        on_stack[w] = 1
+                        call_stack.append([w, offsets[w]])
+                    elif on_stack[w] and index_of[w] < lowlink[v]:
+                        lowlink[v] = index_of[w]
+                    continue
+
+                # Done with all successors of v
+                call_stack.pop()
+                if call_stack:
+                    parent = call_stack[-1][0]
+                    if lowlink[v] < lowlink[parent]:
+                        lowlink[parent] = lowlink[v]
+
+                if lowlink[v] == index_of[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        component.append(w)
+                        if w == v:
+                            break
+                    yield component
+
+    def isCyclicSCC(self, component):
+        """ Returns True iff the strongly connected component `component`
+            contains at least one cycle (i.e. it has more than one state, or
+            its only state has a self-loop). """
+
+        if len(component) > 1:
+            return True
+
+        i = component[0]
+        return i in self.graph.getSuccessors(i)
+
+    def getGoalStepBounds(self):
+        """ For each goal, find how many steps the strategy can spend pursuing
+            it before moving on to another goal.
+
+            Returns a dictionary mapping goal ID -> (min_steps, max_steps)
+            for each state that pursues the goal, where min_steps is the
+            length of the shortest path (over all possible inputs) to a state
+            pursuing a different goal and max_steps is the length of the
+            longest such path.  min_steps is None if the goal can never be
+            left, and max_steps is None if the strategy can stay on the goal
+            forever.  States without successors count as 0 steps. """
+
+        graph = self.graph
+        offsets, targets, goal_ids = graph.offsets, graph.targets, graph.goal_ids
+        rev_offsets, sources = graph.getReverseGraph()
+        reachable_mask = self._reachable_mask
+
+        min_steps = {}
+        max_steps = {}
+
+        # Number of same-goal successors that don't have a max_steps value yet
+        pending = {}
+        min_queue = deque()
+        max_queue = deque()
+        for i in self.reachable:
+            g = goal_ids[i]
+            succ_goals = [goal_ids[j] for j in targets[offsets[i]:offsets[i+1]]]
+            if any(sg != g for sg in succ_goals):
+                min_steps[i] = 1
+                min_queue.append(i)
+
+            pending[i] = sum(1 for sg in succ_goals if sg == g)
+            if pending[i] == 0:
+                max_queue.append(i)
+
+        # Shortest paths: BFS backwards from states that can leave their goal
+        while min_queue:
+            j = min_queue.popleft()
+            for pos in xrange(rev_offsets[j], rev_offsets[j+1]):
+                i = sources[pos]
+                if reachable_mask[i] and i not in min_steps and goal_ids[i] == goal_ids[j]:
+                    min_steps[i] = min_steps[j] + 1
+                    min_queue.append(i)
+
+        # Longest paths: process states in reverse topological order of the
+        # same-goal subgraph.  States that are never processed can reach a
+        # same-goal cycle.
+        while max_queue:
+            i = max_queue.popleft()
+            g = goal_ids[i]
+            longest = 0
+            for j in targets[offsets[i]:offsets[i+1]]:
+                longest = max(longest, 1 if goal_ids[j] != g else max_steps[j] + 1)
+            max_steps[i] = longest
+
+            for pos in xrange(rev_offsets[i], rev_offsets[i+1]):
+                p = sources[pos]
+                if reachable_mask[p] and goal_ids[p] == g:
+                    pending[p] -= 1
+                    if pending[p] == 0:
+                        max_queue.append(p)
+
+        bounds = {}
+        for i in self.reachable:
+            bounds.setdefault(goal_ids[i], {})[i] = (min_steps.get(i), max_steps.get(i))
+
+        return bounds
+
+    def getGoalSummary(self):
+        """ Summarize getGoalStepBounds() over the states where each goal is
+            first taken up (initial states, and states entered from a state
+            pursuing a different goal).
+
+            Returns a list of dictionaries, sorted by goal ID. """
+
+        graph = self.graph
+        goal_ids = graph.goal_ids
+
+        entry_states = set(self.initial_indices)
+        for i in self.reachable:
+            for j in graph.getSuccessors(i):
+                if goal_ids[j] != goal_ids[i]:
+                    entry_states.add(j)
+
+        summary = []
+        for goal_id, state_bounds in sorted(self.getGoalStepBounds().iteritems()):
+            entries = [b for i, b in state_bounds.iteritems() if i in entry_states] or state_bounds.values()
+            min_values = [b[0] for b in entries if b[0] is not None]
+            max_values = [b[1] for b in entries]
+
+            summary.append({"goal": goal_id,
+                            "states": len(state_bounds),
+                            "entry_states": len(entries),
+                            "min_steps": min(min_values) if min_values else None,
+                            "max_steps": None if None in max_values else max(max_values),
+                            "always_leaves": all(b[0] is not None for b in entries)})
+
+        return summary
+
+    def describeState(self, index):
+        """ Return a JSON-compatible description of the state at `index`. """
+
+        state = self.graph.getState(index)
+
+        return {"index": index,
+                "id": state.state_id,
+                "goal": state.goal_id,
+                "assignment": {k: _toJSONValue(v) for k, v in state.getAll().iteritems()}}
+
+def _toJSONValue(value):
+    """ Convert a proposition value (e.g. a Region) into something JSON can encode. """
+
+    if value is None or isinstance(value, (bool, int, long, float, basestring)):
+        return value
+
+    return getattr(value, "name", str(value))
+
+def writeJSONReport(analyzer, f):
+    """ Write a JSON report of all the analyses in `analyzer` to the file
+        object `f`.  Lists of states and components are written out as they
+        are found, so the whole report never needs to be held in memory. """
+
+    def write_list(key, items, first=False):
+        f.write("{}{}: [".format("" if first else ",\n", json.dumps(key)))
+        for n, item in enumerate(items):
+            f.write("{}\n    {}".format("," if n > 0 else "", json.dumps(item, sort_keys=True)))
+        f.write("\n]")
+
+    def write_value(key, value):
+        f.write(",\n{}: {}".format(json.dumps(key), json.dumps(value, sort_keys=True)))
+
+    # Summary counts for the SCCs are only known after they've all been written
+    scc_stats = {"count": 0, "cyclic": 0, "largest": 0}
+    def cyclic_sccs():
+        for component in analyzer.iterateOverSCCs():
+            scc_stats["count"] += 1
+            scc_stats["largest"] = max(scc_stats["largest"], len(component))
+            if analyzer.isCyclicSCC(component):
+                scc_stats["cyclic"] += 1
+                yield {"size": len(component), "states": sorted(component)}
+
+    dead_stats = {"count": 0}
+    def dead_states():
+        for i in analyzer.iterateOverDeadStates():
+            dead_stats["count"] += 1
+            yield analyzer.describeState(i)
+
+    f.write("{\n")
+    write_list("dead_states", dead_states(), first=True)
+    write_list("goals", analyzer.getGoalSummary())
+    write_value("out_degree_distribution", {str(k): v for k, v in analyzer.getOutDegreeDistribution().iteritems()})
+    write_list("cyclic_sccs", cyclic_sccs())
+    write_value("summary", {"total_states": analyzer.graph.num_states,
+                            "initial_states": len(set(analyzer.initial_indices)),
+                            "reachable_states": len(analyzer.reachable),
+                            "reachable_transitions": sum(analyzer.graph.getOutDegree(i) for i in analyzer.reachable),
+                            "dead_states": dead_stats["count"],
+                            "sccs": scc_stats["count"],
+                            "cyclic_sccs": scc_stats["cyclic"],
+                            "largest_scc": scc_stats["largest"]})
+    f.write("\n}\n")
+
+def analyzeStrategy(strat, initial_states=None, output_file=None):
+    """ Analyze `strat` starting from `initial_states` (or the defaults
+        described in buildStrategyGraph(), if omitted), and write a JSON
+        report to the file object `output_file` (or stdout, if omitted).
+
+        Returns the StrategyAnalyzer that was used. """
+
+    if output_file is None:
+        output_file = sys.stdout
+
+    logging.info("Analyzing strategy...")
+    tic = globalConfig.best_timer()
+
+    graph, initial_indices = buildStrategyGraph(strat, initial_states)
+    analyzer = StrategyAnalyzer(graph, initial_indices)
+    writeJSONReport(analyzer, output_file)
+
+    toc = globalConfig.best_timer()
+    logging.info("Analyzed {} reachable states in {} seconds.".format(len(analyzer.reachable), toc-tic))
+
+    return analyzer
+
+def parseAssignment(assignment_string, spec_map):
+    """ Parse a comma-separated list of ``prop=value`` pairs into a dictionary.
+        Values of "region" are region names; all other values are booleans
+        (0, 1, true or false). """
+
+    prop_assignments = {}
+    for term in assignment_string.split(","):
+        if not term.strip():
+            continue
+
+        try:
+            name, value = [t.strip() for t in term.split("=")]
+        except ValueError:
+            raise ValueError("Invalid assignment {!r}; expected prop=value".format(term))
+
+        if name == "region":
+            region = next((r for r in spec_map.regions if r.name == value), None)
+            if region is None:
+                raise ValueError("Unknown region {!r}".format(value))
+            prop_assignments[name] = region
+        elif value.lower() in ("1", "true"):
+            prop_assignments[name] = True
+        elif value.lower() in ("0", "false"):
+            prop_assignments[name] = False
+        else:
+            raise ValueError("Invalid value {!r} for proposition {!r}".format(value, name))
+
+    return prop_assignments
+
+def usage(script_name):
+    """ Print command-line usage information. """
+
+    print textwrap.dedent("""\
+                              Usage: %s [-h] [-o output_file] [-i assignment] spec_file [strategy_file]
+
+                              Analyzes the strategy for spec_file (or the one in strategy_file, if
+                              given) and writes a JSON report.
+
+                              -h, --help:
+                                  Display this message
+                              -o FILE, --output FILE:
+                                  Write the report to FILE instead of stdout
+                              -i ASSIGNMENT, --initial ASSIGNMENT:
+                                  Only start from states matching ASSIGNMENT, e.g. "region=r1,person=0"
+                                  (default: start from the initial states of a BDD strategy,
+                                  or from all states of an FSA strategy) """ % script_name)
+
+if __name__ == "__main__":
+    import project
+
+    output_filename = None
+    initial_assignment = None
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "ho:i:", ["help", "output=", "initial="])
+    except getopt.GetoptError:
+        logging.exception("Bad arguments")
+        usage(sys.argv[0])
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage(sys.argv[0])
+            sys.exit()
+        elif opt in ("-o", "--output"):
+            output_filename = arg
+        elif opt in ("-i", "--initial"):
+            initial_assignment = arg
+
+    if len(args) not in (1, 2):
+        usage(sys.argv[0])
+        sys.exit(2)
+
+    ### Load the project
+    proj = project.Project()
+    proj.loadProject(args[0])
+    spec_map = proj.loadRegionFile(decomposed=True)
+
+    ### Load the strategy
+    strategy_filename = args[1] if len(args) > 1 else proj.getStrategyFilename()
+    region_domain = strategy.Domain("region", spec_map.regions, strategy.Domain.B0_IS_MSB)
+    strat = strategy.createStrategyFromFile(strategy_filename,
+                                            proj.enabled_sensors,
+                                            proj.enabled_actuators + proj.all_customs + [region_domain])
+
+    initial_states = None
+    if initial_assignment is not None:
+        try:
+            initial_states = list(strat.searchForStates(parseAssignment(initial_assignment, spec_map)))
+        except ValueError as e:
+            logging.error(str(e))
+            sys.exit(2)
+
+        if not initial_states:
+            logging.error("No states match the initial assignment {!r}".format(initial_assignment))
+            sys.exit(1)
+
+    if output_filename is None:
+        analyzeStrategy(strat, initial_states)
+    else:
+        with open(output_filename, "w") as f:
+            analyzeStrategy(strat, initial_states, f)
@@ -29,16 +29,17 @@ sys.path.append(os.path.join(p,"lib","cores"))
 
 from regions import *
 import project
-import fsa
+import strategy
 import mapRenderer
 from specCompiler import SpecCompiler
 from asyncProcesses import AsynchronousProcessThread
 
-from copy import deepcopy
-
 import logging
 import globalConfig
 
+# Maximum number of states to include when exporting an automaton for viewing
+MAX_VIEWABLE_AUTOMATON_STATES = 500
+
 
 ######################### WARNING! ############################
 #         DO NOT EDIT GUI CODE BY HAND.  USE WXGLADE.         #
@@ -1301,16 +1302,13 @@ class SpecEditorFrame(wx.Frame):
         self.subprocess["Simulation Configuration"] = WxAsynchronousProcessThread([sys.executable, "-u", "-m", "lib.configEditor", self.proj.getFilenamePrefix()+".spec"], simConfigCallback, None)
 
     def _exportDotFile(self):
-        proj_copy = deepcopy(self.proj)
-        proj_copy.rfi = self.decomposedRFI
-        proj_copy.sensor_handler = None
-        proj_copy.actuator_handler = None
-        proj_copy.h_instance = None
-
-        aut = fsa.Automaton(proj_copy)
+        region_domain = strategy.Domain("region", self.decomposedRFI.regions, strategy.Domain.B0_IS_MSB)
+        strat = strategy.createStrategyFromFile(self.proj.getFilenamePrefix()+".aut",
+                                                self.proj.enabled_sensors,
+                                                self.proj.enabled_actuators + self.proj.all_customs + [region_domain])
 
-        aut.loadFile(self.proj.getFilenamePrefix()+".aut", self.proj.enabled_sensors, self.proj.enabled_actuators, self.proj.all_customs)
-        aut.writeDot(self.proj.getFilenamePrefix()+".dot")
+        # Large automata are unreadable anyway, so don't let them hang the viewer
+        strat.exportAsDotFile(self.proj.getFilenamePrefix()+".dot", max_states=MAX_VIEWABLE_AUTOMATON_STATES)
         
         
     def _exportSMVFile(self):              